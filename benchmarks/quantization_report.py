@@ -0,0 +1,122 @@
+"""Accuracy and memory of quantized embeddings against float32.
+
+For every quantization the top-k neighbours of every paper and the
+strongest graph links are compared with the float32 ones:
+
+    PYTHONPATH=src python -m benchmarks.quantization_report --sizes 500 5000
+
+Embeddings come from the deterministic hashing encoder on synthetic papers,
+or from a saved (N, dim) array with --embeddings.
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app_func.quantization import QUANTIZATIONS, QuantizedEmbeddings, pairwise_scores
+from app_func.similarity import normalize_embeddings, top_k_edges, top_k_neighbours
+from benchmarks.synthetic import HashingModel, synthetic_papers
+
+POD_BYTES = 4 * 2**30
+
+
+def overlap_report(
+    embeddings: np.ndarray,
+    k: int = 10,
+    dtypes: Sequence[str] = QUANTIZATIONS,
+    num_links: int = 500,
+) -> Dict[str, Dict[str, float]]:
+    """Accuracy of quantized similarity against float32
+    Args:
+        embeddings (np.ndarray): (N, dim) embeddings
+        k (int, optional): neighbours compared per paper. Defaults to 10.
+        dtypes (Sequence[str], optional): quantizations to report.
+                                          Defaults to QUANTIZATIONS.
+        num_links (int, optional): strongest graph links compared.
+                                   Defaults to 500.
+    Returns:
+        Dict[str, Dict[str, float]]: per quantization, "neighbour_overlap"
+            (mean share of the float32 top-k neighbours found),
+            "link_overlap" (share of the float32 top links found),
+            "max_score_error", "bytes_per_vector", "compression",
+            "papers_per_4gib" and "seconds" of the neighbour search
+    """
+    reference = normalize_embeddings(embeddings)
+    exact_neighbours, _ = top_k_neighbours(reference, k, normalized=True)
+    exact_links = top_k_edges(reference, num_links, normalized=True)
+    exact_pairs = set(zip(exact_links["src"].tolist(), exact_links["dst"].tolist()))
+    sample = min(len(reference), 1000)
+
+    report = {}
+    for dtype in dtypes:
+        quantized = QuantizedEmbeddings.quantize(reference, dtype)
+        start = time.perf_counter()
+        neighbours, _ = top_k_neighbours(quantized, k)
+        seconds = time.perf_counter() - start
+        links = top_k_edges(quantized, num_links)
+        pairs = set(zip(links["src"].tolist(), links["dst"].tolist()))
+        shared = [
+            len(np.intersect1d(found, exact)) / max(len(exact), 1)
+            for found, exact in zip(neighbours, exact_neighbours)
+        ]
+        error = np.abs(
+            pairwise_scores(quantized[:sample], quantized)
+            - reference[:sample] @ reference.T
+        )
+        bytes_per_vector = quantized.nbytes / max(len(quantized), 1)
+        report[dtype] = {
+            "neighbour_overlap": float(np.mean(shared)) if shared else 1.0,
+            "link_overlap": len(pairs & exact_pairs) / max(len(exact_pairs), 1),
+            "max_score_error": float(error.max()) if error.size else 0.0,
+            "bytes_per_vector": bytes_per_vector,
+            "compression": reference.nbytes / max(quantized.nbytes, 1),
+            "papers_per_4gib": int(POD_BYTES // bytes_per_vector),
+            "seconds": seconds,
+        }
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5_000])
+    parser.add_argument("--embeddings", help=".npy file of (N, dim) embeddings")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--num-links", type=int, default=500)
+    parser.add_argument("--output", help="JSON file the report is written to")
+    args = parser.parse_args(argv)
+
+    if args.embeddings:
+        embeddings = np.load(args.embeddings)
+        inputs = {str(len(embeddings)): embeddings}
+    else:
+        model = HashingModel()
+        inputs = {
+            str(size): model.encode(synthetic_papers(size)["summary"].tolist())
+            for size in args.sizes
+        }
+
+    reports = {}
+    print(
+        f"{'N':>7} {'dtype':<8} {'top-k overlap':>13} {'link overlap':>12} "
+        f"{'max error':>9} {'bytes/vec':>9} {'papers/4GiB':>12}"
+    )
+    for size, embeddings in inputs.items():
+        reports[size] = overlap_report(embeddings, args.k, num_links=args.num_links)
+        for dtype, row in reports[size].items():
+            print(
+                f"{size:>7} {dtype:<8} {row['neighbour_overlap']:>13.4f} "
+                f"{row['link_overlap']:>12.4f} {row['max_score_error']:>9.5f} "
+                f"{row['bytes_per_vector']:>9.0f} {row['papers_per_4gib']:>12,}"
+            )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(reports, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
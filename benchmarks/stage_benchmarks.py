@@ -0,0 +1,260 @@
+"""Stage level benchmarks of the search pipeline on synthetic arXiv feeds.
+
+Every stage is timed on its own (best of `repeat` runs) and then run once
+more under tracemalloc for its peak Python memory. Results are written as
+JSON and compared against a stored baseline:
+
+    PYTHONPATH=src python -m benchmarks.stage_benchmarks --sizes 50 500 \
+        --output results.json --baseline benchmarks/baseline.json
+
+The exit code is 1 when a stage regressed past the thresholds.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app_func.atom_parser import parse_feed
+from app_func.datapipeline import DataPipeline
+from app_func.network_graph import Network
+from app_func.sentence_encoder import SentenceEncoder
+from app_func.term_stats import TermStatistics
+from app_func.visualisation import Visualisation
+from benchmarks.synthetic import HashingModel, synthetic_feed
+
+SIZES = [50, 500, 5_000, 20_000]
+
+Stage = Tuple[str, Callable[[Dict[str, Any]], Any]]
+
+
+def pipeline_stages(pipeline: DataPipeline, num_links: int) -> List[Stage]:
+    """Stages of a search, in pipeline order. Every run builds a fresh
+    Network and Visualisation so warm starts and term caches of the previous
+    run do not flatter the repeats
+    Args:
+        pipeline (DataPipeline): data pipeline with the encoder to benchmark
+        num_links (int): links kept for the network graph
+    Returns:
+        List[Stage]: stage name and function of the outputs so far
+    """
+    encoder = pipeline.encoder
+    return [
+        ("parse", lambda out: parse_feed(out["feed"])),
+        ("preprocess", lambda out: pipeline.preprocessing_pipeline(out["parse"])),
+        ("dedup", lambda out: pipeline.deduplicate(out["preprocess"])),
+        ("encode", lambda out: encoder.encode_sentences(out["dedup"])),
+        (
+            "similarity",
+            lambda out: encoder.pairwise_cosine_similarity(out["encode"], num_links),
+        ),
+        (
+            "network_graph",
+            lambda out: Network().plot_networkgraph(
+                out["similarity"], out["dedup"]["title"]
+            ),
+        ),
+        (
+            "word_cloud",
+            lambda out: Visualisation(TermStatistics()).generate_word_cloud(
+                out["preprocess"]
+            ),
+        ),
+        (
+            "display_word_cloud",
+            lambda out: Visualisation(TermStatistics()).display_word_cloud(
+                out["word_cloud"]
+            ),
+        ),
+        (
+            "year_published",
+            lambda out: Visualisation(TermStatistics()).year_published(
+                out["preprocess"].copy()
+            ),
+        ),
+        (
+            "published_bar",
+            lambda out: Visualisation(TermStatistics()).published_bar(
+                out["preprocess"]
+            ),
+        ),
+        (
+            "num_words_title",
+            lambda out: Visualisation(TermStatistics()).num_words_title(
+                out["preprocess"]
+            ),
+        ),
+        (
+            "num_words_summary",
+            lambda out: Visualisation(TermStatistics()).num_words_summary(
+                out["preprocess"]
+            ),
+        ),
+    ]
+
+
+def measure(function: Callable[[], Any], repeat: int = 3) -> Tuple[Any, Dict]:
+    """Best wall time of `repeat` runs and peak traced memory of one more run
+    Args:
+        function (Callable[[], Any]): stage to run
+        repeat (int, optional): timed runs. Defaults to 3.
+    Returns:
+        Tuple[Any, Dict]: output of the stage and its "seconds" and "peak_mb"
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return output, {"seconds": min(timings), "peak_mb": peak / 2**20}
+
+
+def run_benchmarks(
+    sizes: Sequence[int] = SIZES,
+    repeat: int = 3,
+    encoder: Optional[SentenceEncoder] = None,
+    num_links: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Benchmarks every stage at every feed size
+    Args:
+        sizes (Sequence[int], optional): papers per feed. Defaults to SIZES.
+        repeat (int, optional): timed runs per stage. Defaults to 3.
+        encoder (Optional[SentenceEncoder], optional): encoder to benchmark,
+            the deterministic HashingModel when None. Defaults to None.
+        num_links (Optional[int], optional): links of the network graph, as
+            many as papers when None. Defaults to None.
+    Returns:
+        Dict[str, Any]: "meta" of the run and "results" of stage timings per size
+    """
+    if encoder is None:
+        encoder = SentenceEncoder("hashing", model=HashingModel())
+    pipeline = DataPipeline(cache_dir=None, encoder=encoder)
+
+    results = {}
+    for size in sizes:
+        outputs = {"feed": synthetic_feed(size)}
+        stages = pipeline_stages(pipeline, num_links or size)
+        results[str(size)] = {}
+        for name, function in stages:
+            outputs[name], results[str(size)][name] = measure(
+                lambda: function(outputs), repeat
+            )
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "encoder": encoder.model_name,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    time_tolerance: float = 0.5,
+    memory_tolerance: float = 0.25,
+    min_seconds: float = 0.01,
+    min_mb: float = 1.0,
+) -> List[str]:
+    """Stages slower or hungrier than the baseline past the thresholds
+    Args:
+        current (Dict[str, Any]): results of `run_benchmarks`
+        baseline (Dict[str, Any]): stored results
+        time_tolerance (float, optional): allowed relative slow down.
+                                          Defaults to 0.5.
+        memory_tolerance (float, optional): allowed relative growth of the
+                                            peak memory. Defaults to 0.25.
+        min_seconds (float, optional): absolute slow down always allowed,
+                                       keeps tiny stages from flapping.
+                                       Defaults to 0.01.
+        min_mb (float, optional): absolute memory growth always allowed.
+                                  Defaults to 1.0.
+    Returns:
+        List[str]: one message per regression, empty when none
+    """
+    regressions = []
+    for size, stages in current["results"].items():
+        for name, result in stages.items():
+            base = baseline["results"].get(size, {}).get(name)
+            if base is None:
+                continue
+            for key, tolerance, floor, unit in [
+                ("seconds", time_tolerance, min_seconds, "s"),
+                ("peak_mb", memory_tolerance, min_mb, "MB"),
+            ]:
+                limit = max(base[key] * (1 + tolerance), base[key] + floor)
+                if result[key] > limit:
+                    regressions.append(
+                        f"{name} at N={size}: {key} {result[key]:.3f}{unit} "
+                        f"> {limit:.3f}{unit} (baseline {base[key]:.3f}{unit})"
+                    )
+    return regressions
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    """Table of the stage timings, one row per stage and size"""
+    rows = [f"{'N':>7} {'stage':<20} {'seconds':>9} {'peak MB':>9}"]
+    for size, stages in results["results"].items():
+        for name, result in stages.items():
+            rows.append(
+                f"{size:>7} {name:<20} {result['seconds']:>9.4f} "
+                f"{result['peak_mb']:>9.2f}"
+            )
+    return "\n".join(rows)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--num-links", type=int, default=None)
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="SentenceTransformer model to encode with instead of the "
+        "deterministic hashing encoder, downloads the model",
+    )
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="JSON baseline to compare against")
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    encoder = SentenceEncoder(args.model) if args.model else None
+    results = run_benchmarks(args.sizes, args.repeat, encoder, args.num_links)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(
+            results, baseline, args.time_tolerance, args.memory_tolerance
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
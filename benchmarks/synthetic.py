@@ -0,0 +1,189 @@
+import zlib
+from typing import Sequence
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+TOPICS = {
+    "learning": "neural network training gradient transformer attention layer "
+    "representation embedding supervised dataset benchmark optimizer loss "
+    "generalization architecture convolutional pretraining finetuning",
+    "physics": "quantum particle field energy spin lattice entanglement photon "
+    "scattering symmetry gauge boson fermion hamiltonian vacuum decoherence "
+    "superconducting magnetic",
+    "astronomy": "galaxy cluster stellar halo redshift supernova telescope "
+    "cosmological survey luminosity accretion black hole dark matter "
+    "emission spectrum radio",
+    "biology": "protein folding gene expression cell sequence molecular "
+    "genome mutation pathway enzyme receptor tissue membrane transcription "
+    "binding structure",
+    "mathematics": "theorem proof manifold algebra operator bound inequality "
+    "polynomial graph topology group invariant conjecture lemma convex "
+    "measure integral",
+}
+COMMON = (
+    "we propose method results show approach model analysis study novel "
+    "performance data based using paper present framework experiments "
+    "improve significant evaluate efficient large scale problem recent"
+).split()
+
+ENTRY = """<entry>
+    <id>http://arxiv.org/abs/{arxiv_id}v{version}</id>
+    <updated>{published}T00:00:00Z</updated>
+    <published>{published}T00:00:00Z</published>
+    <title>{title}</title>
+    <summary>{summary}</summary>
+    <author><name>Author {index}</name></author>{journal_ref}
+    <link href="http://arxiv.org/abs/{arxiv_id}v{version}" rel="alternate" type="text/html"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="{category}" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="{category}" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>"""
+
+JOURNAL_REF = (
+    '\n    <arxiv:journal_ref xmlns:arxiv="http://arxiv.org/schemas/atom">'
+    "{journal_ref}</arxiv:journal_ref>"
+)
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>
+  <title type="html">ArXiv Query</title>
+  <id>http://arxiv.org/api/query</id>
+  <updated>2023-01-01T00:00:00-05:00</updated>
+  <opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{total}</opensearch:totalResults>
+  {entries}
+</feed>
+"""
+
+
+def synthetic_papers(
+    num_papers: int, words_per_summary: int = 150, seed: int = 0
+) -> pd.DataFrame:
+    """Papers on a handful of topics, with arXiv-like line wrapped abstracts
+    Args:
+        num_papers (int): number of papers
+        words_per_summary (int, optional): words per abstract. Defaults to 150.
+        seed (int, optional): random seed. Defaults to 0.
+    Returns:
+        pd.DataFrame: "arxiv_id", "title", "summary", "published", "category"
+            and "journal_ref" of every paper
+    """
+    rng = np.random.default_rng(seed)
+    topics = list(TOPICS)
+    topic = rng.integers(0, len(topics), num_papers)
+    vocabularies = [TOPICS[name].split() + COMMON for name in topics]
+    words = rng.random((num_papers, words_per_summary))
+
+    summaries, titles = [], []
+    for index in range(num_papers):
+        vocabulary = vocabularies[topic[index]]
+        tokens = [vocabulary[i] for i in (words[index] * len(vocabulary)).astype(int)]
+        lines = [" ".join(tokens[i : i + 12]) for i in range(0, len(tokens), 12)]
+        summaries.append("  " + "\n  ".join(lines) + "\n")
+        titles.append(f"On the {' '.join(tokens[:4])} of paper {index}")
+
+    years = rng.integers(2005, 2024, num_papers)
+    published = [
+        f"{year}-{month:02d}-15"
+        for year, month in zip(years, rng.integers(1, 13, num_papers))
+    ]
+    return pd.DataFrame(
+        {
+            "arxiv_id": [f"{year % 100:02d}01.{i:05d}" for i, year in enumerate(years)],
+            "title": titles,
+            "summary": summaries,
+            "published": published,
+            "category": [f"{topics[t]}.XX" for t in topic],
+            "journal_ref": [
+                f"J. Synth. {volume} ({year})" if volume % 3 == 0 else None
+                for volume, year in zip(rng.integers(1, 100, num_papers), years)
+            ],
+        }
+    )
+
+
+def synthetic_feed(num_papers: int, seed: int = 0) -> bytes:
+    """arXiv API Atom feed of synthetic papers
+    Args:
+        num_papers (int): number of entries
+        seed (int, optional): random seed. Defaults to 0.
+    Returns:
+        bytes: Atom feed
+    """
+    papers = synthetic_papers(num_papers, seed=seed)
+    entries = []
+    for index, paper in enumerate(papers.itertuples()):
+        journal_ref = ""
+        if isinstance(paper.journal_ref, str):
+            journal_ref = JOURNAL_REF.format(journal_ref=escape(paper.journal_ref))
+        entries.append(
+            ENTRY.format(
+                arxiv_id=paper.arxiv_id,
+                version=1 + index % 3,
+                published=paper.published,
+                title=escape(paper.title),
+                summary=escape(paper.summary),
+                index=index,
+                journal_ref=journal_ref,
+                category=paper.category,
+            )
+        )
+    return FEED.format(total=num_papers, entries="\n  ".join(entries)).encode("utf-8")
+
+
+class HashingModel:
+    """Deterministic stand-in for a SentenceTransformer model.
+    Every word gets a fixed random vector seeded by its hash and a sentence
+    is the normalized sum of its word vectors, so papers sharing words end up
+    close together without downloading or running a model.
+    """
+
+    def __init__(self, dimension: int = 384) -> None:
+        """Instantiates the model
+        Args:
+            dimension (int, optional): embedding size. Defaults to 384.
+        """
+        self.dimension = dimension
+        self._vectors = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(
+        self, sentences: Sequence[str], batch_size: int = 32, **kwargs
+    ) -> np.ndarray:
+        """Embeds sentences
+        Args:
+            sentences (Sequence[str]): sentences
+            batch_size (int, optional): ignored, kept for API parity.
+                                        Defaults to 32.
+        Returns:
+            np.ndarray: (len(sentences), dimension) float32 embeddings
+        """
+        tokens = (
+            pd.Series(list(sentences), dtype=object)
+            .str.lower()
+            .str.findall(r"[a-z]+")
+            .explode()
+            .dropna()
+        )
+        codes, words = pd.factorize(tokens)
+        vectors = (
+            np.stack([self._vector(word) for word in words])
+            if len(words)
+            else np.zeros((0, self.dimension), dtype=np.float32)
+        )
+        counts = np.bincount(
+            tokens.index.to_numpy() * len(words) + codes,
+            minlength=len(sentences) * len(words),
+        ).reshape(len(sentences), len(words))
+        embeddings = counts.astype(np.float32) @ vectors
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def _vector(self, word: str) -> np.ndarray:
+        if word not in self._vectors:
+            rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+            self._vectors[word] = rng.standard_normal(self.dimension).astype(np.float32)
+        return self._vectors[word]
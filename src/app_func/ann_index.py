@@ -0,0 +1,407 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app_func.quantization import (
+    QuantizedEmbeddings,
+    Vectors,
+    as_float32,
+    pairwise_scores,
+)
+from app_func.similarity import knn_edges, normalize_embeddings, top_k_neighbours
+
+_OPEN_INDEXES: Dict[str, "AnnIndex"] = {}
+_OPEN_INDEXES_LOCK = threading.Lock()
+
+
+class AnnIndex:
+    """Approximate nearest neighbour index over paper embeddings.
+    An IVF (inverted file) index: vectors are bucketed by their nearest
+    k-means centroid and a query only scores the members of the `nprobe`
+    closest buckets. Small indexes are searched exactly. Vectors can be
+    inserted at any time, the coarse quantizer is retrained once the index
+    has grown `retrain_factor` times since the last training.
+    Recall/latency knobs: `nprobe` (more lists scanned is slower but finds
+    more true neighbours), `num_lists` and `exact_threshold`.
+    Vectors can be stored as float16 or int8 (`quantization`) to keep about
+    2x or 4x more papers in memory, they are scored in that compact form.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        num_lists: Optional[int] = None,
+        nprobe: int = 8,
+        exact_threshold: int = 4096,
+        retrain_factor: float = 4.0,
+        seed: int = 0,
+        quantization: str = "float32",
+    ) -> None:
+        """Instantiates an empty index
+        Args:
+            dim (int): embedding dimension
+            num_lists (Optional[int], optional): Number of inverted lists,
+                4 * sqrt(size) when None. Defaults to None.
+            nprobe (int, optional): Lists scanned per query. Defaults to 8.
+            exact_threshold (int, optional): Below this size the index is
+                                             searched exactly. Defaults to 4096.
+            retrain_factor (float, optional): Growth since the last training
+                                              that triggers a retrain.
+                                              Defaults to 4.0.
+            seed (int, optional): Seed of the k-means training. Defaults to 0.
+            quantization (str, optional): Storage of the vectors, "float32",
+                "float16" or "int8". Defaults to "float32".
+        """
+        self.dim = dim
+        self.num_lists = num_lists
+        self.nprobe = nprobe
+        self.exact_threshold = exact_threshold
+        self.retrain_factor = retrain_factor
+        self.seed = seed
+        self.quantization = quantization
+        self.keys: List[str] = []
+        self.labels: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._positions: Dict[str, int] = {}
+        self._vectors = self._storage(0)
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._list_order: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+        self.unsaved = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    def add(
+        self,
+        keys: Iterable[str],
+        vectors: np.ndarray,
+        labels: Optional[Iterable[str]] = None,
+    ) -> None:
+        """Inserts or replaces vectors, the last one of a key repeated in the
+        batch wins
+        Args:
+            keys (Iterable[str]): unique key of every vector, e.g. arXiv url
+            vectors (np.ndarray): (n, dim) embeddings
+            labels (Optional[Iterable[str]], optional): Display label of every
+                                                        vector. Defaults to None.
+        """
+        keys = list(keys)
+        labels = list(labels) if labels is not None else keys
+        vectors = normalize_embeddings(vectors)
+        # the row of the last occurrence of every key
+        rows = dict(zip(keys, range(len(keys))))
+        with self._lock:
+            new_rows = []
+            for key, row in rows.items():
+                label = labels[row]
+                position = self._positions.get(key)
+                if position is None:
+                    self._positions[key] = len(self.keys)
+                    self.keys.append(key)
+                    self.labels.append(label)
+                    new_rows.append(row)
+                else:
+                    self._vectors[position] = vectors[row]
+                    self.labels[position] = label
+                    if self.centroids is not None:
+                        self._assignments[position] = self._assign(vectors[[row]])[0]
+            if not new_rows:
+                return
+
+            start, size = len(self.keys) - len(new_rows), len(self.keys)
+            self._reserve(size)
+            self._vectors[start:size] = vectors[new_rows]
+            self._assignments[start:size] = (
+                self._assign(vectors[new_rows]) if self.centroids is not None else 0
+            )
+            self._list_order = None
+            self.unsaved += len(new_rows)
+
+            if size >= self.exact_threshold and (
+                self.centroids is None
+                or size >= self.retrain_factor * self.trained_size
+            ):
+                self.train()
+
+    def train(self) -> None:
+        """Fits the coarse quantizer with spherical k-means and reassigns"""
+        with self._lock:
+            size = len(self.keys)
+            num_lists = self.num_lists or int(4 * np.sqrt(size))
+            num_lists = max(1, min(num_lists, size))
+            rng = np.random.default_rng(self.seed)
+            sample = as_float32(
+                self._vectors[
+                    np.sort(rng.choice(size, min(size, 256 * num_lists), replace=False))
+                ]
+            )
+            centroids = sample[rng.choice(len(sample), num_lists, replace=False)]
+            for _ in range(10):
+                assignments = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignments, sample)
+                empty = np.bincount(assignments, minlength=num_lists) == 0
+                sums[empty] = centroids[empty]
+                centroids = normalize_embeddings(sums)
+
+            self.centroids = centroids
+            self._assignments[:size] = self._assign(self._vectors[:size])
+            self._list_order = None
+            self.trained_size = size
+
+    def search(
+        self, queries: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the approximate k nearest vectors of every query
+        Args:
+            queries (np.ndarray): (q, dim) query embeddings
+            k (int): neighbours per query
+            nprobe (Optional[int], optional): Lists scanned per query,
+                                              `self.nprobe` when None.
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (q, k) positions and cosine scores,
+                padded with -1 and -inf when fewer than k vectors are found
+        """
+        queries = normalize_embeddings(np.atleast_2d(queries))
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        with self._lock:
+            size = len(self.keys)
+            if size == 0:
+                return positions, scores
+            if self.centroids is None:
+                exact_positions, exact_scores = top_k_neighbours(
+                    queries, k, corpus=self._vectors[:size], normalized=True
+                )
+                top = exact_positions.shape[1]
+                positions[:, :top] = exact_positions
+                scores[:, :top] = exact_scores
+                return positions, scores
+
+            candidate_lists = self._probe(queries, nprobe or self.nprobe)
+
+            for i, candidates in enumerate(candidate_lists):
+                if len(candidates) == 0:
+                    continue
+                candidate_scores = pairwise_scores(
+                    self._vectors[candidates], queries[i : i + 1]
+                )[:, 0]
+                top = min(k, len(candidates))
+                best = np.argpartition(-candidate_scores, top - 1)[:top]
+                best = best[np.argsort(-candidate_scores[best], kind="stable")]
+                positions[i, :top] = candidates[best]
+                scores[i, :top] = candidate_scores[best]
+
+        return positions, scores
+
+    def vector(self, key: str) -> Optional[np.ndarray]:
+        """Returns the stored unit vector of a key
+        Args:
+            key (str): vector key
+        Returns:
+            Optional[np.ndarray]: (dim,) vector, None if the key is unknown
+        """
+        position = self._positions.get(key)
+        if position is None:
+            return None
+        return np.array(as_float32(self._vectors[[position]])[0])
+
+    def save(self, path: str) -> None:
+        """Writes the index to a directory
+        Args:
+            path (str): target directory
+        """
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            size = len(self.keys)
+            if isinstance(self._vectors, QuantizedEmbeddings):
+                np.save(os.path.join(path, "vectors.npy"), self._vectors.codes[:size])
+                np.save(os.path.join(path, "scales.npy"), self._vectors.scales[:size])
+                np.save(os.path.join(path, "norms.npy"), self._vectors.norms[:size])
+            else:
+                np.save(os.path.join(path, "vectors.npy"), self._vectors[:size])
+            np.save(os.path.join(path, "assignments.npy"), self._assignments[:size])
+            if self.centroids is not None:
+                np.save(os.path.join(path, "centroids.npy"), self.centroids)
+            meta = {
+                "dim": self.dim,
+                "num_lists": self.num_lists,
+                "nprobe": self.nprobe,
+                "exact_threshold": self.exact_threshold,
+                "retrain_factor": self.retrain_factor,
+                "seed": self.seed,
+                "quantization": self.quantization,
+                "trained_size": self.trained_size,
+                "keys": self.keys,
+                "labels": self.labels,
+            }
+            with open(
+                os.path.join(path, "meta.json.tmp"), "w", encoding="utf-8"
+            ) as file:
+                json.dump(meta, file)
+            os.replace(
+                os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json")
+            )
+            self.unsaved = 0
+
+    @classmethod
+    def load(cls, path: str) -> "AnnIndex":
+        """Reads an index written by `save`
+        Args:
+            path (str): index directory
+        Returns:
+            AnnIndex: loaded index
+        """
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        index = cls(
+            meta["dim"],
+            num_lists=meta["num_lists"],
+            nprobe=meta["nprobe"],
+            exact_threshold=meta["exact_threshold"],
+            retrain_factor=meta["retrain_factor"],
+            seed=meta["seed"],
+            quantization=meta.get("quantization", "float32"),
+        )
+        index.keys = meta["keys"]
+        index.labels = meta["labels"]
+        index.trained_size = meta["trained_size"]
+        index._positions = {key: i for i, key in enumerate(index.keys)}
+        index._vectors = np.load(os.path.join(path, "vectors.npy"))
+        if index.quantization != "float32":
+            index._vectors = QuantizedEmbeddings(
+                index._vectors,
+                np.load(os.path.join(path, "scales.npy")),
+                np.load(os.path.join(path, "norms.npy")),
+            )
+        index._assignments = np.load(os.path.join(path, "assignments.npy"))
+        centroids_path = os.path.join(path, "centroids.npy")
+        if os.path.exists(centroids_path):
+            index.centroids = np.load(centroids_path)
+        return index
+
+    def _reserve(self, size: int) -> None:
+        """Grows the vector buffers geometrically to hold `size` vectors"""
+        capacity = len(self._vectors)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 1024)
+        vectors = self._storage(capacity)
+        vectors[: len(self._vectors)] = self._vectors
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[: len(self._assignments)] = self._assignments
+        self._vectors, self._assignments = vectors, assignments
+
+    def _storage(self, capacity: int) -> Vectors:
+        """Uninitialised vector buffer of the index's quantization"""
+        if self.quantization == "float32":
+            return np.empty((capacity, self.dim), dtype=np.float32)
+        return QuantizedEmbeddings.empty(capacity, self.dim, self.quantization)
+
+    def _assign(self, vectors: Vectors) -> np.ndarray:
+        """Nearest centroid of every vector"""
+        scores = pairwise_scores(vectors, self.centroids)
+        return np.argmax(scores, axis=1).astype(np.int32)
+
+    def _probe(self, queries: np.ndarray, nprobe: int) -> List[np.ndarray]:
+        """Positions of the members of the closest lists of every query"""
+        num_lists = len(self.centroids)
+        if self._list_order is None:
+            assignments = self._assignments[: len(self.keys)]
+            self._list_order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=num_lists)
+            self._list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        nprobe = min(nprobe, num_lists)
+        coarse = queries @ self.centroids.T
+        probed = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        offsets = self._list_offsets
+        return [
+            np.concatenate(
+                [self._list_order[offsets[lst] : offsets[lst + 1]] for lst in lists]
+            )
+            for lists in probed
+        ]
+
+
+def get_ann_index(path: str, dim: int, quantization: str = "float32") -> AnnIndex:
+    """Returns the process-wide index stored at a path, loading it once
+    Args:
+        path (str): index directory
+        dim (int): embedding dimension used when creating a new index
+        quantization (str, optional): Storage of the vectors of a new index,
+                                      a stored index keeps its own.
+                                      Defaults to "float32".
+    Returns:
+        AnnIndex: shared index
+    """
+    key = os.path.abspath(path)
+    with _OPEN_INDEXES_LOCK:
+        if key not in _OPEN_INDEXES:
+            if os.path.exists(os.path.join(path, "meta.json")):
+                _OPEN_INDEXES[key] = AnnIndex.load(path)
+            else:
+                _OPEN_INDEXES[key] = AnnIndex(dim, quantization=quantization)
+        return _OPEN_INDEXES[key]
+
+
+def open_ann_index(path: str) -> Optional[AnnIndex]:
+    """Returns the process-wide index at a path when one is open or stored,
+    without ever creating one, for lookups before any paper was indexed
+    Args:
+        path (str): index directory
+    Returns:
+        Optional[AnnIndex]: shared index, None when nothing was indexed yet
+    """
+    key = os.path.abspath(path)
+    with _OPEN_INDEXES_LOCK:
+        if key not in _OPEN_INDEXES:
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                return None
+            _OPEN_INDEXES[key] = AnnIndex.load(path)
+        return _OPEN_INDEXES[key]
+
+
+def ann_neighbours(
+    embeddings: np.ndarray, k: int, nprobe: int = 8
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Approximate nearest neighbours of every paper of a large batch, from
+        a transient IVF index over the batch
+    Args:
+        embeddings (np.ndarray): (N, dim) embeddings
+        k (int): neighbours per paper, the paper itself included
+        nprobe (int, optional): Lists scanned per query. Defaults to 8.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (N, k) neighbour positions and scores,
+            see `AnnIndex.search`
+    """
+    index = AnnIndex(embeddings.shape[1], nprobe=nprobe, exact_threshold=0)
+    index.add(map(str, range(len(embeddings))), embeddings)
+    return index.search(embeddings, k)
+
+
+def ann_edges(embeddings: np.ndarray, k: int, nprobe: int = 8) -> np.ndarray:
+    """Approximate top-k similarity edges of a large batch of papers
+        every paper is queried against a transient IVF index over the batch
+        for enough neighbours that the strongest k pairs are almost surely
+        among them
+    Args:
+        embeddings (np.ndarray): (N, dim) embeddings
+        k (int): number of edges to keep
+        nprobe (int, optional): Lists scanned per query. Defaults to 8.
+    Returns:
+        np.ndarray: edge array of EDGE_DTYPE with src < dst, sorted by
+            descending weight
+    """
+    num_papers = len(embeddings)
+    neighbours = min(num_papers, max(8, -(-2 * k // max(num_papers, 1))) + 1)
+    return knn_edges(*ann_neighbours(embeddings, neighbours, nprobe))[:k]
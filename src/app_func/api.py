@@ -0,0 +1,400 @@
+"""JSON API over the search pipeline, without the Streamlit front end.
+
+The ASGI app serves
+    GET  /search?search_term=...&num_searches=50&num_papers=50&num_links=50
+    POST /search with the same fields in a JSON object
+    GET  /metrics, the stage metrics in the Prometheus text format
+    GET  /healthz
+and answers a search with its papers, graph nodes (positions), edges,
+clusters and keywords. With `stream=1` or `Accept: application/x-ndjson`
+the records are streamed as NDJSON, one object per line.
+
+Identical searches in flight are computed once, and the pipeline runs in a
+bounded pool of worker threads so the event loop is never blocked.
+
+Usage:
+    python -m app_func.api search "graph neural networks" [--ndjson]
+    python -m app_func.api serve --port 8000    (needs uvicorn)
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import pandas as pd
+
+from app_func.backbone import BACKBONES
+from app_func.clustering import CLUSTER_METHODS
+from app_func.instrumentation import get_instrumentation
+from app_func.startup import DEFAULT_WARM_UP, warm_up
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.environ.get("ARXIV_API_WORKERS", "2"))
+DEFAULT_MAX_PENDING = 32
+
+# same ranges as the sliders of the app
+PARAM_RANGES = {
+    "num_searches": (50, 10, 2000),
+    "num_papers": (50, 10, 500),
+    "num_links": (50, 10, 500),
+}
+SECTIONS = ["papers", "nodes", "edges", "clusters"]
+NDJSON = "application/x-ndjson"
+STREAM_CHUNK_LINES = 500
+
+
+def search_params(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates the parameters of a search request
+    Args:
+        values (Dict[str, Any]): request fields, strings or JSON values
+    Raises:
+        ValueError: when a field is missing or out of range
+    Returns:
+        Dict[str, Any]: arguments of SearchPipeline.data
+    """
+    search_term = str(values.get("search_term", "")).strip()
+    if not search_term:
+        raise ValueError("search_term is required")
+    params = {"search_term": search_term}
+    for name, (default, low, high) in PARAM_RANGES.items():
+        try:
+            params[name] = int(values.get(name, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be an integer") from None
+        if not low <= params[name] <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+    params["cluster_method"] = values.get("cluster_method", "kmeans")
+    if params["cluster_method"] not in CLUSTER_METHODS:
+        raise ValueError(f"cluster_method must be one of {CLUSTER_METHODS}")
+    params["backbone"] = values.get("backbone", "top")
+    if params["backbone"] not in BACKBONES:
+        raise ValueError(f"backbone must be one of {BACKBONES}")
+    return params
+
+
+def search_payload(
+    params: Dict[str, Any], results: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """JSON-ready result of a search
+    Args:
+        params (Dict[str, Any]): search parameters
+        results (Optional[Dict[str, Any]]): output of SearchPipeline.data
+    Returns:
+        Dict[str, Any]: "query", "papers", "nodes" (paper, i.e. its position
+            in "papers", label and x, y position),
+            "edges" (source and target node, weight), "clusters" and "keywords"
+    """
+    payload = {"query": params, "keywords": []}
+    payload.update({section: [] for section in SECTIONS})
+    if results is None:
+        return payload
+    layout = results["layout"]
+    xs, ys = layout.positions.T.tolist() if len(layout.ids) else ([], [])
+    titles = results["df"]["title"].to_numpy()[layout.ids].tolist()
+    payload["papers"] = _records(results["df"])
+    payload["nodes"] = [
+        {"node": node, "paper": paper, "label": label, "x": x, "y": y}
+        for node, (paper, label, x, y) in enumerate(
+            zip(layout.ids.tolist(), titles, xs, ys)
+        )
+    ]
+    payload["edges"] = [
+        {"source": source, "target": target, "weight": weight}
+        for source, target, weight in zip(
+            layout.src.tolist(), layout.dst.tolist(), layout.weights.tolist()
+        )
+    ]
+    payload["clusters"] = _records(results["clusters"])
+    payload["keywords"] = list(results["keywords"])
+    return payload
+
+
+def ndjson_lines(payload: Dict[str, Any]) -> Iterator[bytes]:
+    """Search result as NDJSON, the query first, then one line per paper,
+    node, edge and cluster assignment, and the keywords last
+    Args:
+        payload (Dict[str, Any]): output of search_payload
+    Yields:
+        bytes: one JSON object with a "type" field and a newline
+    """
+    yield _line({"type": "query", **payload["query"]})
+    for section in SECTIONS:
+        kind = section[:-1]
+        for record in payload[section]:
+            yield _line({"type": kind, **record})
+    yield _line({"type": "keywords", "keywords": payload["keywords"]})
+
+
+def _records(df: pd.DataFrame) -> list:
+    """Rows as JSON-ready dicts, dates in ISO format and NaN as None"""
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record).encode("utf-8") + b"\n"
+
+
+class SearchService:
+    """Runs searches for the API in a bounded pool of worker threads.
+    Every worker thread keeps its own SearchPipeline, so the stages reused
+    between its searches stay warm, and all of them share one DataPipeline
+    with its encoder and caches. Identical searches in flight are coalesced
+    into one computation whose result every caller receives.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        pipeline_factory: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """Starts the worker pool
+        Args:
+            max_workers (int, optional): Searches computed at once.
+                                         Defaults to DEFAULT_WORKERS.
+            max_pending (int, optional): Distinct searches running or queued,
+                more are turned away. Defaults to DEFAULT_MAX_PENDING.
+            pipeline_factory (Optional[Callable[[], Any]], optional): Builds
+                the pipeline of a worker, a SearchPipeline on the shared
+                DataPipeline when None. Defaults to None.
+        """
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="search")
+        self.max_pending = max_pending
+        self.pipeline_factory = pipeline_factory or self._search_pipeline
+        self.in_flight: Dict[Tuple, asyncio.Future] = {}
+        self.coalesced = 0
+        self._connector = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def accepts(self, params: Dict[str, Any]) -> bool:
+        """Whether a search can start now or joins one in flight
+        Args:
+            params (Dict[str, Any]): search parameters
+        Returns:
+            bool: False when too many searches are pending
+        """
+        return _key(params) in self.in_flight or len(self.in_flight) < self.max_pending
+
+    async def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Result of a search, shared with identical searches in flight
+        Args:
+            params (Dict[str, Any]): output of search_params
+        Returns:
+            Dict[str, Any]: output of search_payload
+        """
+        key = _key(params)
+        future = self.in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self._search, params)
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # a cancelled caller must not cancel the search of the others
+        return await asyncio.shield(future)
+
+    def close(self) -> None:
+        """Stops the worker pool"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        pipeline = getattr(self._local, "pipeline", None)
+        if pipeline is None:
+            pipeline = self._local.pipeline = self.pipeline_factory()
+        return search_payload(params, pipeline.data(**params))
+
+    def _search_pipeline(self):
+        from app_func.datapipeline import DataPipeline
+        from app_func.search_pipeline import SearchPipeline
+
+        with self._lock:
+            if self._connector is None:
+                self._connector = DataPipeline()
+        return SearchPipeline(connector=self._connector)
+
+
+def _key(params: Dict[str, Any]) -> Tuple:
+    return tuple(sorted(params.items()))
+
+
+class SearchApp:
+    """ASGI application of the JSON API"""
+
+    def __init__(self, service: Optional[SearchService] = None) -> None:
+        """Instantiates the app
+        Args:
+            service (Optional[SearchService], optional): Search service, one
+                with the default pool when None. Defaults to None.
+        """
+        self.service = service if service is not None else SearchService()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.service.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send) -> None:
+        path, method = scope["path"], scope["method"]
+        if path == "/healthz":
+            return await _respond(send, 200, {"status": "ok"})
+        if path == "/metrics":
+            text = get_instrumentation().prometheus_text().encode("utf-8")
+            return await _respond(send, 200, text, b"text/plain; version=0.0.4")
+        if path != "/search":
+            return await _respond(send, 404, {"error": "not found"})
+        if method not in ("GET", "POST"):
+            return await _respond(send, 405, {"error": "use GET or POST"})
+
+        try:
+            values = dict(parse_qsl(scope.get("query_string", b"").decode("utf-8")))
+            if method == "POST":
+                body = await _read_body(receive)
+                fields = json.loads(body) if body else {}
+                if not isinstance(fields, dict):
+                    raise ValueError("the body must be a JSON object")
+                values.update(fields)
+            params = search_params(values)
+        except ValueError as error:
+            return await _respond(send, 400, {"error": str(error)})
+        accept = dict(scope.get("headers", [])).get(b"accept", b"")
+        stream = str(values.get("stream", "")).lower() in ("1", "true")
+        stream = stream or NDJSON.encode() in accept
+
+        if not self.service.accepts(params):
+            return await _respond(send, 503, {"error": "too many searches pending"})
+        try:
+            payload = await self.service.search(params)
+        except Exception:
+            logger.exception("Search failed: %s", params)
+            return await _respond(send, 500, {"error": "search failed"})
+        if stream:
+            await _stream(send, ndjson_lines(payload))
+        else:
+            await _respond(send, 200, payload)
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _respond(
+    send, status: int, body, content_type: bytes = b"application/json"
+) -> None:
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _stream(send, lines: Iterator[bytes]) -> None:
+    """Sends lines as a chunked response, STREAM_CHUNK_LINES at a time"""
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", NDJSON.encode())],
+        }
+    )
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == STREAM_CHUNK_LINES:
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": b"".join(chunk),
+                    "more_body": True,
+                }
+            )
+            chunk = []
+    await send({"type": "http.response.body", "body": b"".join(chunk)})
+
+
+def create_app(max_workers: int = DEFAULT_WORKERS) -> SearchApp:
+    """ASGI app with its own worker pool, e.g. for an ASGI server factory
+    Args:
+        max_workers (int, optional): Searches computed at once.
+                                     Defaults to DEFAULT_WORKERS.
+    Returns:
+        SearchApp: application
+    """
+    return SearchApp(SearchService(max_workers))
+
+
+def main(argv=None):
+    """Command line entry point for searching and serving the API"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    search = subparsers.add_parser("search", help="print the results of searches")
+    search.add_argument("search_term", nargs="+", help="one or more search terms")
+    for name, (default, _, _) in PARAM_RANGES.items():
+        search.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    search.add_argument("--cluster-method", choices=CLUSTER_METHODS, default="kmeans")
+    search.add_argument("--backbone", choices=BACKBONES, default="top")
+    search.add_argument("--ndjson", action="store_true", help="one record per line")
+    serve = subparsers.add_parser("serve", help="serve the API over HTTP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            import uvicorn
+        except ImportError:
+            parser.error("serving the API needs uvicorn: pip install uvicorn")
+        if DEFAULT_WARM_UP:
+            warm_up()
+        uvicorn.run(create_app(args.workers), host=args.host, port=args.port)
+        return
+
+    from app_func.search_pipeline import SearchPipeline
+
+    pipeline = SearchPipeline()
+    for search_term in args.search_term:
+        params = search_params({**vars(args), "search_term": search_term})
+        payload = search_payload(params, pipeline.data(**params))
+        if args.ndjson:
+            sys.stdout.buffer.writelines(ndjson_lines(payload))
+        else:
+            sys.stdout.write(json.dumps(payload) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import http.client
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote_plus, urlsplit
+
+from app_func.atom_parser import AtomParser
+
+CHUNK_SIZE = 64 * 1024
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_HOST_POOLS: Dict[str, "HostPool"] = {}
+_HOST_POOLS_LOCK = threading.Lock()
+
+
+class HostPool:
+    """Rate limit, worker threads and keep-alive connections shared by every
+    client of an API host, so the clients of concurrent sessions stay
+    within one polite request rate and one thread pool
+    """
+
+    def __init__(self, max_workers: int = 4) -> None:
+        """Instantiates the pool, threads are started on first use
+        Args:
+            max_workers (int, optional): Concurrent requests to the host.
+                                         Defaults to 4.
+        """
+        self.max_workers = max_workers
+        self.local = threading.local()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._next_request = 0.0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker threads of the host"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def wait_for_slot(self, min_interval: float) -> None:
+        """Blocks until the rate limit allows another request
+        Args:
+            min_interval (float): seconds until the request after this one
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request)
+            self._next_request = start + min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def get_host_pool(host: str, max_workers: int = 4) -> HostPool:
+    """Returns the process-wide pool of a host, creating it on first use
+    Args:
+        host (str): scheme and network location, e.g. "http://export.arxiv.org"
+        max_workers (int, optional): Concurrent requests of a new pool, an
+                                     existing one keeps its own. Defaults to 4.
+    Returns:
+        HostPool: shared pool
+    """
+    with _HOST_POOLS_LOCK:
+        if host not in _HOST_POOLS:
+            _HOST_POOLS[host] = HostPool(max_workers)
+        return _HOST_POOLS[host]
+
+
+class ArxivClient:
+    """HTTP client for the arXiv API.
+    Large requests are split into pages over `start` offsets which are
+    fetched concurrently by a small thread pool. Every worker keeps its own
+    keep-alive connection, responses are requested gzip compressed and all
+    requests share a polite rate limit. The threads, connections and rate
+    limit belong to the host (see `HostPool`), so every client of a process
+    shares them. Responses are decompressed and parsed chunk by chunk while
+    they are downloaded.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://export.arxiv.org/api",
+        method_name: str = "query",
+        parameters: str = "search_query=all",
+        page_size: int = 500,
+        max_workers: int = 4,
+        min_interval: float = 3.0,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 60.0,
+    ) -> None:
+        """Instantiates the client
+        Args:
+            base_url (str, optional): Root of the arXiv API.
+                                      Defaults to "http://export.arxiv.org/api".
+            method_name (str, optional): API method. Defaults to "query".
+            parameters (str, optional): Fixed query parameters.
+                                        Defaults to "search_query=all".
+            page_size (int, optional): Results per request. Defaults to 500.
+            max_workers (int, optional): Concurrent requests to the host,
+                                         the first client of a host sets
+                                         them. Defaults to 4.
+            min_interval (float, optional): Minimum seconds between the start
+                of two requests, arXiv asks for 3 seconds. Defaults to 3.0.
+            max_retries (int, optional): Retries per page. Defaults to 3.
+            backoff (float, optional): Initial retry delay in seconds, doubled
+                                       on every retry. Defaults to 1.0.
+            timeout (float, optional): Socket timeout in seconds.
+                                       Defaults to 60.0.
+        """
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.path = f"{url.path.rstrip('/')}/{method_name}"
+        self.parameters = parameters
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._host = get_host_pool(f"{self.scheme}://{self.netloc}", max_workers)
+
+    def fetch(self, search_term: str, num_results: int) -> List[AtomParser]:
+        """Fetches all pages of a query
+            the first page is fetched alone to learn the total number of
+            results, the remaining pages are fetched concurrently
+        Args:
+            search_term (str): search term as defined by user
+            num_results (int): maximum number of results
+        Returns:
+            List[AtomParser]: parsed feed of every page, in `start` order
+        """
+        return [page for page, _ in self.fetch_pages(search_term, num_results)]
+
+    def fetch_pages(
+        self,
+        search_term: str,
+        num_results: int,
+        first_page_size: Optional[int] = None,
+    ) -> Iterator[Tuple[AtomParser, bool]]:
+        """Fetches the pages of a query, yielding each one in `start` order
+            as soon as it and the pages before it arrived. Pages that were
+            not requested yet are cancelled when the iterator is closed
+        Args:
+            search_term (str): search term as defined by user
+            num_results (int): maximum number of results
+            first_page_size (Optional[int], optional): Results of the first
+                page, e.g. small to show something quickly. Defaults to the
+                page size.
+        Yields:
+            Tuple[AtomParser, bool]: parsed feed of the next page and whether
+                it is the last one
+        """
+        first_page_size = min(first_page_size or self.page_size, num_results)
+        first = self.fetch_page(search_term, 0, first_page_size)
+        if first.total_results is not None:
+            num_results = min(num_results, first.total_results)
+        starts = list(range(first_page_size, num_results, self.page_size))
+        yield first, not starts
+        if not starts:
+            return
+
+        pages = self._host.executor.map(
+            lambda start: self.fetch_page(
+                search_term, start, min(self.page_size, num_results - start)
+            ),
+            starts,
+        )
+        try:
+            for number, page in enumerate(pages, 1):
+                yield page, number == len(starts)
+        finally:
+            pages.close()
+
+    def fetch_page(self, search_term: str, start: int, num_results: int) -> AtomParser:
+        """Fetches a single page, retrying with exponential backoff
+        Args:
+            search_term (str): search term as defined by user
+            start (int): offset of the first result
+            num_results (int): number of results in the page
+        Returns:
+            AtomParser: parsed feed of the page
+        """
+        query = (
+            f"{self.path}?{self.parameters}:{quote_plus(search_term, safe=':')}"
+            f"&start={start}&max_results={num_results}"
+        )
+        for attempt in range(self.max_retries + 1):
+            self._host.wait_for_slot(self.min_interval)
+            try:
+                status, parser = self._get(query)
+            except (OSError, http.client.HTTPException, zlib.error):
+                self._close()
+                status, parser = None, None
+
+            if status == 200:
+                return parser
+            if status is not None and status not in RETRY_STATUSES:
+                raise RuntimeError(f"arXiv API returned HTTP {status} for {query}")
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2**attempt)
+
+        raise RuntimeError(f"arXiv API request failed after retries: {query}")
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """Returns the keep-alive connection of the calling thread"""
+        connection = getattr(self._host.local, "connection", None)
+        if connection is None:
+            if self.scheme == "https":
+                connection = http.client.HTTPSConnection(
+                    self.netloc, timeout=self.timeout
+                )
+            else:
+                connection = http.client.HTTPConnection(
+                    self.netloc, timeout=self.timeout
+                )
+            self._host.local.connection = connection
+        return connection
+
+    def _close(self) -> None:
+        """Drops the connection of the calling thread"""
+        connection = getattr(self._host.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._host.local.connection = None
+
+    def _get(self, query: str):
+        """Sends a GET request and streams the body into a parser"""
+        connection = self._connection()
+        connection.request(
+            "GET",
+            query,
+            headers={"Accept-Encoding": "gzip", "Connection": "keep-alive"},
+        )
+        response = connection.getresponse()
+        if response.status != 200:
+            response.read()
+            if response.will_close:
+                self._close()
+            return response.status, None
+
+        parser = AtomParser()
+        decompressor = None
+        if response.getheader("Content-Encoding") == "gzip":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunk = response.read(CHUNK_SIZE)
+        while chunk:
+            parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+            chunk = response.read(CHUNK_SIZE)
+        if decompressor is not None:
+            parser.feed(decompressor.flush())
+        parser.close()
+
+        if response.will_close:
+            self._close()
+        return response.status, parser
@@ -0,0 +1,144 @@
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from app_func.paper_table import paper_table
+from app_func.utils import parse_arxiv_id
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV = "{http://arxiv.org/schemas/atom}"
+OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+FEED_CHUNK_BYTES = 1 << 16
+
+COLUMNS = [
+    "id",
+    "arxiv_id",
+    "version",
+    "title",
+    "summary",
+    "published",
+    "updated",
+    "journal_ref",
+    "doi",
+    "authors",
+    "categories",
+    "primary_category",
+]
+
+
+class AtomParser:
+    """Single pass streaming parser for arXiv Atom feeds.
+    Bytes can be fed as they arrive from the network. Every entry is turned
+    into one row of columnar lists as soon as its closing tag is read, after
+    which the element is cleared and detached so memory stays flat.
+    """
+
+    def __init__(self) -> None:
+        """Instantiates an empty parser"""
+        self.columns: Dict[str, list] = {name: [] for name in COLUMNS}
+        self.total_results: Optional[int] = None
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root = None
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def feed(self, chunk: bytes) -> None:
+        """Consumes the next chunk of the feed
+        Args:
+            chunk (bytes): raw bytes of the response
+        """
+        self._parser.feed(chunk)
+        self._read_events()
+
+    def close(self) -> Dict[str, list]:
+        """Finishes parsing
+        Returns:
+            Dict[str, list]: parsed columns
+        """
+        self._parser.close()
+        self._read_events()
+        return self.columns
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Builds a dataframe from the parsed columns
+        Returns:
+            pd.DataFrame: one row per entry, see `paper_table`
+        """
+        return paper_table(self.columns)
+
+    @staticmethod
+    def concat(parsers: Iterable["AtomParser"]) -> pd.DataFrame:
+        """Merges the columns of several parsed pages into one dataframe
+        Args:
+            parsers (Iterable[AtomParser]): parsers of every page, in order
+        Returns:
+            pd.DataFrame: one row per entry, empty if no page had entries
+        """
+        columns: Dict[str, List] = {name: [] for name in COLUMNS}
+        for parser in parsers:
+            for name in COLUMNS:
+                columns[name].extend(parser.columns[name])
+        if not columns["id"]:
+            return pd.DataFrame()
+        return paper_table(columns)
+
+    def _read_events(self) -> None:
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = element
+            elif element.tag == f"{ATOM}entry":
+                self._add_entry(element)
+                element.clear()
+                if self._root is not None and element in self._root:
+                    self._root.remove(element)
+            elif element.tag == f"{OPENSEARCH}totalResults":
+                self.total_results = int(element.text)
+
+    def _add_entry(self, entry: ET.Element) -> None:
+        """Appends the fields of an entry to the columns"""
+        identifier = entry.findtext(f"{ATOM}id", "")
+        if "/api/errors" in identifier:
+            return
+        arxiv_id, version = parse_arxiv_id(identifier)
+        primary = entry.find(f"{ARXIV}primary_category")
+
+        columns = self.columns
+        columns["id"].append(identifier)
+        columns["arxiv_id"].append(arxiv_id)
+        columns["version"].append(version)
+        columns["title"].append(entry.findtext(f"{ATOM}title"))
+        columns["summary"].append(entry.findtext(f"{ATOM}summary"))
+        columns["published"].append(entry.findtext(f"{ATOM}published"))
+        columns["updated"].append(entry.findtext(f"{ATOM}updated"))
+        columns["journal_ref"].append(entry.findtext(f"{ARXIV}journal_ref"))
+        columns["doi"].append(entry.findtext(f"{ARXIV}doi"))
+        columns["authors"].append(
+            [author.findtext(f"{ATOM}name") for author in entry.iter(f"{ATOM}author")]
+        )
+        columns["categories"].append(
+            [category.get("term") for category in entry.iter(f"{ATOM}category")]
+        )
+        columns["primary_category"].append(
+            primary.get("term") if primary is not None else None
+        )
+
+
+def parse_feed(data: bytes, chunk_size: int = FEED_CHUNK_BYTES) -> pd.DataFrame:
+    """Parses a complete Atom feed, a chunk at a time so parsed entries are
+    released before the rest of the feed is read
+    Args:
+        data (bytes): Atom feed
+        chunk_size (int, optional): bytes fed at a time.
+                                    Defaults to FEED_CHUNK_BYTES.
+    Returns:
+        pd.DataFrame: one row per entry
+    """
+    parser = AtomParser()
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        parser.feed(view[start : start + chunk_size])
+    parser.close()
+    return parser.to_dataframe()
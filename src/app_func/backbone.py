@@ -0,0 +1,160 @@
+from typing import Tuple
+
+import numpy as np
+
+from app_func.similarity import sort_edges
+
+# "top" keeps the strongest links overall, the others a backbone of them
+BACKBONES = ["top", "spanning_tree", "disparity", "degree_cap"]
+# candidate links per paper the backbones are extracted from
+CANDIDATE_NEIGHBOURS = 10
+# strongest links per paper added to the spanning tree
+TREE_NEIGHBOURS = 2
+MAX_DEGREE = 5
+
+
+def edge_ranks(edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Rank of every edge among the edges of each of its ends, 0 for the
+    strongest edge of a node, ties broken by edge order
+    Args:
+        edges (np.ndarray): edge array of EDGE_DTYPE
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: rank at "src" and rank at "dst"
+    """
+    num_edges = len(edges)
+    nodes = np.concatenate([edges["src"], edges["dst"]]).astype(np.int64)
+    ids = np.tile(np.arange(num_edges), 2)
+    order = np.lexsort((ids, -edges["weight"][ids], nodes))
+    sorted_nodes = nodes[order]
+    ranks = np.empty(2 * num_edges, dtype=np.int64)
+    ranks[order] = np.arange(2 * num_edges) - np.searchsorted(
+        sorted_nodes, sorted_nodes, side="left"
+    )
+    return ranks[:num_edges], ranks[num_edges:]
+
+
+def maximum_spanning_forest(edges: np.ndarray, num_nodes: int) -> np.ndarray:
+    """Maximum weight spanning forest with Boruvka's algorithm: every round
+    each component takes its strongest edge to another component, so all
+    components merge at once and there are at most log2(num_nodes) rounds
+    of array operations
+    Args:
+        edges (np.ndarray): edge array of EDGE_DTYPE
+        num_nodes (int): number of nodes
+    Returns:
+        np.ndarray: edges of the forest, sorted by descending weight
+    """
+    num_edges = len(edges)
+    src = edges["src"].astype(np.int64)
+    dst = edges["dst"].astype(np.int64)
+    # a strict order of the edges, so equal weights never close a cycle
+    order = np.lexsort((np.arange(num_edges), -edges["weight"]))
+    rank = np.empty(num_edges, dtype=np.int64)
+    rank[order] = np.arange(num_edges)
+
+    nodes = np.arange(num_nodes)
+    component = nodes.copy()
+    in_forest = np.zeros(num_edges, dtype=bool)
+    while True:
+        ends = np.stack([component[src], component[dst]])
+        crossing = np.flatnonzero(ends[0] != ends[1])
+        if len(crossing) == 0:
+            break
+        best = np.full(num_nodes, num_edges)
+        np.minimum.at(best, ends[:, crossing].ravel(), np.tile(rank[crossing], 2))
+        merging = np.flatnonzero(best < num_edges)
+        chosen = order[best[merging]]
+        in_forest[chosen] = True
+
+        # every component points to the other end of its edge, two
+        # components that chose the same edge point to each other
+        parent = nodes.copy()
+        parent[merging] = np.where(
+            ends[0, chosen] == merging, ends[1, chosen], ends[0, chosen]
+        )
+        mutual = (parent[parent] == nodes) & (parent > nodes)
+        parent[mutual] = nodes[mutual]
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+        component = parent[component]
+    return sort_edges(edges[in_forest])
+
+
+def disparity_alpha(edges: np.ndarray, num_nodes: int) -> np.ndarray:
+    """Significance of every edge under the disparity filter: the chance
+    that a node spreading its strength uniformly at random over its edges
+    gives the edge at least its weight, the smaller of both ends
+    Args:
+        edges (np.ndarray): edge array of EDGE_DTYPE
+        num_nodes (int): number of nodes
+    Returns:
+        np.ndarray: alpha of every edge, small for significant edges
+    """
+    weights = np.maximum(edges["weight"].astype(np.float64), 0.0)
+    ends = [edges["src"].astype(np.int64), edges["dst"].astype(np.int64)]
+    strength = sum(np.bincount(end, weights, num_nodes) for end in ends)
+    degree = sum(np.bincount(end, minlength=num_nodes) for end in ends)
+    alphas = [
+        (1.0 - weights / np.maximum(strength[end], 1e-12)) ** (degree[end] - 1)
+        for end in ends
+    ]
+    return np.minimum(*alphas)
+
+
+def backbone_edges(
+    edges: np.ndarray,
+    num_nodes: int,
+    num_links: int,
+    method: str = "spanning_tree",
+    num_neighbours: int = TREE_NEIGHBOURS,
+    max_degree: int = MAX_DEGREE,
+    alpha: float = 1.0,
+) -> np.ndarray:
+    """Sparsifies similarity edges to at most `num_links`, keeping the
+    links that carry the structure of the graph rather than the strongest
+    ones, which crowd into the densest clusters
+    Args:
+        edges (np.ndarray): candidate edge array of EDGE_DTYPE, e.g. the
+                            nearest neighbours of every paper
+        num_nodes (int): number of nodes
+        num_links (int): most edges kept
+        method (str, optional): "spanning_tree" keeps the maximum spanning
+            forest, then the strongest `num_neighbours` edges of every node,
+            "disparity" the edges most significant under the disparity
+            filter, "degree_cap" the strongest edges among the
+            `max_degree` strongest of both their ends, "top" the strongest
+            edges. Defaults to "spanning_tree".
+        num_neighbours (int, optional): Edges per node added to the forest.
+                                        Defaults to TREE_NEIGHBOURS.
+        max_degree (int, optional): Most edges per node of "degree_cap".
+                                    Defaults to MAX_DEGREE.
+        alpha (float, optional): Significance level of "disparity", edges
+            of a larger alpha are dropped. Defaults to 1.0.
+    Raises:
+        ValueError: when the method is unknown
+    Returns:
+        np.ndarray: edge array of EDGE_DTYPE, sorted by descending weight
+    """
+    if method not in BACKBONES:
+        raise ValueError(f"backbone must be one of {BACKBONES}")
+    edges = sort_edges(edges)
+    if method == "spanning_tree":
+        forest = maximum_spanning_forest(edges, num_nodes)
+        src_rank, dst_rank = edge_ranks(edges)
+        nearest = edges[np.minimum(src_rank, dst_rank) < num_neighbours]
+        edges = np.concatenate([forest, nearest])
+        pair_keys = edges["src"].astype(np.int64) * num_nodes + edges["dst"]
+        _, first = np.unique(pair_keys, return_index=True)
+        # forest edges come first and survive a tight link budget
+        edges = edges[np.sort(first)]
+    elif method == "disparity":
+        alphas = disparity_alpha(edges, num_nodes)
+        order = np.argsort(alphas, kind="stable")
+        edges = edges[order[alphas[order] < alpha]]
+    elif method == "degree_cap":
+        src_rank, dst_rank = edge_ranks(edges)
+        edges = edges[np.maximum(src_rank, dst_rank) < max_degree]
+    return sort_edges(edges[:num_links])
@@ -0,0 +1,242 @@
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# seconds a search of the app should take, 0 for no limit
+DEFAULT_LATENCY_BUDGET = float(os.environ.get("ARXIV_LATENCY_BUDGET", "20")) or None
+# share of the remaining budget a plan may use, the rest absorbs misestimates
+HEADROOM = 0.8
+# fewest papers the graph is degraded to, the minimum of the papers slider
+MIN_PAPERS = 10
+GRAPH_STAGES = ("encode", "similarity", "layout", "cluster", "network_graph")
+SECONDARY_STAGES = ("word_cloud", "keywords", "year_trend", "published_bar")
+SECONDARY_LABELS = {
+    "word_cloud": "word cloud",
+    "keywords": "related keywords",
+    "year_trend": "yearly trend",
+    "published_bar": "published papers chart",
+}
+# seconds per paper of the stages never measured in this process
+PRIOR_SECONDS_PER_PAPER = {
+    "encode": 0.02,
+    "similarity": 1e-4,
+    "layout": 2e-3,
+    "cluster": 1e-3,
+    "network_graph": 5e-4,
+    "word_cloud": 1e-3,
+    "keywords": 2e-4,
+    "year_trend": 1e-4,
+    "published_bar": 1e-4,
+}
+# force iterations of a cached layout, previous positions are kept as they are
+CACHED_LAYOUT_ITERATIONS = 0
+
+_SHARED_COSTS: Optional["StageCostModel"] = None
+_SHARED_COSTS_LOCK = threading.Lock()
+
+
+def stage_papers(sizes: Dict[str, int]) -> int:
+    """Papers a stage worked on, from the input sizes of its record: the
+    rows of its input, at most `num_papers` for the encoder
+    Args:
+        sizes (Dict[str, int]): "sizes" of a stage record
+    Returns:
+        int: number of papers
+    """
+    rows = sizes.get("rows", 0)
+    return min(rows, sizes.get("num_papers", rows))
+
+
+class StageCostModel:
+    """Predicts the wall time of a stage from the number of papers it gets.
+    A line is fitted to the recent timings of every stage, and the 90th
+    percentile of its residuals is added, so predictions cover slow runs
+    rather than average ones. Only the latest runs are kept, so predictions
+    follow the load of the pod. Stages never measured use a prior cost per
+    paper.
+    """
+
+    def __init__(self, history: int = 50) -> None:
+        """Instantiates an empty model
+        Args:
+            history (int, optional): Runs kept per stage. Defaults to 50.
+        """
+        self.history = history
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, request: Dict[str, Any]) -> None:
+        """Records the stages of a finished request, except those it degraded
+        Args:
+            request (Dict[str, Any]): request record of `Instrumentation`
+        """
+        degraded = set(request.get("budget", {}).get("degraded_stages", ()))
+        with self._lock:
+            for stage in request["stages"]:
+                if stage["stage"] in degraded:
+                    continue
+                samples = self._samples.setdefault(
+                    stage["stage"], deque(maxlen=self.history)
+                )
+                samples.append((stage_papers(stage["sizes"]), stage["seconds"]))
+
+    def predict(self, stage: str, num_papers: int) -> float:
+        """Predicted wall time of a stage
+        Args:
+            stage (str): stage name
+            num_papers (int): papers the stage gets
+        Returns:
+            float: seconds
+        """
+        with self._lock:
+            samples = list(self._samples.get(stage, ()))
+        if not samples:
+            return PRIOR_SECONDS_PER_PAPER.get(stage, 0.0) * num_papers
+        papers, seconds = np.array(samples, dtype=np.float64).T
+        intercept, slope = _fit_line(papers, seconds)
+        residuals = seconds - (intercept + slope * papers)
+        margin = max(float(np.quantile(residuals, 0.9)), 0.0)
+        return intercept + slope * num_papers + margin
+
+
+def _fit_line(papers: np.ndarray, seconds: np.ndarray) -> Tuple[float, float]:
+    """Least squares intercept and slope, neither negative"""
+    if np.ptp(papers) > 0:
+        slope, intercept = np.polyfit(papers, seconds, 1)
+        if slope >= 0 and intercept >= 0:
+            return float(intercept), float(slope)
+        if slope < 0:
+            return float(seconds.mean()), 0.0
+    # through the origin, the cost per paper
+    total = float((papers * papers).sum())
+    if total == 0:
+        return float(seconds.mean()), 0.0
+    return 0.0, float((papers * seconds).sum() / total)
+
+
+class BudgetPlan(NamedTuple):
+    """Parameters a search runs with to meet its latency budget"""
+
+    num_papers: int
+    layout_iterations: Optional[int]
+    skip_secondary: bool
+    predicted_seconds: float
+    requested_papers: int
+
+    @property
+    def degraded_stages(self) -> List[str]:
+        """Stages run at less than their full cost per paper, their timings
+        are not learned from"""
+        return [] if self.layout_iterations is None else ["layout"]
+
+    def notes(self, skipped: Sequence[str] = ()) -> List[str]:
+        """What the search degraded, for the user
+        Args:
+            skipped (Sequence[str], optional): secondary stages that did not
+                                               run. Defaults to ().
+        Returns:
+            List[str]: one sentence per degradation
+        """
+        notes = []
+        if self.num_papers < self.requested_papers:
+            notes.append(f"Encoded {self.num_papers} of {self.requested_papers} papers")
+        if self.layout_iterations is not None:
+            notes.append("Reused the previous graph layout")
+        if skipped:
+            labels = [SECONDARY_LABELS[stage] for stage in skipped]
+            if len(labels) > 1:
+                labels = [", ".join(labels[:-1]) + " and " + labels[-1]]
+            notes.append(f"Skipped the {labels[0]}")
+        return notes
+
+
+def plan_search(
+    predict: Callable[[str, int], float],
+    remaining: float,
+    num_rows: int,
+    num_papers: int,
+    cached: Sequence[str] = (),
+    layout_cached: bool = False,
+) -> BudgetPlan:
+    """Degrades a search until its predicted time fits the remaining budget:
+    the word cloud, keywords and charts are skipped first, then the layout
+    keeps the previous positions, then fewer papers are encoded, down to
+    MIN_PAPERS
+    Args:
+        predict (Callable[[str, int], float]): predicted seconds of a stage
+            for a number of papers, e.g. `StageCostModel.predict`
+        remaining (float): seconds left of the budget
+        num_rows (int): deduplicated papers
+        num_papers (int): papers asked for in the graph
+        cached (Sequence[str], optional): stages whose result for the
+            requested parameters is cached, they cost nothing. Defaults to ().
+        layout_cached (bool, optional): Whether positions of a previous
+            layout are available. Defaults to False.
+    Returns:
+        BudgetPlan: parameters to run with
+    """
+    requested = min(num_papers, num_rows)
+    available = remaining * HEADROOM
+
+    def graph_seconds(papers: int, layout: bool) -> float:
+        stages = [stage for stage in GRAPH_STAGES if layout or stage != "layout"]
+        # at any other size nothing is cached
+        skip = set(cached) if papers == requested else set()
+        return sum(predict(stage, papers) for stage in stages if stage not in skip)
+
+    secondary = sum(
+        predict(stage, num_rows) for stage in SECONDARY_STAGES if stage not in cached
+    )
+    seconds = graph_seconds(requested, True)
+    if seconds + secondary <= available:
+        return BudgetPlan(num_papers, None, False, seconds + secondary, requested)
+
+    layout_iterations = None
+    if seconds > available and layout_cached and "layout" not in cached:
+        layout_iterations = CACHED_LAYOUT_ITERATIONS
+    layout = layout_iterations is None
+
+    # the cost grows with the papers, the largest count that fits is searched
+    low, high = min(MIN_PAPERS, requested), requested
+    if graph_seconds(high, layout) > available:
+        while low < high:
+            middle = (low + high + 1) // 2
+            if graph_seconds(middle, layout) <= available:
+                low = middle
+            else:
+                high = middle - 1
+    papers = num_papers if high == requested else high
+    return BudgetPlan(
+        papers,
+        layout_iterations,
+        secondary > 0,
+        graph_seconds(min(papers, requested), layout),
+        requested,
+    )
+
+
+def get_cost_model() -> StageCostModel:
+    """Returns the process-wide cost model, learning from the searches of
+    every session
+    Returns:
+        StageCostModel: shared cost model
+    """
+    global _SHARED_COSTS
+    with _SHARED_COSTS_LOCK:
+        if _SHARED_COSTS is None:
+            _SHARED_COSTS = StageCostModel()
+        return _SHARED_COSTS
+
+
+def complete_results(results: Dict[str, Any]) -> bool:
+    """Whether search results were computed without degradation, only those
+    are worth sharing
+    Args:
+        results (Dict[str, Any]): output of `SearchPipeline.run`
+    Returns:
+        bool: True when nothing was given up to meet the budget
+    """
+    return not results.get("degraded")
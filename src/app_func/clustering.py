@@ -0,0 +1,398 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app_func.ann_index import AnnIndex
+from app_func.similarity import knn_edges, normalize_embeddings, top_k_neighbours
+from app_func.term_stats import TermStatistics, get_term_statistics
+
+CLUSTER_METHODS = ["kmeans", "community"]
+
+
+def default_num_clusters(num_papers: int) -> int:
+    """Number of clusters for a batch of papers, sqrt(N / 2) within [2, 30]
+    Args:
+        num_papers (int): number of papers
+    Returns:
+        int: number of clusters
+    """
+    if num_papers < 2:
+        return 1
+    return int(np.clip(round(np.sqrt(num_papers / 2)), 2, min(30, num_papers)))
+
+
+class MiniBatchKMeans:
+    """Spherical mini-batch k-means over unit embeddings.
+    Every step assigns a random mini-batch to its closest centroids and
+    moves each centroid towards its batch members with a per-centroid
+    learning rate of 1 / (points seen), so later batches nudge rather than
+    replace it. `partial_fit` continues from the current centroids, which
+    lets new papers be absorbed without refitting the old ones.
+    """
+
+    def __init__(
+        self,
+        num_clusters: int,
+        batch_size: int = 1024,
+        max_iterations: int = 100,
+        tolerance: float = 1e-4,
+        seed: int = 0,
+    ) -> None:
+        """Instantiates an unfitted model
+        Args:
+            num_clusters (int): number of clusters
+            batch_size (int, optional): Papers per step. Defaults to 1024.
+            max_iterations (int, optional): Steps of `fit`. Defaults to 100.
+            tolerance (float, optional): Centroid shift below which `fit`
+                                         stops early. Defaults to 1e-4.
+            seed (int, optional): Seed of the initialisation and batches.
+                                  Defaults to 0.
+        """
+        self.num_clusters = num_clusters
+        self.batch_size = batch_size
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.rng = np.random.default_rng(seed)
+        self.centroids: Optional[np.ndarray] = None
+        self.counts: Optional[np.ndarray] = None
+
+    def fit(self, embeddings: np.ndarray) -> "MiniBatchKMeans":
+        """Fits the centroids from scratch
+        Args:
+            embeddings (np.ndarray): (N, dim) embeddings
+        Returns:
+            MiniBatchKMeans: fitted model
+        """
+        vectors = normalize_embeddings(embeddings)
+        self._initialise(vectors)
+        batch_size = min(self.batch_size, len(vectors))
+        for _ in range(self.max_iterations):
+            batch = vectors[self.rng.choice(len(vectors), batch_size, replace=False)]
+            shift = self._step(batch)
+            if shift < self.tolerance:
+                break
+        return self
+
+    def partial_fit(self, embeddings: np.ndarray) -> "MiniBatchKMeans":
+        """Updates the centroids with new papers, one pass in mini-batches
+        Args:
+            embeddings (np.ndarray): (N, dim) embeddings of the new papers
+        Returns:
+            MiniBatchKMeans: updated model
+        """
+        vectors = normalize_embeddings(embeddings)
+        if self.centroids is None:
+            self._initialise(vectors)
+        for start in range(0, len(vectors), self.batch_size):
+            self._step(vectors[start : start + self.batch_size])
+        return self
+
+    def predict(self, embeddings: np.ndarray) -> np.ndarray:
+        """Closest centroid of every paper
+        Args:
+            embeddings (np.ndarray): (N, dim) embeddings
+        Returns:
+            np.ndarray: (N,) cluster of every paper
+        """
+        indices, _ = top_k_neighbours(
+            normalize_embeddings(embeddings), 1, corpus=self.centroids, normalized=True
+        )
+        return indices[:, 0].astype(np.int64)
+
+    def _initialise(self, vectors: np.ndarray) -> None:
+        """k-means++ seeding on a sample of the papers"""
+        sample = vectors[
+            self.rng.choice(
+                len(vectors), min(len(vectors), 50 * self.num_clusters), replace=False
+            )
+        ]
+        num_clusters = min(self.num_clusters, len(sample))
+        chosen = [int(self.rng.integers(len(sample)))]
+        distance = 1.0 - sample @ sample[chosen[0]]
+        for _ in range(1, num_clusters):
+            probabilities = np.maximum(distance, 0.0)
+            total = probabilities.sum()
+            if total <= 0:
+                break
+            chosen.append(int(self.rng.choice(len(sample), p=probabilities / total)))
+            distance = np.minimum(distance, 1.0 - sample @ sample[chosen[-1]])
+        self.centroids = sample[chosen].copy()
+        self.counts = np.zeros(len(chosen))
+
+    def _step(self, batch: np.ndarray) -> float:
+        """Moves the centroids towards one mini-batch, returns the largest shift"""
+        assignments = np.argmax(batch @ self.centroids.T, axis=1)
+        batch_counts = np.bincount(assignments, minlength=len(self.centroids))
+        sums = np.zeros_like(self.centroids)
+        np.add.at(sums, assignments, batch)
+        self.counts += batch_counts
+        moved = batch_counts > 0
+        rate = (batch_counts[moved] / self.counts[moved])[:, None]
+        means = sums[moved] / batch_counts[moved, None]
+        previous = self.centroids[moved]
+        self.centroids[moved] = normalize_embeddings(
+            (1.0 - rate) * previous + rate * means
+        )
+        if not moved.any():
+            return 0.0
+        return float(np.abs(self.centroids[moved] - previous).max())
+
+
+def knn_lists(
+    embeddings: np.ndarray,
+    k: int = 10,
+    queries: Optional[np.ndarray] = None,
+    exact_threshold: int = 16384,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest papers of some papers among all of them
+    Args:
+        embeddings (np.ndarray): (N, dim) embeddings
+        k (int, optional): neighbours per paper. Defaults to 10.
+        queries (Optional[np.ndarray], optional): Positions of the papers to
+                                                  look up, all when None.
+        exact_threshold (int, optional): Above this size the neighbours come
+                                         from an IVF index. Defaults to 16384.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (Q, k + 1) neighbour positions and
+            weights, possibly including the paper itself, padded with -1
+            and -inf
+    """
+    vectors = normalize_embeddings(embeddings)
+    queries = np.arange(len(vectors)) if queries is None else queries
+    indices = np.full((len(queries), k + 1), -1, dtype=np.int64)
+    weights = np.full((len(queries), k + 1), -np.inf, dtype=np.float32)
+    if len(vectors) <= exact_threshold:
+        found, scores = top_k_neighbours(
+            vectors[queries], k + 1, corpus=vectors, normalized=True
+        )
+    else:
+        index = AnnIndex(vectors.shape[1], exact_threshold=0)
+        index.add(map(str, range(len(vectors))), vectors)
+        found, scores = index.search(vectors[queries], k + 1)
+    indices[:, : found.shape[1]] = found
+    weights[:, : found.shape[1]] = scores
+    return indices, weights
+
+
+def knn_graph(
+    embeddings: np.ndarray, k: int = 10, exact_threshold: int = 16384
+) -> np.ndarray:
+    """Similarity graph linking every paper to its k nearest papers
+    Args:
+        embeddings (np.ndarray): (N, dim) embeddings
+        k (int, optional): neighbours per paper. Defaults to 10.
+        exact_threshold (int, optional): Above this size the neighbours come
+                                         from an IVF index. Defaults to 16384.
+    Returns:
+        np.ndarray: edge array of EDGE_DTYPE
+    """
+    return knn_edges(*knn_lists(embeddings, k, exact_threshold=exact_threshold))
+
+
+def label_propagation(
+    num_nodes: int,
+    src: np.ndarray,
+    dst: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    initial: Optional[np.ndarray] = None,
+    max_iterations: int = 30,
+    seed: int = 0,
+) -> np.ndarray:
+    """Community detection by weighted label propagation.
+    Every node repeatedly adopts the label carrying the largest total edge
+    weight among its neighbours until no node wants to change. Each round
+    is one sort and a few linear passes over the edge list, and a random
+    half of the nodes updates per round so labels cannot oscillate.
+    Args:
+        num_nodes (int): number of nodes
+        src (np.ndarray): source node of every edge
+        dst (np.ndarray): target node of every edge
+        weights (Optional[np.ndarray], optional): Edge weights, all ones
+                                                  when None. Defaults to None.
+        initial (Optional[np.ndarray], optional): Starting labels, negative
+            for nodes without one, e.g. the communities of a previous run.
+            Defaults to None.
+        max_iterations (int, optional): Round budget. Defaults to 30.
+        seed (int, optional): Seed of the update order. Defaults to 0.
+    Returns:
+        np.ndarray: (num_nodes,) community of every node, numbered by
+            decreasing size, or keeping the `initial` numbers
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.arange(num_nodes, dtype=np.int64)
+    if initial is not None:
+        initial = np.asarray(initial, dtype=np.int64)
+        unlabelled = initial < 0
+        labels = initial.copy()
+        labels[unlabelled] = initial.max(initial=-1) + 1 + np.arange(unlabelled.sum())
+    values, labels = np.unique(labels, return_inverse=True)
+    num_labels = len(values)
+    weights = np.ones(len(src)) if weights is None else np.asarray(weights, float)
+    nodes = np.concatenate([src, dst]).astype(np.int64)
+    neighbours = np.concatenate([dst, src]).astype(np.int64)
+    edge_weights = np.concatenate([weights, weights])
+
+    for _ in range(max_iterations):
+        keys, inverse = np.unique(
+            nodes * num_labels + labels[neighbours], return_inverse=True
+        )
+        scores = np.bincount(inverse, edge_weights)
+        key_nodes, key_labels = keys // num_labels, keys % num_labels
+        # keys are sorted by node, so every node owns one segment; keeping
+        # the current label wins ties, then the smallest label
+        scores = scores + 1e-9 * (key_labels == labels[key_nodes])
+        starts = np.flatnonzero(np.r_[True, key_nodes[1:] != key_nodes[:-1]])
+        best = np.maximum.reduceat(scores, starts)
+        segment = np.cumsum(np.r_[False, key_nodes[1:] != key_nodes[:-1]])
+        winners = np.flatnonzero(scores >= best[segment])
+        winners = winners[
+            np.r_[True, key_nodes[winners][1:] != key_nodes[winners][:-1]]
+        ]
+        proposal = labels.copy()
+        proposal[key_nodes[winners]] = key_labels[winners]
+        changing = proposal != labels
+        if not changing.any():
+            break
+        update = changing & (rng.random(num_nodes) < 0.5)
+        labels[update] = proposal[update]
+
+    if initial is not None:
+        # surviving communities keep their number, new ones follow on
+        labels = values[labels]
+        new = labels > initial.max(initial=-1)
+        _, labels[new] = np.unique(labels[new], return_inverse=True)
+        labels[new] += initial.max(initial=-1) + 1
+        return labels
+    _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return rank[labels]
+
+
+class PaperClusters:
+    """Clusters papers and keeps their assignments across searches.
+    Papers already clustered keep their cluster when a result set mostly
+    overlaps the previous one: k-means only absorbs the new papers through
+    `partial_fit`, and label propagation starts from the previous
+    communities over a neighbour graph where only the new papers are
+    looked up. A mostly new result set is clustered from scratch.
+    """
+
+    def __init__(
+        self,
+        num_clusters: Optional[int] = None,
+        neighbours: int = 10,
+        num_terms: int = 3,
+        seed: int = 0,
+        terms: Optional[TermStatistics] = None,
+    ) -> None:
+        """Instantiates the clusterer
+        Args:
+            num_clusters (Optional[int], optional): k-means clusters, chosen
+                from the number of papers when None. Defaults to None.
+            neighbours (int, optional): Neighbours per paper in the graph of
+                                        the community method. Defaults to 10.
+            num_terms (int, optional): Terms per cluster label. Defaults to 3.
+            seed (int, optional): Seed of both methods. Defaults to 0.
+            terms (Optional[TermStatistics], optional): Term counts behind the
+                cluster labels, the shared summary counts when None.
+        """
+        self.num_clusters = num_clusters
+        self.neighbours = neighbours
+        self.num_terms = num_terms
+        self.seed = seed
+        self.terms = terms if terms is not None else get_term_statistics()
+        self.kmeans: Optional[MiniBatchKMeans] = None
+        self.assignments: Dict[str, Dict[str, int]] = {
+            method: {} for method in CLUSTER_METHODS
+        }
+        self._knn_ids: Optional[np.ndarray] = None
+        self._knn_indices: Optional[np.ndarray] = None
+        self._knn_weights: Optional[np.ndarray] = None
+
+    def cluster(
+        self, df: pd.DataFrame, embeddings: np.ndarray, method: str = "kmeans"
+    ) -> pd.DataFrame:
+        """Assigns every paper to a cluster
+        Args:
+            df (pd.DataFrame): papers with "id", "title" and the text column of
+                               the term statistics
+            embeddings (np.ndarray): embeddings of the papers
+            method (str, optional): "kmeans" or "community". Defaults to "kmeans".
+        Returns:
+            pd.DataFrame: "id", "title", "cluster" and "cluster_label" of
+                every paper, in the order of df
+        """
+        if method not in CLUSTER_METHODS:
+            raise ValueError(f"Unknown clustering method {method}")
+        previous = self.assignments[method]
+        ids = df["id"].to_numpy()
+        initial = np.array([previous.get(i, -1) for i in ids], dtype=np.int64)
+        if len(ids) == 0 or (initial >= 0).mean() < 0.5:
+            initial[:] = -1
+
+        if method == "kmeans":
+            clusters = self._kmeans(embeddings, initial)
+        else:
+            edges = self._knn_graph(ids, embeddings, initial >= 0)
+            clusters = label_propagation(
+                len(ids),
+                edges["src"],
+                edges["dst"],
+                edges["weight"],
+                initial=initial if (initial >= 0).any() else None,
+                seed=self.seed,
+            )
+        self.assignments[method] = dict(zip(ids, clusters.tolist()))
+
+        terms = self.terms.cluster_terms(df, clusters, self.num_terms)
+        return pd.DataFrame(
+            {
+                "id": ids,
+                "title": df["title"].to_numpy(),
+                "cluster": clusters,
+                "cluster_label": [
+                    ", ".join(terms.get(c, [])) or f"cluster {c}" for c in clusters
+                ],
+            },
+            index=df.index,
+        )
+
+    def _kmeans(self, embeddings: np.ndarray, initial: np.ndarray) -> np.ndarray:
+        """k-means clusters, reusing the model when most papers are known"""
+        known = initial >= 0
+        if self.kmeans is None or not known.any():
+            num_clusters = self.num_clusters or default_num_clusters(len(embeddings))
+            self.kmeans = MiniBatchKMeans(num_clusters, seed=self.seed)
+            self.kmeans.fit(embeddings)
+            return self.kmeans.predict(embeddings)
+
+        clusters = initial.copy()
+        if not known.all():
+            self.kmeans.partial_fit(embeddings[~known])
+            clusters[~known] = self.kmeans.predict(embeddings[~known])
+        return clusters
+
+    def _knn_graph(
+        self, ids: np.ndarray, embeddings: np.ndarray, known: np.ndarray
+    ) -> np.ndarray:
+        """Neighbour graph, reusing the neighbour lists of known papers"""
+        rows = np.full(len(ids), -1)
+        if self._knn_ids is not None and known.any() and pd.Index(ids).is_unique:
+            rows = pd.Index(self._knn_ids).get_indexer(ids)
+        new = rows < 0
+        indices = np.full((len(ids), self.neighbours + 1), -1, dtype=np.int64)
+        weights = np.full(indices.shape, -np.inf, dtype=np.float32)
+        if not new.all():
+            # previous positions -> current positions, -1 for dropped papers
+            remap = pd.Index(ids).get_indexer(self._knn_ids)
+            previous = self._knn_indices[rows[~new]]
+            indices[~new] = np.where(previous >= 0, remap[previous], -1)
+            weights[~new] = self._knn_weights[rows[~new]]
+        if new.any():
+            indices[new], weights[new] = knn_lists(
+                embeddings, self.neighbours, queries=np.flatnonzero(new)
+            )
+        self._knn_ids, self._knn_indices, self._knn_weights = ids, indices, weights
+        return knn_edges(indices, weights)
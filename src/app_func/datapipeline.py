@@ -1,7 +1,30 @@
-import urllib
+import os
+from typing import Iterator, Optional, Tuple
+import numpy as np
 import pandas as pd
-from xml.dom.minidom import parseString
-from app_func.sentence_encoder import SentenceEncoder
+from app_func.ann_index import (
+    ann_edges,
+    ann_neighbours,
+    get_ann_index,
+    open_ann_index,
+)
+from app_func.arxiv_client import ArxivClient
+from app_func.atom_parser import AtomParser
+from app_func.backbone import CANDIDATE_NEIGHBOURS, backbone_edges
+from app_func.dedup import DEFAULT_DEDUP_THRESHOLD, deduplicate
+from app_func.embedding_cache import embedding_key
+from app_func.local_corpus import LocalCorpus
+from app_func.paper_table import clean_text, paper_table, publication_years
+from app_func.query_cache import QueryCache, get_query_cache
+from app_func.sentence_encoder import SentenceEncoder, get_sentence_encoder
+from app_func.similarity import knn_edges, top_k_edges, top_k_neighbours
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ARXIV_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "arvix-clustering-search"),
+)
+DEFAULT_LOCAL_CORPUS = os.environ.get("ARXIV_LOCAL_CORPUS")
+DEFAULT_INDEX_QUANTIZATION = os.environ.get("ARXIV_INDEX_QUANTIZATION", "float32")
 
 
 class DataPipeline:
@@ -11,6 +34,15 @@ class DataPipeline:
         self,
         method_name: str = "query",
         parameters: str = "search_query=all",
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        base_url: str = "http://export.arxiv.org/api",
+        query_cache: Optional[QueryCache] = None,
+        ann_threshold: int = 2000,
+        index_save_every: int = 500,
+        local_corpus: Optional[str] = DEFAULT_LOCAL_CORPUS,
+        encoder: Optional[SentenceEncoder] = None,
+        index_quantization: str = DEFAULT_INDEX_QUANTIZATION,
+        dedup_threshold: Optional[float] = DEFAULT_DEDUP_THRESHOLD,
     ):
         """Initializes Datapipeline object with Sentence Encoder
            as well as API keywords
@@ -19,29 +51,169 @@ class DataPipeline:
                                          Defaults to "query".
             parameters (str, optional): Sets API query to search all arXiv.
                                         Defaults to "search_query=all".
+            cache_dir (Optional[str], optional): Directory for on-disk caches,
+                caching is disabled when None. Defaults to DEFAULT_CACHE_DIR.
+            base_url (str, optional): Root of the arXiv API.
+                                      Defaults to "http://export.arxiv.org/api".
+            query_cache (Optional[QueryCache], optional): Cache of parsed query
+                results, the process-wide cache under `cache_dir` is used
+                when None. Defaults to None.
+            ann_threshold (int, optional): Papers above which graph links are
+                found with an approximate nearest neighbour index instead of
+                exact blocked similarity. Defaults to 2000.
+            index_save_every (int, optional): Number of newly indexed papers
+                after which the corpus index is written to disk.
+                Defaults to 500.
+            local_corpus (Optional[str], optional): Directory of a store built
+                with `python -m app_func.local_corpus ingest`, queries are
+                answered from it instead of the arXiv API when given.
+                Defaults to DEFAULT_LOCAL_CORPUS.
+            encoder (Optional[SentenceEncoder], optional): Encoder of the
+                papers, the shared default model caching under `cache_dir`
+                when None. Defaults to None.
+            index_quantization (str, optional): Storage of the corpus index
+                vectors, "float32", "float16" or "int8". int8 keeps about 4x
+                more papers in memory. Defaults to DEFAULT_INDEX_QUANTIZATION.
+            dedup_threshold (Optional[float], optional): Estimated Jaccard
+                similarity of two abstracts above which they are collapsed
+                into one paper, only versions of a paper are collapsed when
+                None. Defaults to DEFAULT_DEDUP_THRESHOLD.
         """
         self.method_name = method_name
-        self.encoder = SentenceEncoder()
+        self.cache_dir = cache_dir
+        self.base_url = base_url
+        self.client = ArxivClient(base_url, method_name, parameters)
+        if encoder is None:
+            embedding_dir = os.path.join(cache_dir, "embeddings") if cache_dir else None
+            encoder = get_sentence_encoder(cache_dir=embedding_dir)
+        self.encoder = encoder
         self.parameters = parameters
+        if query_cache is None:
+            query_dir = os.path.join(cache_dir, "queries") if cache_dir else None
+            query_cache = get_query_cache(query_dir)
+        self.query_cache = query_cache
+        self.ann_threshold = ann_threshold
+        self.index_save_every = index_save_every
+        self.index_dir = os.path.join(cache_dir, "ann_index") if cache_dir else None
+        self.index_quantization = index_quantization
+        self.local_corpus = LocalCorpus(local_corpus) if local_corpus else None
+        self.dedup_threshold = dedup_threshold
 
     def query_arxiv(self, search_term: str, num_results: int) -> pd.DataFrame:
         """Function sends an API call to query arXiv
+            results are served from the query cache when a previous query
+            for the same search term covers the requested number of results
         Args:
             search_term (str): search term as defined by user
             num_results (int): maximum number of search terms defined by user
         Returns:
             pd.DataFrame: returns a dataframe with parsed XML data from arXiv
         """
-        search_term = search_term.replace(" ", "+")
+        key = self._query_key(search_term)
+        dataframe = self.query_cache.get(key, num_results)
+        if dataframe is None:
+            dataframe = self._fetch_arxiv(search_term, num_results)
+            self.query_cache.put(key, num_results, dataframe)
 
-        query = f"http://export.arxiv.org/api/{self.method_name}?{self.parameters}:{search_term}&start=0&max_results={num_results}"
-        data = urllib.request.urlopen(query).read()
-        dom = parseString(data)
-        if len(dom.getElementsByTagName("id")) <= 1:
+        if dataframe.empty:
             return False, None
-        dataframe = pd.read_xml(data)
         return True, dataframe
 
+    def query_arxiv_pages(
+        self, search_term: str, num_results: int, first_page_size: int
+    ) -> Iterator[Tuple[pd.DataFrame, bool]]:
+        """Queries arXiv page by page, yielding the papers received so far
+            after every page. The complete result is added to the query cache
+            before it is yielded, so `query_arxiv` answers it afterwards.
+            Cached queries and the local corpus are yielded in one piece
+        Args:
+            search_term (str): search term as defined by user
+            num_results (int): maximum number of search terms defined by user
+            first_page_size (int): results of the first page
+        Yields:
+            Tuple[pd.DataFrame, bool]: parsed entries so far, empty when
+                nothing matched, and whether they are the complete result
+        """
+        key = self._query_key(search_term)
+        dataframe = self.query_cache.get(key, num_results)
+        if dataframe is not None:
+            yield dataframe, True
+            return
+        if self.local_corpus is not None:
+            dataframe = self._search_local(search_term, num_results)
+            self.query_cache.put(key, num_results, dataframe)
+            yield dataframe, True
+            return
+
+        pages = []
+        fetched = self.client.fetch_pages(search_term, num_results, first_page_size)
+        try:
+            for page, last in fetched:
+                pages.append(page)
+                dataframe = AtomParser.concat(pages)
+                if last:
+                    self.query_cache.put(key, num_results, dataframe)
+                yield dataframe, last
+        finally:
+            # cancels the pages not requested yet when the caller stops early
+            fetched.close()
+
+    def _query_key(self, search_term: str) -> str:
+        """Query cache key of a search term at the configured source"""
+        if self.local_corpus is not None:
+            prefix = f"local:{os.path.abspath(self.local_corpus.path)}"
+        else:
+            prefix = f"{self.base_url}/{self.method_name}?{self.parameters}"
+        return QueryCache.make_key(prefix, search_term)
+
+    def _fetch_arxiv(self, search_term: str, num_results: int) -> pd.DataFrame:
+        """Downloads and parses a query result from arXiv
+            results beyond the client page size are fetched as concurrent
+            pages, each parsed while it downloads and merged in order
+        Args:
+            search_term (str): search term as defined by user
+            num_results (int): maximum number of search terms defined by user
+        Returns:
+            pd.DataFrame: parsed entries, empty when nothing matched
+        """
+        if self.local_corpus is not None:
+            return self._search_local(search_term, num_results)
+        return AtomParser.concat(self.client.fetch(search_term, num_results))
+
+    def _search_local(self, search_term: str, num_results: int) -> pd.DataFrame:
+        """Answers a query from the local corpus
+            the precomputed embeddings are added to the embedding cache so
+            the papers are not encoded again
+        Args:
+            search_term (str): search term as defined by user
+            num_results (int): maximum number of search terms defined by user
+        Returns:
+            pd.DataFrame: matching entries, empty when nothing matched
+        """
+        same_model = self.local_corpus.manifest["model_name"] == self.encoder.model_name
+        dataframe = self.local_corpus.search(
+            search_term,
+            num_results,
+            model=self.encoder.model if same_model else None,
+        )
+        if dataframe.empty:
+            return dataframe
+
+        if same_model and self.encoder.cache is not None:
+            # keyed by the text that was encoded, the cleaned abstract the
+            # pipeline encodes later, or the raw one of older stores
+            summaries = dataframe["summary"].fillna("").to_list()
+            if self.local_corpus.manifest.get("clean_summaries"):
+                summaries = clean_text(summaries)
+            self.encoder.cache.put(
+                [
+                    embedding_key(identifier, text)
+                    for identifier, text in zip(dataframe["id"], summaries)
+                ],
+                np.stack(dataframe["embedding"].to_numpy()),
+            )
+        return dataframe.drop(columns="embedding")
+
     def dropna(self, df: pd.DataFrame) -> pd.DataFrame:
         """Function cleans up dataframe returned by arXiv.
             drops empty column in summary and across dataset and resets index
@@ -57,23 +229,37 @@ class DataPipeline:
         return df
 
     def preprocessing_pipeline(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Preprocessing pipeline to clean up summary column
+        """Preprocessing pipeline to clean up summary column. Papers without a
+        summary or with a repeated one are dropped, titles and summaries are
+        cleaned and the year of publication is added, into a new compact
+        table (see `paper_table`) that leaves the input untouched. Unlike
+        `dropna`, columns without any value are kept, e.g. the charts read
+        "journal_ref" when no paper has one
         Args:
             df (pd.DataFrame): preprocessed dataframe from arXiv
         Returns:
             pd.DataFrame: Pre-processed Dataframe
         """
-        df = self.dropna(df)
-        df = df.drop_duplicates(subset=["summary"])
-
-        df["summary"] = df["summary"].replace(
-            {"\n": " ", "\\\\textbf{": "", "}": ""}, regex=True
-        )
-        df["title"] = df["title"].replace(
-            {"\n": " ", "\\\\textbf{": "", "}": ""}, regex=True
-        )
+        summary = df["summary"]
+        rows = np.flatnonzero((summary.notna() & ~summary.duplicated()).to_numpy())
+        papers = {name: df[name].take(rows) for name in df.columns}
+        papers["summary"] = clean_text(papers["summary"])
+        papers["title"] = clean_text(papers["title"])
+        papers["year_published"] = publication_years(papers["published"])
+        return paper_table(papers)
 
-        return df
+    def deduplicate(self, df: pd.DataFrame, col: str = "summary") -> pd.DataFrame:
+        """Collapses the versions of a paper and near-duplicate abstracts
+            into the first of them, found with MinHash and LSH in linear time,
+            so they are encoded and drawn once
+        Args:
+            df (pd.DataFrame): Pre-processed Dataframe
+            col (str, optional): Identifies the summary column.
+                                 Defaults to "summary".
+        Returns:
+            pd.DataFrame: one paper per group, in search order
+        """
+        return deduplicate(df, col=col, threshold=self.dedup_threshold)
 
     def cosine_similarity_pipeline(
         self,
@@ -81,9 +267,9 @@ class DataPipeline:
         col: str = "summary",
         num_encodings: int = 50,
         num_links: int = 50,
-    ) -> pd.DataFrame:
+    ) -> np.ndarray:
         """Creates a ranking of Cosine Similarity scores
-            create embeddings and merging into subset of dataframe
+            between the first papers, identified by their row in df
         Args:
             df (pd.DataFrame): Dataframe from arXiv
             col (str, optional): Identifies the summary column.
@@ -93,25 +279,96 @@ class DataPipeline:
             num_links (int, optional): Slicer to keep only top n links.
                                        Defaults to 50.
         Returns:
-            pd.DataFrame: Cosine Similarity scores with rankings
+            np.ndarray: edge array of EDGE_DTYPE, sorted by descending weight
+        """
+        df = self.deduplicate(df, col=col)
+        _, embeddings = self.encode_papers(df, col=col, num_encodings=num_encodings)
+        return self.similarity_links(embeddings, num_links=num_links)
+
+    def encode_papers(
+        self, df: pd.DataFrame, col: str = "summary", num_encodings: int = 50
+    ) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Encodes the first papers and adds them to the corpus index
+        Args:
+            df (pd.DataFrame): Dataframe from arXiv
+            col (str, optional): Identifies the summary column.
+                                 Defaults to "summary".
+            num_encodings (int, optional): Slicer to use only first
+                    n papers to generate encodigns. Defaults to 50.
+        Returns:
+            Tuple[pd.DataFrame, np.ndarray]: encoded papers and embeddings
         """
         df = df.head(num_encodings)
         embeddings = self.encoder.encode_sentences(df, col=col)
-        cosine_dataframe = self.encoder.pairwise_cosine_similarity(
-            embeddings=embeddings,
-            titles=df.title,
-        )
+        self.index_papers(df, embeddings)
+        return df, embeddings
 
-        href_df = df[["title", "id", "doi"]]
-
-        cosine_dataframe = pd.merge(
-            cosine_dataframe, href_df, left_on="From", right_on="title"
+    def similarity_links(
+        self, embeddings: np.ndarray, num_links: int = 50, backbone: str = "top"
+    ) -> np.ndarray:
+        """Keeps the strongest Cosine Similarity links between encoded papers,
+            or a backbone of the links between nearest neighbours
+        Args:
+            embeddings (np.ndarray): embeddings of the papers
+            num_links (int, optional): Slicer to keep only top n links.
+                                       Defaults to 50.
+            backbone (str, optional): "top" for the strongest links, or a
+                sparsification of `backbone.backbone_edges`.
+                Defaults to "top".
+        Returns:
+            np.ndarray: edge array of EDGE_DTYPE between paper ids, the rows
+                of the embeddings, sorted by descending weight
+        """
+        if backbone == "top":
+            if len(embeddings) > self.ann_threshold:
+                return ann_edges(embeddings, num_links)
+            return top_k_edges(embeddings, num_links)
+        if len(embeddings) > self.ann_threshold:
+            neighbours = ann_neighbours(embeddings, CANDIDATE_NEIGHBOURS + 1)
+        else:
+            neighbours = top_k_neighbours(embeddings, CANDIDATE_NEIGHBOURS)
+        return backbone_edges(
+            knn_edges(*neighbours), len(embeddings), num_links, method=backbone
         )
-        cosine_dataframe.drop(columns="title", inplace=True)
-        cosine_dataframe = (
-            cosine_dataframe.sort_values("Weights", ascending=False)
-            .reset_index(drop=True)
-            .iloc[:num_links]
+
+    def index_papers(self, df: pd.DataFrame, embeddings: np.ndarray) -> None:
+        """Adds papers to the corpus index of everything fetched so far
+        Args:
+            df (pd.DataFrame): papers with "id" and "title" columns
+            embeddings (np.ndarray): embeddings of the papers
+        """
+        if self.index_dir is None or len(df) == 0:
+            return
+        index = get_ann_index(
+            self.index_dir, embeddings.shape[1], self.index_quantization
         )
+        index.add(df["id"], embeddings, labels=df["title"])
+        if index.unsaved >= self.index_save_every:
+            index.save(self.index_dir)
+
+    def more_like_this(self, paper_id: str, num_results: int = 10) -> pd.DataFrame:
+        """Finds the papers most similar to a paper across every paper
+            fetched so far, using the corpus index
+        Args:
+            paper_id (str): arXiv url of the paper, as in the "id" column
+            num_results (int, optional): Number of papers. Defaults to 10.
+        Returns:
+            pd.DataFrame: "id", "title" and "score" of the related papers
+        """
+        related = pd.DataFrame(columns=["id", "title", "score"])
+        if self.index_dir is None:
+            return related
+        index = open_ann_index(self.index_dir)
+        if index is None:
+            return related
+        vector = index.vector(paper_id)
+        if vector is None:
+            return related
 
-        return cosine_dataframe
+        positions, scores = index.search(vector, num_results + 1)
+        rows = [
+            (index.keys[position], index.labels[position], score)
+            for position, score in zip(positions[0], scores[0])
+            if position >= 0 and index.keys[position] != paper_id
+        ]
+        return pd.DataFrame(rows[:num_results], columns=["id", "title", "score"])
@@ -0,0 +1,245 @@
+import os
+import string
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DEDUP_THRESHOLD = float(os.environ.get("ARXIV_DEDUP_THRESHOLD", "0.8"))
+
+SHINGLE_WORDS = 3
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+# offset added to values borrowed by an empty bin per bin moved
+DENSIFY_OFFSET = 0x9E3779B1
+TEXT_SEPARATOR = "\x02"
+PUNCTUATION = str.maketrans({character: " " for character in string.punctuation})
+# texts shingled at once by text_signatures, bounds its memory
+SIGNATURE_BATCH = 2000
+VERSION_PATTERN = r"^(?:https?://arxiv\.org/abs/)?(.+?)(?:v\d+)?$"
+
+
+def base_ids(df: pd.DataFrame) -> np.ndarray:
+    """arXiv id of every paper without its version, so revisions of a paper
+    share it
+    Args:
+        df (pd.DataFrame): papers with an "arxiv_id" or an "id" column
+    Returns:
+        np.ndarray: ids such as "1706.03762" or "hep-th/9901001"
+    """
+    if "arxiv_id" in df:
+        ids = df["arxiv_id"].astype(object)
+    else:
+        ids = df["id"].astype(object).str.extract(VERSION_PATTERN, expand=False)
+    return ids.to_numpy(dtype=object)
+
+
+def shingle_hashes(texts: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashes of the word shingles of every text. All texts are split at
+    once and the words hashed as one array, shingle hashes are combined
+    from the word hashes with array arithmetic
+    Args:
+        texts (pd.Series): abstracts
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: uint64 shingle hashes of all texts,
+            one after the other, and the number of shingles of every text,
+            0 for texts without words
+    """
+    # one split of all texts, the separator token marks where a text ends
+    joined = f" {TEXT_SEPARATOR} ".join(texts.fillna("").astype(str).tolist())
+    words = np.array(joined.lower().translate(PUNCTUATION).split(), dtype=object)
+    codes = pd.util.hash_array(words, categorize=True)
+    separator = pd.util.hash_array(np.array([TEXT_SEPARATOR], dtype=object))[0]
+    separators = np.flatnonzero(codes == separator)
+    num_words = np.diff(np.r_[-1, separators, len(words)]) - 1
+
+    # a text shorter than a shingle is one shingle of all its words
+    num_shingles = np.where(
+        num_words >= SHINGLE_WORDS, num_words - SHINGLE_WORDS + 1, num_words > 0
+    )
+    word_starts = np.r_[0, separators + 1]
+    starts = np.repeat(word_starts, num_shingles) + (
+        np.arange(num_shingles.sum())
+        - np.repeat(np.cumsum(num_shingles) - num_shingles, num_shingles)
+    )
+    ends = np.repeat(word_starts + num_words, num_shingles)
+    hashes = np.zeros(len(starts), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for offset in range(SHINGLE_WORDS):
+            position = starts + offset
+            word = np.where(
+                position < ends, codes[np.minimum(position, len(codes) - 1)], 0
+            )
+            hashes = hashes * np.uint64(0x100000001B3) + word
+    return hashes, num_shingles
+
+
+def minhash_signatures(
+    hashes: np.ndarray,
+    num_shingles: np.ndarray,
+    num_permutations: int = NUM_PERMUTATIONS,
+    seed: int = 0,
+    first_text: int = 0,
+) -> np.ndarray:
+    """MinHash signature of every text, the fraction of equal signature
+    values of two texts estimates the Jaccard similarity of their shingles.
+    Shingles are hashed once and split into `num_permutations` bins by
+    their hash (one permutation hashing), the signature holds the minimum of
+    every bin and an empty bin borrows the value of the next bin that is
+    not empty, so the cost does not grow with the signature length
+    Args:
+        hashes (np.ndarray): output of shingle_hashes
+        num_shingles (np.ndarray): output of shingle_hashes
+        num_permutations (int, optional): Signature length.
+                                          Defaults to NUM_PERMUTATIONS.
+        seed (int, optional): Seed of the hash function. Defaults to 0.
+        first_text (int, optional): Index of the first text, keeps the
+            signatures of texts without shingles unique across batches.
+            Defaults to 0.
+    Returns:
+        np.ndarray: (N, num_permutations) uint32 signatures, texts without
+            shingles get a signature of their own
+    """
+    rng = np.random.default_rng(seed)
+    multiplier, increment = rng.integers(1, 2**63, 2, dtype=np.uint64) | np.uint64(1)
+    with np.errstate(over="ignore"):
+        mixed = hashes * multiplier + increment
+        mixed ^= mixed >> np.uint64(31)
+        mixed *= multiplier
+    bins = (mixed >> np.uint64(32)) % np.uint64(num_permutations)
+    values = (mixed & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    num_texts = len(num_shingles)
+    empty_value = np.iinfo(np.uint32).max
+    signatures = np.full((num_texts, num_permutations), empty_value, dtype=np.uint32)
+    texts = np.repeat(np.arange(num_texts), num_shingles)
+    np.minimum.at(signatures, (texts, bins.astype(np.int64)), values)
+
+    # densification: the next filled bin to the right, wrapping around
+    columns = np.arange(num_permutations)
+    filled = signatures != empty_value
+    nearest = np.where(filled, columns, 2 * num_permutations)
+    nearest = np.concatenate([nearest, nearest + num_permutations], axis=1)
+    nearest = np.minimum.accumulate(nearest[:, ::-1], axis=1)[:, ::-1]
+    nearest = nearest[:, :num_permutations]
+    has_shingles = filled.any(axis=1)
+    rows = np.arange(num_texts)[:, None]
+    with np.errstate(over="ignore"):
+        borrowed = signatures[rows, nearest % num_permutations] + (
+            (nearest - columns) * DENSIFY_OFFSET
+        ).astype(np.uint32)
+    signatures = np.where(filled | ~has_shingles[:, None], signatures, borrowed)
+
+    empty = np.flatnonzero(~has_shingles)
+    signatures[empty] = (empty_value - (first_text + empty).astype(np.uint32))[:, None]
+    return signatures
+
+
+def text_signatures(texts: pd.Series, batch_size: int = SIGNATURE_BATCH) -> np.ndarray:
+    """MinHash signatures of texts, computed in batches so the words and
+    shingles of only one batch are held at a time
+    Args:
+        texts (pd.Series): abstracts
+        batch_size (int, optional): Texts per batch.
+                                    Defaults to SIGNATURE_BATCH.
+    Returns:
+        np.ndarray: (N, NUM_PERMUTATIONS) uint32 signatures
+    """
+    batches = [
+        minhash_signatures(
+            *shingle_hashes(texts.iloc[start : start + batch_size]),
+            first_text=start,
+        )
+        for start in range(0, len(texts), batch_size)
+    ]
+    if not batches:
+        return np.empty((0, NUM_PERMUTATIONS), dtype=np.uint32)
+    return np.concatenate(batches)
+
+
+def near_duplicates(
+    signatures: np.ndarray,
+    threshold: float = DEFAULT_DEDUP_THRESHOLD,
+    num_bands: int = NUM_BANDS,
+) -> np.ndarray:
+    """Groups near-duplicate texts with locality sensitive hashing. Texts
+    whose signatures agree on a whole band land in the same bucket, and are
+    merged with the first text of the bucket when their estimated
+    similarity reaches the threshold, so no pair of texts is compared
+    unless they share a bucket
+    Args:
+        signatures (np.ndarray): output of minhash_signatures
+        threshold (float, optional): Estimated Jaccard similarity above
+            which texts are duplicates. Defaults to DEFAULT_DEDUP_THRESHOLD.
+        num_bands (int, optional): Bands of the signature, more bands find
+            less similar candidates. Defaults to NUM_BANDS.
+    Returns:
+        np.ndarray: index of the representative of every text, the first
+            text of its group
+    """
+    num_texts, num_permutations = signatures.shape
+    rows = num_permutations // num_bands
+    rng = np.random.default_rng(0)
+    weights = rng.integers(1, 2**63, rows, dtype=np.uint64) | 1
+    pairs = []
+    for band in range(num_bands):
+        values = signatures[:, band * rows : (band + 1) * rows].astype(np.uint64)
+        with np.errstate(over="ignore"):
+            keys = (values * weights).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        new_bucket = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        firsts = order[
+            np.maximum.accumulate(np.where(new_bucket, np.arange(num_texts), 0))
+        ]
+        member = ~new_bucket
+        pairs.append(np.stack([order[member], firsts[member]], axis=1))
+
+    candidates = np.unique(np.concatenate(pairs), axis=0)
+    agreement = (signatures[candidates[:, 0]] == signatures[candidates[:, 1]]).mean(
+        axis=1
+    )
+    candidates = candidates[agreement >= threshold]
+
+    # union-find, the root of a group is its first text
+    parent = np.arange(num_texts, dtype=np.int64)
+
+    def find(node: int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in candidates.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    while True:
+        grandparent = parent[parent]
+        if (grandparent == parent).all():
+            return parent
+        parent = grandparent
+
+
+def deduplicate(
+    df: pd.DataFrame,
+    col: str = "summary",
+    threshold: Optional[float] = DEFAULT_DEDUP_THRESHOLD,
+) -> pd.DataFrame:
+    """Collapses the versions of a paper and near-duplicate abstracts, e.g.
+    cross-listed copies, into the first of them, before they are encoded
+    Args:
+        df (pd.DataFrame): cleaned papers, in search order
+        col (str, optional): Text compared. Defaults to "summary".
+        threshold (Optional[float], optional): Estimated Jaccard similarity
+            of the word shingles above which abstracts are duplicates, only
+            versions are collapsed when None.
+            Defaults to DEFAULT_DEDUP_THRESHOLD.
+    Returns:
+        pd.DataFrame: one paper per group, with a new index
+    """
+    rows = np.flatnonzero(~pd.Series(base_ids(df)).duplicated().to_numpy())
+    if threshold is not None and len(rows) > 1:
+        groups = near_duplicates(text_signatures(df[col].take(rows)), threshold)
+        rows = rows[groups == np.arange(len(rows))]
+    return df.take(rows).reset_index(drop=True)
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app_func.utils import parse_arxiv_id
+
+_OPEN_CACHES: Dict[str, "EmbeddingCache"] = {}
+_OPEN_CACHES_LOCK = threading.Lock()
+
+
+def embedding_key(
+    identifier: str, text: Optional[str] = None, col: str = "summary"
+) -> str:
+    """Builds the cache key of a paper from its arXiv id and version, and
+    from the column and text that were encoded when a text is given, so an
+    embedding is only reused for the exact text it was computed from
+    Args:
+        identifier (str): arXiv id or abstract url
+        text (Optional[str], optional): encoded text. Defaults to None.
+        col (str, optional): encoded column. Defaults to "summary".
+    Returns:
+        str: key in the form "<id>v<version>", followed by
+            "/<col>/<text digest>" when a text is given
+    """
+    arxiv_id, version = parse_arxiv_id(identifier)
+    key = f"{arxiv_id}v{version}"
+    if text is None:
+        return key
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{key}/{col}/{digest}"
+
+
+class EmbeddingCache:
+    """Persistent per-paper embedding store.
+    Vectors live in a pre-allocated memory-mapped array file and an index
+    maps each paper key to its slot. The store holds at most `max_entries`
+    vectors and evicts the least recently used ones when full. One store
+    exists per model, so keys are effectively (arXiv id, version, model).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        dim: int,
+        max_entries: int = 100_000,
+    ) -> None:
+        """Opens or creates the store for a model
+        Args:
+            cache_dir (str): root directory for all embedding stores
+            model_name (str): name of the model producing the embeddings
+            dim (int): embedding dimension
+            max_entries (int, optional): maximum number of cached papers.
+                                         Defaults to 100_000.
+        """
+        self.path = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+        os.makedirs(self.path, exist_ok=True)
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        index_path = os.path.join(self.path, "index.json")
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        index = None
+        if os.path.exists(index_path) and os.path.exists(vectors_path):
+            with open(index_path, encoding="utf-8") as file:
+                index = json.load(file)
+            if index["dim"] != dim or index["max_entries"] != max_entries:
+                index = None
+
+        if index is None:
+            self._tick = 0
+            self._slots = {}
+            self._last_used = np.zeros(max_entries, dtype=np.int64)
+            self._vectors = np.memmap(
+                vectors_path, dtype=np.float32, mode="w+", shape=(max_entries, dim)
+            )
+        else:
+            self._tick = index["tick"]
+            self._slots = {key: slot for key, (slot, _) in index["entries"].items()}
+            self._last_used = np.zeros(max_entries, dtype=np.int64)
+            for slot, last_used in index["entries"].values():
+                self._last_used[slot] = last_used
+            self._vectors = np.memmap(
+                vectors_path, dtype=np.float32, mode="r+", shape=(max_entries, dim)
+            )
+        self._free = sorted(set(range(max_entries)) - set(self._slots.values()))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get(self, keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Reads cached embeddings straight from the memory map
+        Args:
+            keys (Sequence[str]): paper keys, see `embedding_key`
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (len(keys), dim) embeddings with
+                zero rows for misses, and a boolean mask of hits
+        """
+        with self._lock:
+            slots = np.array([self._slots.get(key, -1) for key in keys], dtype=np.int64)
+            hit_mask = slots >= 0
+            embeddings = np.zeros((len(keys), self.dim), dtype=np.float32)
+            embeddings[hit_mask] = self._vectors[slots[hit_mask]]
+
+            self._tick += 1
+            self._last_used[slots[hit_mask]] = self._tick
+            num_hits = int(hit_mask.sum())
+            self.hits += num_hits
+            self.misses += len(keys) - num_hits
+
+        return embeddings, hit_mask
+
+    def put(self, keys: Sequence[str], embeddings: np.ndarray) -> None:
+        """Writes embeddings into the store, evicting old entries if full
+        Args:
+            keys (Sequence[str]): paper keys, see `embedding_key`
+            embeddings (np.ndarray): (len(keys), dim) embeddings
+        """
+        latest = dict(zip(keys, range(len(keys))))
+        items = list(latest.items())[-self.max_entries :]
+        if not items:
+            return
+
+        with self._lock:
+            self._tick += 1
+            slots = self._allocate([key for key, _ in items])
+            rows = np.fromiter((row for _, row in items), dtype=np.int64)
+            self._vectors[slots] = np.asarray(embeddings, dtype=np.float32)[rows]
+            self._last_used[slots] = self._tick
+            self.flush()
+
+    def flush(self) -> None:
+        """Persists vectors and index to disk"""
+        self._vectors.flush()
+        entries = {
+            key: [slot, int(self._last_used[slot])] for key, slot in self._slots.items()
+        }
+        index = {
+            "dim": self.dim,
+            "max_entries": self.max_entries,
+            "tick": self._tick,
+            "entries": entries,
+        }
+        index_path = os.path.join(self.path, "index.json")
+        with open(f"{index_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(index, file)
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def stats(self) -> Dict[str, float]:
+        """Summarises cache usage
+        Returns:
+            Dict[str, float]: entries, hits, misses and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _allocate(self, keys: List[str]) -> np.ndarray:
+        """Finds a slot for every key, reusing existing slots first"""
+        slots = np.empty(len(keys), dtype=np.int64)
+        new_keys = []
+        for i, key in enumerate(keys):
+            if key in self._slots:
+                slots[i] = self._slots[key]
+            else:
+                new_keys.append(i)
+
+        shortfall = len(new_keys) - len(self._free)
+        if shortfall > 0:
+            reused = np.setdiff1d(np.arange(len(keys)), new_keys)
+            protected = set(slots[reused].tolist())
+            by_slot = {slot: key for key, slot in self._slots.items()}
+            candidates = [slot for slot in by_slot if slot not in protected]
+            victims = sorted(candidates, key=lambda slot: self._last_used[slot])
+            for slot in victims[:shortfall]:
+                del self._slots[by_slot[slot]]
+                self._free.append(slot)
+
+        for i in new_keys:
+            slot = self._free.pop()
+            self._slots[keys[i]] = slot
+            slots[i] = slot
+
+        return slots
+
+
+def get_embedding_cache(
+    cache_dir: str, model_name: str, dim: int, max_entries: int = 100_000
+) -> EmbeddingCache:
+    """Returns the process-wide store for a model, opening it on first use
+    Args:
+        cache_dir (str): root directory for all embedding stores
+        model_name (str): name of the model producing the embeddings
+        dim (int): embedding dimension
+        max_entries (int, optional): maximum number of cached papers.
+                                     Defaults to 100_000.
+    Returns:
+        EmbeddingCache: shared embedding store
+    """
+    key = os.path.join(os.path.abspath(cache_dir), model_name)
+    with _OPEN_CACHES_LOCK:
+        if key not in _OPEN_CACHES:
+            _OPEN_CACHES[key] = EmbeddingCache(cache_dir, model_name, dim, max_entries)
+        return _OPEN_CACHES[key]
@@ -0,0 +1,426 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_ONNX_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "arvix-clustering-search", "onnx"
+)
+
+TOKEN_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+
+_WORKER_BACKEND = None
+
+
+def length_sorted_batches(
+    lengths: np.ndarray, batch_size: int, max_batch_tokens: int
+) -> List[np.ndarray]:
+    """Groups sentences of similar length, longest first, so every batch is
+    padded to little more than its own sentences. A batch holds at most
+    `batch_size` sentences and `max_batch_tokens` padded tokens, so batches
+    of short abstracts grow and batches of long ones shrink
+    Args:
+        lengths (np.ndarray): token count of every sentence
+        batch_size (int): most sentences per batch
+        max_batch_tokens (int): most padded tokens per batch
+    Returns:
+        List[np.ndarray]: sentence indices of every batch
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches, start = [], 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(batch_size, max_batch_tokens // longest))
+        batches.append(order[start : start + size])
+        start += size
+    return batches
+
+
+class TorchBackend:
+    """SentenceTransformer inference with length-sorted dynamic batching.
+    Sentences are tokenized once, truncated at `max_seq_length`, sorted by
+    token count and batched under a padded token budget, instead of fixed
+    batches of 32 padded to their longest abstract. With `quantize` the
+    linear layers run as dynamically quantized int8.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        max_seq_length: Optional[int] = None,
+        batch_size: int = 64,
+        max_batch_tokens: int = 16384,
+        quantize: bool = False,
+        num_threads: Optional[int] = None,
+    ) -> None:
+        """Loads the model
+        Args:
+            model_name (str, optional): Sentence transformer model.
+                                        Defaults to DEFAULT_MODEL.
+            max_seq_length (Optional[int], optional): Tokens kept per sentence,
+                the model's own limit when None. Defaults to None.
+            batch_size (int, optional): Most sentences per batch.
+                                        Defaults to 64.
+            max_batch_tokens (int, optional): Most padded tokens per batch.
+                                              Defaults to 16384.
+            quantize (bool, optional): Run the linear layers as dynamically
+                                       quantized int8. Defaults to False.
+            num_threads (Optional[int], optional): Torch threads, torch's
+                default when None. Defaults to None.
+        """
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if max_seq_length is not None:
+            self.model.max_seq_length = max_seq_length
+        self.model.eval()
+        if quantize:
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        # fast tokenizers fail when called from several threads at once
+        self._tokenizer_lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.model.max_seq_length
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(
+        self, sentences: Sequence[str], batch_size: Optional[int] = None, **kwargs
+    ) -> np.ndarray:
+        """Embeds sentences, in input order
+        Args:
+            sentences (Sequence[str]): sentences
+            batch_size (Optional[int], optional): Most sentences per batch,
+                `self.batch_size` when None. Defaults to None.
+        Returns:
+            np.ndarray: (len(sentences), dim) float32 embeddings
+        """
+        embeddings = np.zeros(
+            (len(sentences), self.get_sentence_embedding_dimension()),
+            dtype=np.float32,
+        )
+        if len(sentences) == 0:
+            return embeddings
+        with self._tokenizer_lock:
+            encoded = self.tokenizer(
+                list(sentences), truncation=True, max_length=self.max_seq_length
+            )
+        lengths = np.fromiter(map(len, encoded["input_ids"]), dtype=np.int64)
+        for batch in length_sorted_batches(
+            lengths, batch_size or self.batch_size, self.max_batch_tokens
+        ):
+            features = self.tokenizer.pad(
+                {key: [encoded[key][i] for i in batch] for key in encoded.keys()},
+                return_tensors="pt",
+            )
+            embeddings[batch] = self._embed(dict(features))
+        return embeddings
+
+    def _embed(self, features: Dict[str, Any]) -> np.ndarray:
+        """Sentence embeddings of one padded batch"""
+        import torch
+
+        with torch.inference_mode():
+            return self.model(features)["sentence_embedding"].float().numpy()
+
+
+class OnnxBackend(TorchBackend):
+    """Transformer exported to ONNX and run with ONNX Runtime.
+    The export is done once per model and kept under `onnx_dir`, with
+    `quantize` its weights are dynamically quantized to int8. Pooling and
+    normalization still run the model's own SentenceTransformer modules on
+    the ONNX token embeddings, so the output matches the torch pipeline.
+    Needs the onnx and onnxruntime packages.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        max_seq_length: Optional[int] = None,
+        batch_size: int = 64,
+        max_batch_tokens: int = 16384,
+        quantize: bool = False,
+        num_threads: Optional[int] = None,
+        onnx_dir: str = DEFAULT_ONNX_DIR,
+    ) -> None:
+        """Loads or exports the ONNX model
+        Args:
+            model_name (str, optional): Sentence transformer model.
+                                        Defaults to DEFAULT_MODEL.
+            max_seq_length (Optional[int], optional): Tokens kept per sentence,
+                the model's own limit when None. Defaults to None.
+            batch_size (int, optional): Most sentences per batch.
+                                        Defaults to 64.
+            max_batch_tokens (int, optional): Most padded tokens per batch.
+                                              Defaults to 16384.
+            quantize (bool, optional): Quantize the weights to int8.
+                                       Defaults to False.
+            num_threads (Optional[int], optional): ONNX Runtime intra-op
+                threads, all cores when None. Defaults to None.
+            onnx_dir (str, optional): Directory of the exported models.
+                                      Defaults to DEFAULT_ONNX_DIR.
+        """
+        import onnxruntime
+
+        super().__init__(model_name, max_seq_length, batch_size, max_batch_tokens)
+        path = export_onnx(self.model, model_name, onnx_dir, quantize)
+        options = onnxruntime.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.pooling = list(self.model)[1:]
+
+    def _embed(self, features: Dict[str, Any]) -> np.ndarray:
+        import torch
+
+        (token_embeddings,) = self.session.run(
+            ["token_embeddings"],
+            {name: features[name].numpy() for name in self.input_names},
+        )
+        features["token_embeddings"] = torch.from_numpy(token_embeddings)
+        with torch.inference_mode():
+            for module in self.pooling:
+                features = module(features)
+        return features["sentence_embedding"].float().numpy()
+
+
+def export_onnx(model, model_name: str, onnx_dir: str, quantize: bool) -> str:
+    """Exports the transformer of a SentenceTransformer to ONNX, once
+    Args:
+        model (SentenceTransformer): loaded model
+        model_name (str): model name, used for the file name
+        onnx_dir (str): directory of the exported models
+        quantize (bool): also write a copy with int8 weights
+    Returns:
+        str: path of the model to load
+    """
+    import torch
+
+    path, quantized_path = _onnx_paths(model_name, onnx_dir)
+    directory = os.path.dirname(path)
+    # temporary files named per process, processes may export at once
+    suffix = f".{os.getpid()}.tmp"
+
+    class _TokenEmbeddings(torch.nn.Module):
+        """Transformer with positional token inputs, as the exporter traces"""
+
+        def __init__(self, transformer, names):
+            super().__init__()
+            self.transformer = transformer
+            self.names = names
+
+        def forward(self, *inputs):
+            features = dict(zip(self.names, inputs))
+            return self.transformer(**features, return_dict=True).last_hidden_state
+
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        dummy = model.tokenizer(["an example abstract"], return_tensors="pt")
+        names = [name for name in TOKEN_INPUTS if name in dummy]
+        axes = {0: "batch", 1: "sequence"}
+        torch.onnx.export(
+            _TokenEmbeddings(model[0].auto_model, names),
+            tuple(dummy[name] for name in names),
+            path + suffix,
+            input_names=names,
+            output_names=["token_embeddings"],
+            dynamic_axes={name: axes for name in [*names, "token_embeddings"]},
+            opset_version=14,
+            dynamo=False,
+        )
+        os.replace(path + suffix, path)
+    if not quantize:
+        return path
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(path, quantized_path + suffix, weight_type=QuantType.QInt8)
+        os.replace(quantized_path + suffix, quantized_path)
+    return quantized_path
+
+
+def prepare_onnx(
+    model_name: str = DEFAULT_MODEL,
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    quantize: bool = False,
+) -> str:
+    """Exports the ONNX model unless it already is, without keeping the
+    torch model loaded
+    Args:
+        model_name (str, optional): Sentence transformer model.
+                                    Defaults to DEFAULT_MODEL.
+        onnx_dir (str, optional): Directory of the exported models.
+                                  Defaults to DEFAULT_ONNX_DIR.
+        quantize (bool, optional): Also write a copy with int8 weights.
+                                   Defaults to False.
+    Returns:
+        str: path of the model to load
+    """
+    path, quantized_path = _onnx_paths(model_name, onnx_dir)
+    if quantize:
+        path = quantized_path
+    if os.path.exists(path):
+        return path
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    return export_onnx(model, model_name, onnx_dir, quantize)
+
+
+def _onnx_paths(model_name: str, onnx_dir: str) -> Tuple[str, str]:
+    """Paths of the exported model and of its int8 copy"""
+    directory = os.path.join(onnx_dir, model_name.strip("/").replace("/", "_"))
+    return (
+        os.path.join(directory, "model.onnx"),
+        os.path.join(directory, "model.int8.onnx"),
+    )
+
+
+class ProcessPoolBackend:
+    """Spreads encoding over worker processes, one single-threaded backend
+    per process. Sentences are sorted by length and cut into contiguous
+    chunks so every worker batches abstracts of similar length.
+    """
+
+    def __init__(
+        self,
+        backend: str = "torch",
+        processes: Optional[int] = None,
+        chunk_size: int = 256,
+        **options,
+    ) -> None:
+        """Starts the workers, each loading its own model
+        Args:
+            backend (str, optional): Backend of the workers, a key of
+                                     ENCODER_BACKENDS. Defaults to "torch".
+            processes (Optional[int], optional): Worker processes, one per
+                core when None. Defaults to None.
+            chunk_size (int, optional): Sentences sent to a worker at a time.
+                                        Defaults to 256.
+            **options: options of the worker backend
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        options["num_threads"] = 1
+        backend_class, defaults = ENCODER_BACKENDS[backend]
+        if backend_class is OnnxBackend:
+            # exported here once, the workers only load it
+            prepare_onnx(
+                options.get("model_name", DEFAULT_MODEL),
+                options.get("onnx_dir", DEFAULT_ONNX_DIR),
+                options.get("quantize", defaults.get("quantize", False)),
+            )
+        self.executor = ProcessPoolExecutor(
+            self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_start_worker,
+            initargs=(backend, options),
+        )
+        self._dimension = self.executor.submit(_worker_dimension).result()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+    def encode(
+        self, sentences: Sequence[str], batch_size: Optional[int] = None, **kwargs
+    ) -> np.ndarray:
+        """Embeds sentences across the workers, in input order
+        Args:
+            sentences (Sequence[str]): sentences
+            batch_size (Optional[int], optional): Most sentences per batch
+                in a worker. Defaults to None.
+        Returns:
+            np.ndarray: (len(sentences), dim) float32 embeddings
+        """
+        sentences = list(sentences)
+        embeddings = np.zeros((len(sentences), self._dimension), dtype=np.float32)
+        order = np.argsort(
+            -np.fromiter(map(len, sentences), dtype=np.int64), kind="stable"
+        )
+        # no more chunks than needed to keep every worker busy
+        size = max(1, min(self.chunk_size, -(-len(order) // self.processes)))
+        chunks = [order[start : start + size] for start in range(0, len(order), size)]
+        results = self.executor.map(
+            _worker_encode,
+            [[sentences[i] for i in chunk] for chunk in chunks],
+            [batch_size] * len(chunks),
+        )
+        for chunk, result in zip(chunks, results):
+            embeddings[chunk] = result
+        return embeddings
+
+    def close(self) -> None:
+        """Stops the workers"""
+        self.executor.shutdown()
+
+
+def _start_worker(backend: str, options: Dict[str, Any]) -> None:
+    global _WORKER_BACKEND
+    _WORKER_BACKEND = create_backend(backend, **options)
+
+
+def _worker_dimension() -> int:
+    return _WORKER_BACKEND.get_sentence_embedding_dimension()
+
+
+def _worker_encode(sentences: List[str], batch_size: Optional[int]) -> np.ndarray:
+    return _WORKER_BACKEND.encode(sentences, batch_size=batch_size)
+
+
+ENCODER_BACKENDS = {
+    "torch": (TorchBackend, {}),
+    "torch-int8": (TorchBackend, {"quantize": True}),
+    "onnx": (OnnxBackend, {}),
+    "onnx-int8": (OnnxBackend, {"quantize": True}),
+}
+
+
+def create_backend(
+    backend: str = "torch",
+    model_name: str = DEFAULT_MODEL,
+    processes: int = 1,
+    **options,
+):
+    """Builds an encoder backend
+    Args:
+        backend (str, optional): a key of ENCODER_BACKENDS. Defaults to "torch".
+        model_name (str, optional): Sentence transformer model.
+                                    Defaults to DEFAULT_MODEL.
+        processes (int, optional): Worker processes, encoding runs in this
+                                   process when 1. Defaults to 1.
+        **options: options of the backend class, e.g. max_seq_length
+    Returns:
+        Backend with the SentenceTransformer `encode` and
+        `get_sentence_embedding_dimension` methods
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(
+            f"Unknown encoder backend {backend}, use one of {list(ENCODER_BACKENDS)}"
+        )
+    if processes != 1:
+        return ProcessPoolBackend(
+            backend, processes or None, model_name=model_name, **options
+        )
+    backend_class, defaults = ENCODER_BACKENDS[backend]
+    return backend_class(model_name, **{**defaults, **options})
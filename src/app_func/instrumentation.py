@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_TEXTFILE = os.environ.get("ARXIV_METRICS_TEXTFILE")
+METRIC_PREFIX = "arxiv_search"
+
+logger = logging.getLogger(__name__)
+
+_SHARED_INSTRUMENTATION: Optional["Instrumentation"] = None
+_SHARED_INSTRUMENTATION_LOCK = threading.Lock()
+
+# cache name -> (hits, misses) counters, snapshotted around every stage
+Counters = Callable[[], Dict[str, Tuple[int, int]]]
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark of the resident set size of the process, 0 when the
+    platform does not report it"""
+    if resource is None:
+        return 0
+    # kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def rss_bytes() -> int:
+    """Current resident set size of the process, 0 when the platform does
+    not report it"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as file:
+            resident_pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def input_sizes(args: tuple, kwargs: Dict[str, Any]) -> Dict[str, int]:
+    """Sizes worth logging of a stage's arguments: its integer parameters
+    and the rows of its first dataframe or array input"""
+    sizes = {
+        key: value
+        for key, value in kwargs.items()
+        if isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+    }
+    for arg in args:
+        for value in arg if isinstance(arg, tuple) else (arg,):
+            if isinstance(value, (pd.DataFrame, np.ndarray)):
+                sizes["rows"] = len(value)
+                return sizes
+    return sizes
+
+
+class Instrumentation:
+    """Wall time, CPU time, RSS, input sizes and cache hit rates of every
+    stage of every request.
+    Stages run inside `request()` are collected into one record per request,
+    logged as a JSON line when the request ends and kept for the debug panel.
+    Totals per stage and per cache are kept for the whole process and
+    rendered in the Prometheus text format, optionally written to a textfile
+    for the node exporter after every request.
+    CPU time is the process CPU time, so it includes the threads a stage
+    starts (e.g. the encoder) but also whatever other sessions were doing.
+    Memory is the change of the current RSS over a stage, what it kept or
+    freed, and the process peak RSS once it finished; the peak is a
+    high-water mark, so its change over a warm stage is almost always 0.
+    """
+
+    def __init__(self, history: int = 20, textfile: Optional[str] = DEFAULT_TEXTFILE):
+        """Instantiates empty metrics
+        Args:
+            history (int, optional): Requests kept for display. Defaults to 20.
+            textfile (Optional[str], optional): Prometheus textfile rewritten
+                after every request, not written when None.
+                Defaults to DEFAULT_TEXTFILE.
+        """
+        self.requests: deque = deque(maxlen=history)
+        self.textfile = textfile
+        self._stage_totals: Dict[str, Dict[str, float]] = {}
+        self._cache_totals: Dict[str, List[int]] = {}
+        self._request_totals = {"count": 0, "seconds": 0.0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def last_request(self) -> Optional[Dict[str, Any]]:
+        """Record of the latest finished request"""
+        with self._lock:
+            return self.requests[-1] if self.requests else None
+
+    @contextmanager
+    def request(self, **params) -> Iterator[Dict[str, Any]]:
+        """Collects the stages run inside the block into one request record
+        Args:
+            **params: request parameters kept in the record
+        Yields:
+            Dict[str, Any]: request record, "stages" filled as they finish
+        """
+        record = {
+            "request_id": uuid.uuid4().hex[:12],
+            "timestamp": time.time(),
+            "params": params,
+            "stages": [],
+        }
+        start = time.perf_counter()
+        self._local.request = (record, start)
+        try:
+            yield record
+        finally:
+            self._local.request = None
+            record["seconds"] = time.perf_counter() - start
+            self._finish(record)
+
+    @contextmanager
+    def stage(
+        self,
+        name: str,
+        counters: Optional[Counters] = None,
+        sizes: Optional[Dict[str, int]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Measures the block as one stage of the current request
+        Args:
+            name (str): stage name
+            counters (Optional[Counters], optional): cache counters, their
+                growth during the stage is recorded. Defaults to None.
+            sizes (Optional[Dict[str, int]], optional): input sizes.
+                                                        Defaults to None.
+        Yields:
+            Dict[str, Any]: stage record, filled when the block exits
+        """
+        current = getattr(self._local, "request", None)
+        record = {"stage": name, "sizes": dict(sizes or {}), "caches": {}}
+        before = dict(counters()) if counters is not None else {}
+        rss = rss_bytes()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["cpu_seconds"] = time.process_time() - cpu
+            record["rss_delta_bytes"] = rss_bytes() - rss
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            record["offset"] = start - current[1] if current else 0.0
+            for cache, (hits, misses) in (counters() if counters else {}).items():
+                hits -= before.get(cache, (0, 0))[0]
+                misses -= before.get(cache, (0, 0))[1]
+                if hits + misses:
+                    record["caches"][cache] = {
+                        "hits": hits,
+                        "misses": misses,
+                        "hit_rate": hits / (hits + misses),
+                    }
+            self._add_stage(record)
+            if current:
+                current[0]["stages"].append(record)
+
+    def instrument(
+        self, name: str, func: Callable, counters: Optional[Counters] = None
+    ) -> Callable:
+        """Wraps a function so every call is measured as a stage
+        Args:
+            name (str): stage name
+            func (Callable): function to measure
+            counters (Optional[Counters], optional): cache counters.
+                                                     Defaults to None.
+        Returns:
+            Callable: measured function
+        """
+
+        def measured(*args, **kwargs):
+            with self.stage(name, counters, input_sizes(args, kwargs)):
+                return func(*args, **kwargs)
+
+        measured.__name__ = getattr(func, "__name__", name)
+        measured.__doc__ = func.__doc__
+        return measured
+
+    def record_cache(self, cache: str, hits: int, misses: int) -> None:
+        """Adds lookups of a cache that is not tied to a stage
+        Args:
+            cache (str): cache name
+            hits (int): hits
+            misses (int): misses
+        """
+        with self._lock:
+            totals = self._cache_totals.setdefault(cache, [0, 0])
+            totals[0] += hits
+            totals[1] += misses
+
+    def prometheus_text(self) -> str:
+        """Process-wide totals in the Prometheus text exposition format
+        Returns:
+            str: metrics text
+        """
+        stage = f"{METRIC_PREFIX}_stage"
+        lines = []
+        with self._lock:
+            lines += [
+                f"# HELP {METRIC_PREFIX}_requests_total Searches run.",
+                f"# TYPE {METRIC_PREFIX}_requests_total counter",
+                f"{METRIC_PREFIX}_requests_total {self._request_totals['count']}",
+                f"# HELP {METRIC_PREFIX}_request_seconds_total Wall time of searches.",
+                f"# TYPE {METRIC_PREFIX}_request_seconds_total counter",
+                f"{METRIC_PREFIX}_request_seconds_total "
+                f"{self._request_totals['seconds']:.6f}",
+                f"# HELP {METRIC_PREFIX}_rss_bytes Resident set size.",
+                f"# TYPE {METRIC_PREFIX}_rss_bytes gauge",
+                f"{METRIC_PREFIX}_rss_bytes {rss_bytes()}",
+                f"# HELP {METRIC_PREFIX}_peak_rss_bytes Peak resident set size.",
+                f"# TYPE {METRIC_PREFIX}_peak_rss_bytes gauge",
+                f"{METRIC_PREFIX}_peak_rss_bytes {peak_rss_bytes()}",
+            ]
+            for metric, key, help_text in [
+                ("runs_total", "count", "Times a stage ran."),
+                ("seconds_total", "seconds", "Wall time spent in a stage."),
+                ("cpu_seconds_total", "cpu_seconds", "CPU time spent in a stage."),
+            ]:
+                lines += [
+                    f"# HELP {stage}_{metric} {help_text}",
+                    f"# TYPE {stage}_{metric} counter",
+                ]
+                lines += [
+                    f'{stage}_{metric}{{stage="{name}"}} {_number(totals[key])}'
+                    for name, totals in sorted(self._stage_totals.items())
+                ]
+            for metric, column in [("hits", 0), ("misses", 1)]:
+                lines += [
+                    f"# HELP {METRIC_PREFIX}_cache_{metric}_total Cache {metric}.",
+                    f"# TYPE {METRIC_PREFIX}_cache_{metric}_total counter",
+                ]
+                lines += [
+                    f'{METRIC_PREFIX}_cache_{metric}_total{{cache="{name}"}} '
+                    f"{totals[column]}"
+                    for name, totals in sorted(self._cache_totals.items())
+                ]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Writes the Prometheus text, atomically so scrapes never read a
+        partial file
+        Args:
+            path (str): textfile path
+        """
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(self.prometheus_text())
+        os.replace(temporary, path)
+
+    def _add_stage(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            totals = self._stage_totals.setdefault(
+                record["stage"],
+                {
+                    "count": 0,
+                    "seconds": 0.0,
+                    "cpu_seconds": 0.0,
+                },
+            )
+            totals["count"] += 1
+            for key in ["seconds", "cpu_seconds"]:
+                totals[key] += record[key]
+        for cache, lookups in record["caches"].items():
+            self.record_cache(cache, lookups["hits"], lookups["misses"])
+
+    def _finish(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.requests.append(record)
+            self._request_totals["count"] += 1
+            self._request_totals["seconds"] += record["seconds"]
+        logger.info(json.dumps(record, default=str))
+        if self.textfile:
+            try:
+                self.write_textfile(self.textfile)
+            except OSError as error:
+                logger.warning("Could not write metrics textfile: %s", error)
+
+
+def _number(value: float) -> str:
+    return str(value) if isinstance(value, int) else f"{value:.6f}"
+
+
+def get_instrumentation() -> Instrumentation:
+    """Returns the process-wide instrumentation
+    Returns:
+        Instrumentation: shared instrumentation
+    """
+    global _SHARED_INSTRUMENTATION
+    with _SHARED_INSTRUMENTATION_LOCK:
+        if _SHARED_INSTRUMENTATION is None:
+            _SHARED_INSTRUMENTATION = Instrumentation()
+        return _SHARED_INSTRUMENTATION
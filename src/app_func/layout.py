@@ -0,0 +1,214 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class ForceLayout:
+    """Deterministic force-directed (Fruchterman-Reingold) graph layout.
+    Small graphs use exact all-pairs repulsion. Large graphs use a
+    Barnes-Hut style approximation: nodes are binned into cells holding
+    about the same number of nodes, far cells act through their centre of
+    mass and only nodes sharing a cell repel each other exactly. Cells are
+    rebuilt every few iterations as the nodes move. Layouts can be warm started from previous
+    positions, and stop early once the nodes no longer move.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        max_iterations: int = 50,
+        tolerance: float = 1e-3,
+        exact_threshold: int = 300,
+        nodes_per_cell: int = 32,
+        rebin_every: int = 5,
+    ) -> None:
+        """Instantiates the layout engine
+        Args:
+            seed (int, optional): Seed of the initial positions. Defaults to 0.
+            max_iterations (int, optional): Iteration budget. Defaults to 50.
+            tolerance (float, optional): Largest node movement, relative to the
+                                         layout size, below which the layout
+                                         has converged. Defaults to 1e-3.
+            exact_threshold (int, optional): Largest graph laid out with exact
+                                             repulsion. Defaults to 300.
+            nodes_per_cell (int, optional): Average nodes per grid cell of the
+                                            approximation. Defaults to 32.
+            rebin_every (int, optional): Iterations between rebinning the
+                                         nodes into cells. Defaults to 5.
+        """
+        self.seed = seed
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.exact_threshold = exact_threshold
+        self.nodes_per_cell = nodes_per_cell
+        self.rebin_every = rebin_every
+        self.iterations = 0
+
+    def compute(
+        self,
+        num_nodes: int,
+        src: np.ndarray,
+        dst: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        initial: Optional[np.ndarray] = None,
+        max_iterations: Optional[int] = None,
+    ) -> np.ndarray:
+        """Lays out a graph
+        Args:
+            num_nodes (int): number of nodes
+            src (np.ndarray): source node of every edge
+            dst (np.ndarray): target node of every edge
+            weights (Optional[np.ndarray], optional): Edge weights, all ones
+                                                      when None. Defaults to None.
+            initial (Optional[np.ndarray], optional): (num_nodes, 2) previous
+                positions, NaN rows for new nodes. Defaults to None.
+            max_iterations (Optional[int], optional): Iteration budget of
+                this layout, the engine's when None. Defaults to None.
+        Returns:
+            np.ndarray: (num_nodes, 2) positions
+        """
+        if num_nodes == 0:
+            return np.empty((0, 2))
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        weights = (
+            np.ones(len(src)) if weights is None else np.asarray(weights, np.float64)
+        )
+        positions, warm = self._initial_positions(num_nodes, src, dst, initial)
+        # (2, num_nodes) so every coordinate is contiguous for the gathers
+        coords = np.ascontiguousarray(positions.T)
+
+        k = np.sqrt(1.0 / num_nodes)
+        # the step cap scales with the layout, a warm start only refines it
+        extent = np.ptp(coords, axis=1).max() or 1.0
+        temperature = 0.1 * extent * (0.02 if warm else 1.0)
+        if max_iterations is None:
+            max_iterations = self.max_iterations
+        cooling = temperature / (max_iterations + 1)
+        self.iterations = 0
+        for _ in range(max_iterations):
+            if num_nodes <= self.exact_threshold:
+                displacement = self._exact_repulsion(coords, k)
+            else:
+                if self.iterations % self.rebin_every == 0:
+                    cells = self._cells(coords)
+                displacement = self._grid_repulsion(coords, k, cells)
+
+            delta = coords[:, src] - coords[:, dst]
+            pull = delta * (weights * np.hypot(delta[0], delta[1]) / k)
+            for axis in range(2):
+                displacement[axis] += np.bincount(dst, pull[axis], num_nodes)
+                displacement[axis] -= np.bincount(src, pull[axis], num_nodes)
+
+            length = np.maximum(np.hypot(displacement[0], displacement[1]), 1e-9)
+            step = displacement * (np.minimum(length, temperature) / length)
+            coords += step
+            temperature -= cooling
+            self.iterations += 1
+
+            extent = np.ptp(coords, axis=1).max() or 1.0
+            if np.hypot(step[0], step[1]).max() < self.tolerance * extent:
+                break
+
+        return coords.T.copy()
+
+    def _initial_positions(self, num_nodes, src, dst, initial):
+        """Random positions, or previous positions with new nodes placed at
+        the mean of their already placed neighbours"""
+        rng = np.random.default_rng(self.seed)
+        positions = rng.random((num_nodes, 2))
+        if initial is None:
+            return positions, False
+        known = ~np.isnan(initial).any(axis=1)
+        if not known.any():
+            return positions, False
+
+        positions[known] = initial[known]
+        sums = np.zeros((num_nodes, 2))
+        counts = np.zeros(num_nodes)
+        for a, b in ((src, dst), (dst, src)):
+            usable = known[b] & ~known[a]
+            np.add.at(sums, a[usable], initial[b[usable]])
+            counts += np.bincount(a[usable], minlength=num_nodes)
+        placed = ~known & (counts > 0)
+        extent = np.ptp(initial[known], axis=0).max() if known.sum() > 1 else 1.0
+        jitter = 0.05 * (extent or 1.0) * (rng.random((num_nodes, 2)) - 0.5)
+        positions[placed] = sums[placed] / counts[placed, None] + jitter[placed]
+        unplaced = ~known & ~placed
+        low, high = initial[known].min(axis=0), initial[known].max(axis=0)
+        positions[unplaced] = low + positions[unplaced] * np.maximum(high - low, 1e-3)
+        return positions, known.mean() > 0.5
+
+    @staticmethod
+    def _exact_repulsion(coords: np.ndarray, k: float) -> np.ndarray:
+        """All-pairs repulsion k^2 / d along every pair"""
+        x, y = coords
+        dx = x[:, None] - x[None, :]
+        dy = y[:, None] - y[None, :]
+        strength = k * k / np.maximum(dx * dx + dy * dy, 1e-9)
+        np.fill_diagonal(strength, 0.0)
+        return np.stack([(dx * strength).sum(axis=1), (dy * strength).sum(axis=1)])
+
+    def _cells(self, coords: np.ndarray) -> Tuple[np.ndarray, int, np.ndarray]:
+        """Bins nodes into cells holding about the same number of nodes:
+        columns split on x quantiles, each column then split on y quantiles,
+        so dense clumps get small cells
+        Returns:
+            Tuple[np.ndarray, int, np.ndarray]: cell of every node, number of
+                cells and the (2, P) node pairs sharing a cell
+        """
+        num_nodes = coords.shape[1]
+        columns = max(2, int(np.sqrt(num_nodes / self.nodes_per_cell)))
+        column = np.empty(num_nodes, dtype=np.int64)
+        column[np.argsort(coords[0], kind="stable")] = (
+            np.arange(num_nodes) * columns // num_nodes
+        )
+        order = np.lexsort((coords[1], column))
+        column_size = np.bincount(column, minlength=columns)
+        column_start = np.cumsum(column_size) - column_size
+        rank = np.empty(num_nodes, dtype=np.int64)
+        rank[order] = np.arange(num_nodes)
+        rank -= column_start[column]
+        cell = column * columns + rank * columns // column_size[column]
+
+        # every ordered pair of distinct nodes sharing a cell, `order` sorts
+        # the nodes by cell too
+        num_cells = columns * columns
+        mass = np.bincount(cell, minlength=num_cells)
+        counts = mass[cell[order]]
+        first = np.repeat(order, counts)
+        offsets = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_start = np.cumsum(mass) - mass
+        second = order[np.repeat(cell_start[cell[order]], counts) + offsets]
+        keep = first != second
+        return cell, num_cells, np.stack([first[keep], second[keep]])
+
+    @staticmethod
+    def _grid_repulsion(
+        coords: np.ndarray, k: float, cells: Tuple[np.ndarray, int, np.ndarray]
+    ) -> np.ndarray:
+        """Repulsion approximated over the cells of `_cells`"""
+        cell, num_cells, (first, second) = cells
+        num_nodes = coords.shape[1]
+        mass = np.bincount(cell, minlength=num_cells).astype(np.float64)
+        centre = np.stack(
+            [np.bincount(cell, coords[axis], num_cells) for axis in range(2)]
+        ) / np.maximum(mass, 1)
+
+        # far field: every cell except the node's own one acts through its
+        # centre of mass, distances expanded into a matmul
+        distance_sq = (
+            (coords * coords).sum(axis=0)[:, None]
+            + (centre * centre).sum(axis=0)[None, :]
+            - 2.0 * coords.T @ centre
+        )
+        strength = k * k * mass / np.maximum(distance_sq, 1e-9)
+        strength[np.arange(num_nodes), cell] = 0.0
+        displacement = coords * strength.sum(axis=1) - centre @ strength.T
+
+        # near field: exact repulsion between nodes sharing a cell
+        delta = coords[:, first] - coords[:, second]
+        strength = k * k / np.maximum(delta[0] * delta[0] + delta[1] * delta[1], 1e-9)
+        for axis in range(2):
+            displacement[axis] += np.bincount(first, delta[axis] * strength, num_nodes)
+        return displacement
@@ -0,0 +1,501 @@
+"""Offline arXiv corpus built from bulk metadata snapshots.
+
+The snapshot (one JSON object per line, as published on Kaggle and in the
+arXiv bulk data) is streamed in batches into a directory of segments. Every
+segment stores its text columns as compressed UTF-8 buffers with offsets,
+its embeddings as a plain array that can be memory mapped, and a term index
+of the words of its titles and abstracts, so keyword queries only read the
+postings of their terms. Daily delta files are ingested as extra segments,
+a paper seen again supersedes its older row.
+
+Usage:
+    python -m app_func.local_corpus ingest <snapshot.jsonl> --store <dir>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app_func.atom_parser import COLUMNS
+from app_func.paper_table import clean_text
+from app_func.similarity import normalize_embeddings
+
+LIST_SEPARATOR = "\x1f"
+LIST_COLUMNS = ["authors", "categories"]
+# words of the term index, the pattern of `paper_table.WORD_PATTERN`
+WORD_REGEX = re.compile(r"\w+")
+# term hash and end of its postings, sorted by hash
+TERM_DTYPE = np.dtype([("hash", "<u8"), ("end", "<i8")])
+# rows of embeddings scored at once by a semantic query
+SCAN_ROWS = 65_536
+
+
+def snapshot_record(line: str) -> Dict[str, object]:
+    """Converts a snapshot line into a row shaped like the Atom parser output
+    Args:
+        line (str): one JSON line of the snapshot
+    Returns:
+        Dict[str, object]: row with the columns of `atom_parser.COLUMNS`
+    """
+    raw = json.loads(line)
+    versions = raw.get("versions") or [{"version": "v1"}]
+    version = max(int(entry["version"].lstrip("v")) for entry in versions)
+    created = versions[0].get("created")
+    published = (
+        parsedate_to_datetime(created).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if created
+        else None
+    )
+    if raw.get("authors_parsed"):
+        authors = [
+            " ".join(part for part in (name[1], name[0]) if part)
+            for name in raw["authors_parsed"]
+        ]
+    else:
+        authors = [name.strip() for name in raw.get("authors", "").split(",")]
+    categories = (raw.get("categories") or "").split()
+
+    return {
+        "id": f"http://arxiv.org/abs/{raw['id']}v{version}",
+        "arxiv_id": raw["id"],
+        "version": version,
+        "title": raw.get("title"),
+        "summary": raw.get("abstract"),
+        "published": published,
+        "updated": raw.get("update_date"),
+        "journal_ref": raw.get("journal-ref"),
+        "doi": raw.get("doi"),
+        "authors": authors,
+        "categories": categories,
+        "primary_category": categories[0] if categories else None,
+    }
+
+
+def term_hash(term: str) -> int:
+    """64 bit hash of a term of the term index, stable across processes
+    Args:
+        term (str): lower case word
+    Returns:
+        int: hash
+    """
+    digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower case words of a text, as matched by keyword queries
+    Args:
+        text (Optional[str]): title, abstract or search term
+    Returns:
+        List[str]: words, in text order
+    """
+    return WORD_REGEX.findall(text.lower()) if text else []
+
+
+def build_term_index(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverted index of the words of the rows of a segment
+    Args:
+        texts (List[str]): title and abstract of every row
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: TERM_DTYPE terms sorted by hash and
+            the int32 rows of every term, in row order
+    """
+    tokens = [tokenize(text) for text in texts]
+    rows = np.repeat(
+        np.arange(len(texts), dtype=np.int64), [len(words) for words in tokens]
+    )
+    codes, terms = pd.factorize(
+        pd.Series([word for words in tokens for word in words], dtype=object)
+    )
+    hashes = np.fromiter((term_hash(term) for term in terms), np.uint64, len(terms))
+    order = np.argsort(hashes, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    # one posting per term and row, grouped by term in hash order
+    postings = np.unique(rank[codes] * max(len(texts), 1) + rows)
+    index = np.zeros(len(terms), dtype=TERM_DTYPE)
+    index["hash"] = hashes[order]
+    index["end"] = np.searchsorted(
+        postings // max(len(texts), 1), np.arange(1, len(terms) + 1)
+    )
+    return index, (postings % max(len(texts), 1)).astype(np.int32)
+
+
+def published_keys(published: List[Optional[str]]) -> np.ndarray:
+    """Sortable publication times, the epoch when missing, older than any
+    arXiv paper
+    Args:
+        published (List[Optional[str]]): ISO 8601 UTC timestamps
+    Returns:
+        np.ndarray: int64 seconds since the epoch
+    """
+    times = pd.to_datetime(
+        pd.Series(published, dtype=object), utc=True, errors="coerce"
+    )
+    seconds = times.dt.tz_localize(None).to_numpy("datetime64[s]").astype(np.int64)
+    seconds[times.isna().to_numpy()] = 0
+    return seconds
+
+
+def encode_strings(values: List[Optional[str]]) -> Dict[str, np.ndarray]:
+    """Packs strings into a UTF-8 buffer with offsets, None is kept as null
+    Args:
+        values (List[Optional[str]]): column values
+    Returns:
+        Dict[str, np.ndarray]: "data" bytes, "offsets" and "null" mask
+    """
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {
+        "data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "offsets": offsets,
+        "null": np.array([value is None for value in values], dtype=bool),
+    }
+
+
+def decode_strings(
+    data: np.ndarray, offsets: np.ndarray, null: np.ndarray, rows: np.ndarray
+) -> List[Optional[str]]:
+    """Unpacks selected rows of a column written by `encode_strings`
+    Args:
+        data (np.ndarray): UTF-8 buffer
+        offsets (np.ndarray): start offset of every row, plus the end
+        null (np.ndarray): null mask
+        rows (np.ndarray): rows to decode
+    Returns:
+        List[Optional[str]]: decoded values
+    """
+    buffer = data.tobytes()
+    return [
+        None if null[row] else buffer[offsets[row] : offsets[row + 1]].decode("utf-8")
+        for row in rows
+    ]
+
+
+def read_column(columns, column: str, rows: np.ndarray) -> List[Optional[str]]:
+    """Decodes selected rows of a string column of an open segment
+    Args:
+        columns: open segment archive
+        column (str): column name
+        rows (np.ndarray): rows to decode
+    Returns:
+        List[Optional[str]]: decoded values
+    """
+    return decode_strings(
+        columns[f"{column}.data"],
+        columns[f"{column}.offsets"],
+        columns[f"{column}.null"],
+        rows,
+    )
+
+
+class LocalCorpus:
+    """Segmented columnar store of arXiv metadata and embeddings"""
+
+    def __init__(self, path: str) -> None:
+        """Opens or creates a store
+        Args:
+            path (str): store directory
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as file:
+                self.manifest = json.load(file)
+        else:
+            self.manifest = {
+                "model_name": None,
+                "dim": None,
+                "segments": [],
+                "clean_summaries": True,
+            }
+        self._live: Optional[List[np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(int(mask.sum()) for mask in self._live_masks())
+
+    def ingest(
+        self,
+        lines: Iterator[str],
+        model,
+        model_name: str = "all-MiniLM-L6-v2",
+        batch_size: int = 4096,
+        encode_batch_size: int = 64,
+    ) -> int:
+        """Streams snapshot lines into new segments
+            memory is bounded by one batch being encoded plus one batch
+            being compressed and written in the background. Abstracts are
+            encoded cleaned like `DataPipeline.preprocessing_pipeline`
+            cleans them, so the app can reuse the embeddings
+        Args:
+            lines (Iterator[str]): JSON lines of a snapshot or delta file
+            model: sentence transformer used to precompute embeddings
+            model_name (str, optional): name recorded for the embeddings.
+                                        Defaults to "all-MiniLM-L6-v2".
+            batch_size (int, optional): rows per segment. Defaults to 4096.
+            encode_batch_size (int, optional): batch size of the model.
+                                               Defaults to 64.
+        Returns:
+            int: number of rows ingested
+        """
+        if self.manifest["model_name"] not in (None, model_name):
+            raise ValueError(
+                f"Store embeddings were built with {self.manifest['model_name']}"
+            )
+        self.manifest["model_name"] = model_name
+        # stores written before kept the raw abstracts, deltas match them
+        cleaned = self.manifest.setdefault("clean_summaries", False)
+        num_rows = 0
+        pending = None
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            for records in self._batches(lines, batch_size):
+                summaries = [record["summary"] or "" for record in records]
+                embeddings = model.encode(
+                    clean_text(summaries) if cleaned else summaries,
+                    batch_size=encode_batch_size,
+                )
+                if pending is not None:
+                    pending.result()
+                pending = writer.submit(self._write_segment, records, embeddings)
+                num_rows += len(records)
+            if pending is not None:
+                pending.result()
+
+        self._live = None
+        return num_rows
+
+    def search(self, search_term: str, num_results: int, model=None) -> pd.DataFrame:
+        """Answers a query the way `DataPipeline.query_arxiv` would
+            papers are ranked by cosine similarity to the encoded search
+            term when a model is given, otherwise every word of it has to
+            appear in the title or abstract and the newest papers come first
+        Args:
+            search_term (str): search term as defined by user
+            num_results (int): maximum number of results
+            model (optional): sentence transformer for semantic ranking.
+                              Defaults to None.
+        Returns:
+            pd.DataFrame: rows with the columns of `atom_parser.COLUMNS`, plus
+                the precomputed unit length embeddings in the "embedding"
+                column
+        """
+        if model is not None:
+            hits = self._semantic_hits(search_term, num_results, model)
+        else:
+            hits = self._keyword_hits(search_term, num_results)
+        return self._rows(hits)
+
+    def _semantic_hits(self, search_term: str, num_results: int, model):
+        """(score, segment, row) of the best semantic matches, the memory
+        mapped embeddings are scored SCAN_ROWS rows at a time"""
+        query = normalize_embeddings(model.encode([search_term]))[0]
+        best = []
+        for segment, live in zip(self.manifest["segments"], self._live_masks()):
+            embeddings = np.load(
+                os.path.join(self.path, f"{segment['name']}.npy"), mmap_mode="r"
+            )
+            for start in range(0, len(embeddings), SCAN_ROWS):
+                chunk = np.asarray(embeddings[start : start + SCAN_ROWS])
+                scores = (chunk @ query).astype(np.float32)
+                scores[~live[start : start + SCAN_ROWS]] = -np.inf
+                top = min(num_results, len(scores))
+                top = np.argpartition(-scores, top - 1)[:top]
+                best.extend(
+                    (float(scores[row]), segment["name"], start + int(row))
+                    for row in top
+                    if np.isfinite(scores[row])
+                )
+                best = sorted(best, key=lambda hit: -hit[0])[:num_results]
+        return best
+
+    def _keyword_hits(self, search_term: str, num_results: int):
+        """(published, segment, row) of the newest papers with every word of
+        the search term, from the postings of its words in the term index"""
+        hashes = np.array(
+            sorted({term_hash(term) for term in tokenize(search_term)}), np.uint64
+        )
+        best = []
+        if len(hashes) == 0:
+            return best
+        for segment, live in zip(self.manifest["segments"], self._live_masks()):
+            terms, postings, published = self._term_index(segment)
+            positions = np.searchsorted(terms["hash"], hashes)
+            if np.any(positions == len(terms)) or np.any(
+                terms["hash"][positions] != hashes
+            ):
+                continue
+            match = None
+            for position in positions:
+                start = terms["end"][position - 1] if position > 0 else 0
+                rows = postings[start : terms["end"][position]]
+                match = rows if match is None else np.intersect1d(match, rows)
+            match = match[live[match]]
+            newest = np.argsort(-published[match], kind="stable")[:num_results]
+            best.extend(
+                (int(published[row]), segment["name"], int(row))
+                for row in match[newest]
+            )
+            best = sorted(best, key=lambda hit: hit[0], reverse=True)[:num_results]
+        return best
+
+    def _term_index(self, segment: Dict[str, object]):
+        """Memory maps the term index of a segment, segments written before
+        the term index existed are indexed once on first use"""
+        name = segment["name"]
+        paths = [
+            os.path.join(self.path, f"{name}.{part}.npy")
+            for part in ("terms", "postings", "published")
+        ]
+        if not all(os.path.exists(path) for path in paths):
+            rows = np.arange(segment["rows"])
+            with np.load(os.path.join(self.path, f"{name}.npz")) as columns:
+                records = [
+                    dict(zip(("title", "summary", "published"), values))
+                    for values in zip(
+                        read_column(columns, "title", rows),
+                        read_column(columns, "summary", rows),
+                        read_column(columns, "published", rows),
+                    )
+                ]
+            self._write_term_index(name, records)
+        return tuple(np.load(path, mmap_mode="r") for path in paths)
+
+    def _write_term_index(self, name: str, records: List[Dict[str, object]]) -> None:
+        """Writes the term index and publication times of a segment"""
+        terms, postings = build_term_index(
+            [f"{record['title'] or ''} {record['summary'] or ''}" for record in records]
+        )
+        published = published_keys([record["published"] for record in records])
+        for part, array in (
+            ("terms", terms),
+            ("postings", postings),
+            ("published", published),
+        ):
+            path = os.path.join(self.path, f"{name}.{part}.npy")
+            np.save(f"{path}.tmp.npy", array)
+            os.replace(f"{path}.tmp.npy", path)
+
+    def _rows(self, hits) -> pd.DataFrame:
+        """Decodes the metadata and embeddings of the hits, in hit order"""
+        if not hits:
+            return pd.DataFrame()
+        by_segment: Dict[str, List[Tuple[int, int]]] = {}
+        for order, (_, name, row) in enumerate(hits):
+            by_segment.setdefault(name, []).append((order, row))
+
+        records: List[Optional[Dict[str, object]]] = [None] * len(hits)
+        for name, items in by_segment.items():
+            rows = np.array([row for _, row in items])
+            embeddings = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+            with np.load(os.path.join(self.path, f"{name}.npz")) as columns:
+                decoded = {"version": columns["version"][rows]}
+                for column in COLUMNS:
+                    if column == "version":
+                        continue
+                    decoded[column] = read_column(columns, column, rows)
+            for i, (order, row) in enumerate(items):
+                record = {column: decoded[column][i] for column in COLUMNS}
+                for column in LIST_COLUMNS:
+                    value = record[column]
+                    record[column] = value.split(LIST_SEPARATOR) if value else []
+                record["version"] = int(record["version"])
+                record["embedding"] = np.array(embeddings[row])
+                records[order] = record
+
+        return pd.DataFrame(records, columns=[*COLUMNS, "embedding"])
+
+    def _batches(self, lines: Iterator[str], batch_size: int):
+        """Groups parsed snapshot lines into batches"""
+        batch = []
+        for line in lines:
+            if not line.strip():
+                continue
+            batch.append(snapshot_record(line))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _write_segment(self, records: List[Dict[str, object]], embeddings) -> None:
+        """Compresses a batch into a new segment and records it"""
+        embeddings = normalize_embeddings(embeddings)
+        with self._lock:
+            name = f"segment-{len(self.manifest['segments']):06d}"
+            arrays = {"version": np.array([r["version"] for r in records], np.int32)}
+            for column in COLUMNS:
+                if column == "version":
+                    continue
+                values = [record[column] for record in records]
+                if column in LIST_COLUMNS:
+                    values = [LIST_SEPARATOR.join(value) for value in values]
+                for part, array in encode_strings(values).items():
+                    arrays[f"{column}.{part}"] = array
+
+            np.savez_compressed(os.path.join(self.path, f"{name}.npz"), **arrays)
+            np.save(os.path.join(self.path, f"{name}.npy"), embeddings)
+            self._write_term_index(name, records)
+            self.manifest["dim"] = int(embeddings.shape[1])
+            self.manifest["segments"].append({"name": name, "rows": len(records)})
+            manifest_path = os.path.join(self.path, "manifest.json")
+            with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(self.manifest, file)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def _live_masks(self) -> List[np.ndarray]:
+        """Per segment mask of rows not superseded by a later segment"""
+        if self._live is None:
+            ids = []
+            for segment in self.manifest["segments"]:
+                with np.load(
+                    os.path.join(self.path, f"{segment['name']}.npz")
+                ) as columns:
+                    ids.extend(
+                        read_column(columns, "arxiv_id", np.arange(segment["rows"]))
+                    )
+            ids = np.array(ids, dtype=object)
+            _, last = np.unique(ids[::-1], return_index=True)
+            live = np.zeros(len(ids), dtype=bool)
+            live[len(ids) - 1 - last] = True
+            bounds = np.cumsum([0] + [s["rows"] for s in self.manifest["segments"]])
+            self._live = [
+                live[bounds[i] : bounds[i + 1]] for i in range(len(bounds) - 1)
+            ]
+        return self._live
+
+
+def main():
+    """Command line entry point for ingesting snapshots"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest = subparsers.add_parser("ingest", help="append a snapshot or delta file")
+    ingest.add_argument("snapshot", help="JSON Lines metadata file")
+    ingest.add_argument("--store", required=True, help="store directory")
+    ingest.add_argument("--model", default="all-MiniLM-L6-v2")
+    ingest.add_argument("--batch-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(args.model)
+    with open(args.snapshot, encoding="utf-8") as lines:
+        num_rows = LocalCorpus(args.store).ingest(
+            lines, model, model_name=args.model, batch_size=args.batch_size
+        )
+    print(f"Ingested {num_rows} papers into {args.store}")
+
+
+if __name__ == "__main__":
+    main()
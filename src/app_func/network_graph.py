@@ -1,96 +1,200 @@
 import plotly.graph_objects as go
-import networkx as nx
+from plotly.colors import qualitative
+import numpy as np
 import pandas as pd
-from typing import Tuple
+from typing import Dict, Hashable, NamedTuple, Optional, Sequence, Tuple
+
+from app_func.figures import (
+    DEFAULT_LEAN_FIGURES,
+    DEFAULT_WEBGL_NODES,
+    compact_coordinates,
+)
+from app_func.layout import ForceLayout
+
+CLUSTER_COLORS = qualitative.Alphabet
+
+
+class GraphLayout(NamedTuple):
+    """Node positions of a similarity graph, node i is the paper ids[i]"""
+
+    ids: np.ndarray
+    positions: np.ndarray
+    src: np.ndarray
+    dst: np.ndarray
+    weights: np.ndarray
 
 
 class Network:
     """Generates a network graph"""
 
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        seed: int = 0,
+        max_iterations: int = 50,
+        lean: bool = DEFAULT_LEAN_FIGURES,
+        webgl_nodes: int = DEFAULT_WEBGL_NODES,
+    ):
+        """Instantiates the layout engine
+        Args:
+            seed (int, optional): Layout seed. Defaults to 0.
+            max_iterations (int, optional): Layout iteration budget.
+                                            Defaults to 50.
+            lean (bool, optional): Sends rounded coordinates, and draws graphs
+                of more than `webgl_nodes` nodes with WebGL.
+                Defaults to DEFAULT_LEAN_FIGURES.
+            webgl_nodes (int, optional): Nodes above which lean graphs use
+                                         WebGL. Defaults to DEFAULT_WEBGL_NODES.
+        """
+        self.layout_engine = ForceLayout(seed=seed, max_iterations=max_iterations)
+        self.lean = lean
+        self.webgl_nodes = webgl_nodes
+        self.positions: Dict[Hashable, Tuple[float, float]] = {}
 
-    def plot_networkgraph(self, df: pd.DataFrame) -> Tuple[str, object]:
-        """Plots networkgraph
+    def compute_layout(
+        self,
+        edges: np.ndarray,
+        keys: Optional[Sequence[Hashable]] = None,
+        max_iterations: Optional[int] = None,
+    ) -> GraphLayout:
+        """Lays out the graph, warm starting from the positions of nodes
+        that were already on the previous graph
         Args:
-            df (pd.DataFrame): takes in cosine similarity matrix
+            edges (np.ndarray): similarity edges of EDGE_DTYPE between paper ids
+            keys (Optional[Sequence[Hashable]], optional): Key of every paper id
+                that stays the same across searches, e.g. its arXiv url, for
+                the warm start. Defaults to the paper ids.
+            max_iterations (Optional[int], optional): Iteration budget, e.g.
+                0 to keep the previous positions and only place new nodes.
+                Defaults to the engine's.
         Returns:
-            Tuple[str, object]: returns the label and network plot
+            GraphLayout: paper id, position and edges of every node
         """
-        G = nx.from_pandas_edgelist(
-            df, source="From", target="To", edge_attr="Weights", create_using=nx.Graph()
+        ids, nodes = np.unique(
+            np.concatenate([edges["src"], edges["dst"]]), return_inverse=True
         )
-        pos = nx.drawing.layout.spring_layout(G)
-        nx.set_node_attributes(G, pos, "pos")
-
-        edge_x = []
-        edge_y = []
-        for edge in G.edges():
-            x0, y0 = G.nodes[edge[0]]["pos"]
-            x1, y1 = G.nodes[edge[1]]["pos"]
-            edge_x.append(x0)
-            edge_x.append(x1)
-            edge_x.append(None)
-            edge_y.append(y0)
-            edge_y.append(y1)
-            edge_y.append(None)
-
-        edge_trace = go.Scatter(
-            x=edge_x,
-            y=edge_y,
+        src, dst = nodes[: len(edges)], nodes[len(edges) :]
+        weights = edges["weight"].astype(np.float64)
+        node_keys = ids.tolist() if keys is None else np.asarray(keys)[ids].tolist()
+
+        initial = None
+        if self.positions:
+            initial = np.array(
+                [self.positions.get(key, (np.nan, np.nan)) for key in node_keys],
+                dtype=np.float64,
+            ).reshape(-1, 2)
+        positions = self.layout_engine.compute(
+            len(ids),
+            src,
+            dst,
+            weights=weights,
+            initial=initial,
+            max_iterations=max_iterations,
+        )
+        self.positions = dict(zip(node_keys, map(tuple, positions)))
+        return GraphLayout(ids, positions, src, dst, weights)
+
+    def plot_networkgraph(
+        self,
+        edges: np.ndarray,
+        titles: Sequence[str],
+        layout: Optional[GraphLayout] = None,
+        clusters: Optional[pd.DataFrame] = None,
+    ) -> go.Figure:
+        """Plots networkgraph, the paper id of every node is its customdata
+        Args:
+            edges (np.ndarray): similarity edges of EDGE_DTYPE between paper ids
+            titles (Sequence[str]): title of every paper, by paper id
+            layout (Optional[GraphLayout], optional): Precomputed layout of
+                edges, computed when None. Defaults to None.
+            clusters (Optional[pd.DataFrame], optional): "cluster" and
+                "cluster_label" of every paper, by paper id, nodes are colored
+                by cluster instead of by connections when given.
+                Defaults to None.
+        Returns:
+            go.Figure: network plot, with Scattergl traces for large graphs
+                in lean mode
+        """
+        if layout is None:
+            layout = self.compute_layout(edges)
+        ids, positions, src, dst, _ = layout
+        scatter = go.Scatter
+        if self.lean:
+            positions = compact_coordinates(positions)
+            if len(ids) > self.webgl_nodes:
+                scatter = go.Scattergl
+
+        # one NaN separated segment per edge, NaN breaks the line in plotly
+        edge_xy = np.full((len(src), 3, 2), np.nan)
+        edge_xy[:, 0] = positions[src]
+        edge_xy[:, 1] = positions[dst]
+        edge_xy = edge_xy.reshape(-1, 2)
+
+        edge_trace = scatter(
+            x=edge_xy[:, 0],
+            y=edge_xy[:, 1],
             line=dict(width=0.5, color="#888"),
             hoverinfo="none",
             mode="lines",
         )
 
-        node_x = []
-        node_y = []
-        labels = []
-        for node in G.nodes():
-            x, y = G.nodes[node]["pos"]
-            labels.append(node)
-            node_x.append(x)
-            node_y.append(y)
-
-        node_trace = go.Scatter(
-            x=node_x,
-            y=node_y,
-            mode="markers",
-            hoverinfo="text",
-            marker=dict(
-                showscale=True,
-                # colorscale options
-                #'Greys' | 'YlGnBu' | 'Greens' | 'YlOrRd' | 'Bluered' | 'RdBu' |
-                #'Reds' | 'Blues' | 'Picnic' | 'Rainbow' | 'Portland' | 'Jet' |
-                #'Hot' | 'Blackbody' | 'Earth' | 'Electric' | 'Viridis' |
-                colorscale="YlGnBu",
-                reversescale=True,
-                color=[],
-                size=10,
-                colorbar=dict(
-                    thickness=15,
-                    title="Node Connections",
-                    xanchor="left",
-                    titleside="right",
-                ),
-                line_width=2,
-            ),
+        # distinct neighbours per node, duplicate links counted once
+        pairs = np.unique(
+            np.stack([np.minimum(src, dst), np.maximum(src, dst)], axis=1), axis=0
         )
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        node_adjacencies = np.bincount(pairs.ravel(), minlength=len(ids))
 
-        node_adjacencies = []
-        node_text = []
-        for node, adjacencies in enumerate(G.adjacency()):
-            node_adjacencies.append(len(adjacencies[1]))
-            node_text.append(f"{labels[node]}")
+        text = [f"{title}" for title in np.asarray(titles, dtype=object)[ids]]
+        marker = dict(
+            showscale=True,
+            # colorscale options
+            #'Greys' | 'YlGnBu' | 'Greens' | 'YlOrRd' | 'Bluered' | 'RdBu' |
+            #'Reds' | 'Blues' | 'Picnic' | 'Rainbow' | 'Portland' | 'Jet' |
+            #'Hot' | 'Blackbody' | 'Earth' | 'Electric' | 'Viridis' |
+            colorscale="YlGnBu",
+            reversescale=True,
+            color=node_adjacencies,
+            size=10,
+            colorbar=dict(
+                thickness=15,
+                title=dict(text="Node Connections", side="right"),
+                xanchor="left",
+            ),
+            line_width=2,
+        )
+        if clusters is not None:
+            cluster_ids = clusters["cluster"].to_numpy(dtype=np.int64)[ids]
+            palette = np.array(CLUSTER_COLORS)
+            marker.update(
+                showscale=False,
+                color=np.where(
+                    cluster_ids >= 0, palette[cluster_ids % len(palette)], "#888"
+                ),
+            )
+            text = [
+                f"{label}<br>{cluster_label}"
+                for label, cluster_label in zip(
+                    text, clusters["cluster_label"].to_numpy()[ids]
+                )
+            ]
 
-        node_trace.marker.color = node_adjacencies
-        node_trace.text = node_text
+        node_trace = scatter(
+            x=positions[:, 0],
+            y=positions[:, 1],
+            mode="markers",
+            hoverinfo="text",
+            text=text,
+            customdata=ids,
+            marker=marker,
+        )
 
         fig = go.Figure(
             data=[edge_trace, node_trace],
             layout=go.Layout(
-                title=f"Network graph of top {df.shape[0]} links",
-                titlefont_size=16,
+                title=dict(
+                    text=f"Network graph of top {len(edges)} links",
+                    font=dict(size=16),
+                ),
                 showlegend=False,
                 hovermode="closest",
                 margin=dict(b=20, l=5, r=5, t=40),
@@ -98,4 +202,4 @@ class Network:
                 yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
             ),
         )
-        return labels, fig
+        return fig
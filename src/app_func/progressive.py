@@ -0,0 +1,232 @@
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from app_func.budget import complete_results
+from app_func.result_store import ResultStore, result_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIRST_PAGE = int(os.environ.get("ARXIV_FIRST_PAGE", "100"))
+
+
+class ProgressiveSearch:
+    """Search that shows results before every page of arXiv arrived.
+    A background thread fetches a small first page, runs the pipeline on it
+    and publishes the results, then reruns the pipeline on all the papers
+    received so far after every later page, so the graph, word cloud and
+    charts grow while the rest loads. The time to the first graph depends
+    on `first_page_size`, not on the number of results asked for. Only
+    the results of the last page are complete, they are computed through
+    the result store when one is given so other sessions share them.
+
+    With a latency budget every update is planned to fit it on its own,
+    results degraded to fit are not kept in the store.
+
+    A search can be cancelled, it then stops after the page or stage in
+    progress. A search that supersedes another cancels it and waits for it
+    to stop before using the same pipeline.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        search_term: str,
+        num_searches: int,
+        num_papers: int,
+        num_links: int,
+        cluster_method: str = "kmeans",
+        backbone: str = "top",
+        store: Optional[ResultStore] = None,
+        first_page_size: int = DEFAULT_FIRST_PAGE,
+        supersedes: Optional["ProgressiveSearch"] = None,
+        budget: Optional[float] = None,
+    ) -> None:
+        """Starts the search in a background thread
+        Args:
+            pipeline (SearchPipeline): pipeline of the session, only used by
+                                       this search until it stops
+            search_term (str): search term as defined by user
+            num_searches (int): number of arXiv results
+            num_papers (int): number of papers in the network graph
+            num_links (int): number of links in the network graph
+            cluster_method (str, optional): "kmeans" or "community".
+                                            Defaults to "kmeans".
+            backbone (str, optional): Links kept, see `backbone.BACKBONES`.
+                                      Defaults to "top".
+            store (Optional[ResultStore], optional): Store of complete
+                results, read and filled when given. Defaults to None.
+            first_page_size (int, optional): Results of the first page.
+                                             Defaults to DEFAULT_FIRST_PAGE.
+            supersedes (Optional[ProgressiveSearch], optional): Search of the
+                same pipeline to cancel. Defaults to None.
+            budget (Optional[float], optional): Seconds every update should
+                take, see `SearchPipeline.run`. Defaults to None.
+        """
+        self.pipeline = pipeline
+        self.params = dict(
+            search_term=search_term,
+            num_searches=num_searches,
+            num_papers=num_papers,
+            num_links=num_links,
+            cluster_method=cluster_method,
+            backbone=backbone,
+        )
+        self.store = store
+        self.first_page_size = first_page_size
+        self.budget = budget
+        self.results: Optional[Dict[str, Any]] = None
+        self.version = 0
+        self.num_fetched = 0
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, args=(supersedes,), name="progressive-search", daemon=True
+        )
+        self._thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest state of the search
+        Returns:
+            Dict[str, Any]: "results" so far (None before the first page or
+                when nothing matched), their "version", which grows with
+                every update, "num_fetched" papers in them, and "done",
+                "cancelled" and "error"
+        """
+        with self._lock:
+            return {
+                "results": self.results,
+                "version": self.version,
+                "num_fetched": self.num_fetched,
+                "done": self.done,
+                "cancelled": self.cancelled,
+                "error": self.error,
+            }
+
+    def cancel(self) -> None:
+        """Asks the search to stop after the page or stage in progress"""
+        self._cancel.set()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits for the search to stop
+        Args:
+            timeout (Optional[float], optional): Seconds to wait at most,
+                                                 no limit when None.
+        Returns:
+            bool: True when the search stopped
+        """
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self, supersedes: Optional["ProgressiveSearch"]) -> None:
+        if supersedes is not None:
+            supersedes.cancel()
+            supersedes.join()
+        try:
+            key = result_key(**self.params)
+            if self.store is None or key not in self.store:
+                self._run_pages()
+            if not self._cancel.is_set():
+                self._publish(self._complete(key))
+        except Exception as error:
+            logger.exception("Progressive search failed")
+            with self._lock:
+                self.error = error
+        finally:
+            with self._lock:
+                self.cancelled = self._cancel.is_set()
+                self.done = True
+
+    def _run_pages(self) -> None:
+        """Publishes the results of every page but the last"""
+        params = {
+            name: value for name, value in self.params.items() if name != "num_searches"
+        }
+        pages = self.pipeline.connector.query_arxiv_pages(
+            self.params["search_term"],
+            self.params["num_searches"],
+            self.first_page_size,
+        )
+        try:
+            for fetched, complete in pages:
+                if self._cancel.is_set() or complete:
+                    return
+                self._publish(
+                    self.pipeline.run_partial(fetched, **params, budget=self.budget)
+                )
+        finally:
+            pages.close()
+
+    def _complete(self, key) -> Optional[Dict[str, Any]]:
+        """Results of every page, from the query cache filled while paging"""
+
+        def compute():
+            return self.pipeline.run(**self.params, budget=self.budget)
+
+        if self.store is None:
+            return compute()
+        return self.store.get_or_compute(key, compute, keep=complete_results)
+
+    def _publish(self, results: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.results = results
+            self.version += 1
+            self.num_fetched = 0 if results is None else len(results["df"])
+
+
+def run_search(
+    pipeline,
+    search_term: str,
+    num_searches: int,
+    num_papers: int,
+    num_links: int,
+    cluster_method: str = "kmeans",
+    backbone: str = "top",
+    store: Optional[ResultStore] = None,
+    supersedes: Optional[ProgressiveSearch] = None,
+    budget: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """Runs a search in the calling thread, after the progressive search of
+    the same pipeline it supersedes stopped, so the two never share it
+    Args:
+        pipeline (SearchPipeline): pipeline of the session
+        search_term (str): search term as defined by user
+        num_searches (int): number of arXiv results
+        num_papers (int): number of papers in the network graph
+        num_links (int): number of links in the network graph
+        cluster_method (str, optional): "kmeans" or "community".
+                                        Defaults to "kmeans".
+        backbone (str, optional): Links kept, see `backbone.BACKBONES`.
+                                  Defaults to "top".
+        store (Optional[ResultStore], optional): Store of complete results,
+            read and filled when given. Defaults to None.
+        supersedes (Optional[ProgressiveSearch], optional): Search of the
+            same pipeline to cancel. Defaults to None.
+        budget (Optional[float], optional): Seconds the search should take,
+                                            see `SearchPipeline.run`.
+                                            Defaults to None.
+    Returns:
+        Optional[Dict[str, Any]]: output of `SearchPipeline.run`
+    """
+    if supersedes is not None:
+        supersedes.cancel()
+        supersedes.join()
+    params = dict(
+        search_term=search_term,
+        num_searches=num_searches,
+        num_papers=num_papers,
+        num_links=num_links,
+        cluster_method=cluster_method,
+        backbone=backbone,
+    )
+
+    def compute():
+        return pipeline.run(**params, budget=budget)
+
+    if store is None:
+        return compute()
+    return store.get_or_compute(result_key(**params), compute, keep=complete_results)
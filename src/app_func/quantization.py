@@ -0,0 +1,164 @@
+from typing import Union
+
+import numpy as np
+
+QUANTIZATIONS = ["float32", "float16", "int8"]
+INT8_LEVELS = 127
+
+# target rows upcast to float32 at a time by the similarity kernel
+SCORE_CHUNK_ROWS = 4096
+
+
+class QuantizedEmbeddings:
+    """Unit-length embeddings kept in a compact form.
+    float16 halves the memory of float32. int8 stores every vector as
+    codes in [-127, 127] times a per-vector scale, about a quarter of the
+    memory. The norm of every reconstructed vector is kept too so cosine
+    scores stay exact for the compact vectors: a block of codes is upcast to
+    float32 for the matrix product, and the scales and norms are applied to
+    the scores instead of the vectors. The int8 products are exact in float32
+    as long as dim * 127**2 < 2**24, i.e. up to 1040 dimensions.
+    Rows can be read, written and sliced like an array.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray, norms: np.ndarray):
+        """Wraps quantized arrays, see `quantize` to build them
+        Args:
+            codes (np.ndarray): (N, dim) float32, float16 or int8 codes
+            scales (np.ndarray): (N,) float32 size of one code step
+            norms (np.ndarray): (N,) float32 norms of the reconstructed vectors
+        """
+        self.codes = codes
+        self.scales = scales
+        self.norms = norms
+
+    @classmethod
+    def quantize(
+        cls, embeddings: np.ndarray, dtype: str = "int8"
+    ) -> "QuantizedEmbeddings":
+        """Normalizes and quantizes embeddings
+        Args:
+            embeddings (np.ndarray): (N, dim) embeddings
+            dtype (str, optional): one of QUANTIZATIONS. Defaults to "int8".
+        Returns:
+            QuantizedEmbeddings: compact unit vectors
+        """
+        if dtype not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown quantization {dtype}, use one of {QUANTIZATIONS}"
+            )
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        vectors = vectors / np.maximum(
+            np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12
+        )
+        if dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / INT8_LEVELS
+            scales = np.maximum(scales, 1e-12).astype(np.float32)
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        else:
+            scales = np.ones(len(vectors), dtype=np.float32)
+            codes = vectors.astype(dtype)
+        norms = np.linalg.norm(codes.astype(np.float32), axis=1) * scales
+        return cls(codes, scales, norms.astype(np.float32))
+
+    @classmethod
+    def empty(cls, size: int, dim: int, dtype: str = "int8") -> "QuantizedEmbeddings":
+        """Zero filled storage for `size` vectors
+        Args:
+            size (int): number of vectors
+            dim (int): embedding dimension
+            dtype (str, optional): one of QUANTIZATIONS. Defaults to "int8".
+        Returns:
+            QuantizedEmbeddings: storage to be filled by row assignment
+        """
+        return cls(
+            np.zeros((size, dim), dtype=dtype),
+            np.ones(size, dtype=np.float32),
+            np.ones(size, dtype=np.float32),
+        )
+
+    @property
+    def dtype(self) -> str:
+        return self.codes.dtype.name
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes + self.norms.nbytes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, rows) -> "QuantizedEmbeddings":
+        if isinstance(rows, (int, np.integer)):
+            rows = [rows]
+        return QuantizedEmbeddings(
+            self.codes[rows], self.scales[rows], self.norms[rows]
+        )
+
+    def __setitem__(self, rows, vectors) -> None:
+        if not isinstance(vectors, QuantizedEmbeddings):
+            vectors = QuantizedEmbeddings.quantize(vectors, self.dtype)
+        if isinstance(rows, (int, np.integer)):
+            rows = [rows]
+        self.codes[rows] = vectors.codes
+        self.scales[rows] = vectors.scales
+        self.norms[rows] = vectors.norms
+
+    def dequantize(self) -> np.ndarray:
+        """Reconstructed vectors, scaled back to unit length
+        Returns:
+            np.ndarray: (N, dim) float32 vectors
+        """
+        factors = self.scales / np.maximum(self.norms, 1e-12)
+        return self.codes.astype(np.float32) * factors[:, None]
+
+
+Vectors = Union[np.ndarray, QuantizedEmbeddings]
+
+
+def as_float32(vectors: Vectors) -> np.ndarray:
+    """Float32 vectors of plain or quantized embeddings
+    Args:
+        vectors (Vectors): embeddings
+    Returns:
+        np.ndarray: (N, dim) float32 vectors
+    """
+    if isinstance(vectors, QuantizedEmbeddings):
+        return vectors.dequantize()
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def pairwise_scores(queries: Vectors, targets: Vectors) -> np.ndarray:
+    """Dot products of every query with every target, cosine scores when
+    both are unit length; quantized targets are upcast a chunk at a time
+    Args:
+        queries (Vectors): (Q, dim) unit vectors, plain or quantized
+        targets (Vectors): (T, dim) unit vectors, plain or quantized
+    Returns:
+        np.ndarray: (Q, T) float32 scores
+    """
+    if not isinstance(queries, QuantizedEmbeddings) and not isinstance(
+        targets, QuantizedEmbeddings
+    ):
+        return queries @ targets.T
+
+    query_factors = 1.0
+    if isinstance(queries, QuantizedEmbeddings):
+        query_factors = (queries.scales / np.maximum(queries.norms, 1e-12))[:, None]
+        queries = queries.codes.astype(np.float32)
+    if not isinstance(targets, QuantizedEmbeddings):
+        return (queries @ targets.T) * query_factors
+
+    scores = np.empty((len(queries), len(targets)), dtype=np.float32)
+    factors = targets.scales / np.maximum(targets.norms, 1e-12)
+    for start in range(0, len(targets), SCORE_CHUNK_ROWS):
+        stop = min(start + SCORE_CHUNK_ROWS, len(targets))
+        chunk = targets.codes[start:stop].astype(np.float32)
+        np.matmul(queries, chunk.T, out=scores[:, start:stop])
+        scores[:, start:stop] *= factors[start:stop]
+    scores *= query_factors
+    return scores
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+
+def normalize_search_term(search_term: str) -> str:
+    """Normalizes a search term so equivalent queries share a cache entry
+    Args:
+        search_term (str): search term as defined by user
+    Returns:
+        str: lower-cased search term with collapsed whitespace
+    """
+    return " ".join(search_term.replace("+", " ").lower().split())
+
+
+class QueryCache:
+    """Two tier cache of parsed arXiv query results.
+    Results are kept in an in-memory LRU and in an on-disk store, each tier
+    with its own TTL. An entry fetched for `n` results also answers any
+    request for fewer results, and any request at all once arXiv returned
+    fewer papers than were asked for. Empty results are only kept in memory,
+    a transient empty feed would otherwise hide a query for the disk TTL.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        memory_ttl: float = 600.0,
+        disk_ttl: float = 86_400.0,
+        max_memory_entries: int = 64,
+    ) -> None:
+        """Instantiates the cache
+        Args:
+            cache_dir (Optional[str], optional): Directory of the on-disk tier,
+                disabled when None. Defaults to None.
+            memory_ttl (float, optional): Seconds an entry stays valid in
+                                          memory. Defaults to 600.0.
+            disk_ttl (float, optional): Seconds an entry stays valid on disk.
+                                        Defaults to 86_400.0.
+            max_memory_entries (int, optional): Size of the in-memory LRU.
+                                                Defaults to 64.
+        """
+        self.cache_dir = cache_dir
+        self.memory_ttl = memory_ttl
+        self.disk_ttl = disk_ttl
+        self.max_memory_entries = max_memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, int, pd.DataFrame]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str, num_results: int) -> Optional[pd.DataFrame]:
+        """Looks up a query result
+        Args:
+            key (str): query key, see `make_key`
+            num_results (int): number of results requested
+        Returns:
+            Optional[pd.DataFrame]: first `num_results` rows of the cached
+                result, or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._is_valid(
+                entry, num_results, self.memory_ttl
+            ):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[2].head(num_results).copy()
+
+            entry = self._read_disk(key)
+            if entry is not None and self._is_valid(entry, num_results, self.disk_ttl):
+                self._store_memory(key, entry)
+                self.disk_hits += 1
+                return entry[2].head(num_results).copy()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, num_results: int, dataframe: pd.DataFrame) -> None:
+        """Stores a parsed query result in both tiers, an empty one in memory
+        only
+        Args:
+            key (str): query key, see `make_key`
+            num_results (int): number of results that were requested
+            dataframe (pd.DataFrame): parsed result, empty when nothing matched
+        """
+        entry = (time.time(), num_results, dataframe)
+        with self._lock:
+            self._store_memory(key, entry)
+            if self.cache_dir is not None and not dataframe.empty:
+                path = self._disk_path(key)
+                with open(f"{path}.tmp", "wb") as file:
+                    pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(f"{path}.tmp", path)
+
+    def stats(self) -> Dict[str, float]:
+        """Summarises cache usage
+        Returns:
+            Dict[str, float]: memory hits, disk hits, misses and hit rate
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (
+                (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            ),
+        }
+
+    @staticmethod
+    def make_key(prefix: str, search_term: str) -> str:
+        """Builds the cache key of a query
+        Args:
+            prefix (str): API endpoint and fixed parameters of the query
+            search_term (str): search term as defined by user
+        Returns:
+            str: cache key
+        """
+        return f"{prefix}|{normalize_search_term(search_term)}"
+
+    @staticmethod
+    def _is_valid(
+        entry: Tuple[float, int, pd.DataFrame], num_results: int, ttl: float
+    ) -> bool:
+        """Checks TTL and whether the entry covers the requested size"""
+        created, cached_results, dataframe = entry
+        if time.time() - created > ttl:
+            return False
+        return cached_results >= num_results or len(dataframe) < cached_results
+
+    def _store_memory(self, key: str, entry: Tuple[float, int, pd.DataFrame]):
+        """Inserts an entry into the LRU, evicting the oldest if full"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pkl")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, int, pd.DataFrame]]:
+        """Reads an entry from disk, dropping it if it has expired"""
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            entry = pickle.load(file)
+        if time.time() - entry[0] > self.disk_ttl:
+            os.remove(path)
+            return None
+        return entry
+
+
+_SHARED_CACHES: Dict[Optional[str], QueryCache] = {}
+_SHARED_CACHES_LOCK = threading.Lock()
+
+
+def get_query_cache(cache_dir: Optional[str] = None) -> QueryCache:
+    """Returns the process-wide query cache for a directory
+    Args:
+        cache_dir (Optional[str], optional): Directory of the on-disk tier,
+            disabled when None. Defaults to None.
+    Returns:
+        QueryCache: shared query cache
+    """
+    with _SHARED_CACHES_LOCK:
+        if cache_dir not in _SHARED_CACHES:
+            _SHARED_CACHES[cache_dir] = QueryCache(cache_dir)
+        return _SHARED_CACHES[cache_dir]
@@ -0,0 +1,228 @@
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app_func.instrumentation import Instrumentation, get_instrumentation
+from app_func.query_cache import normalize_search_term
+
+DEFAULT_MAX_BYTES = int(os.environ.get("ARXIV_RESULT_STORE_MB", "512")) * 2**20
+
+
+def result_key(search_term: str, **params) -> Tuple:
+    """Builds the store key of a search
+    Args:
+        search_term (str): search term as defined by user
+        **params: every other parameter the results depend on
+    Returns:
+        Tuple: normalized search term and sorted parameters
+    """
+    return (normalize_search_term(search_term), tuple(sorted(params.items())))
+
+
+def estimate_bytes(value: Any) -> int:
+    """Approximate memory held by a result
+    Args:
+        value (Any): dataframes, arrays, figures and containers of them
+    Returns:
+        int: estimated size in bytes
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sum(estimate_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_bytes(item) for item in value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Flight:
+    """Computation in progress that other callers wait on"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultStore:
+    """Process-wide store of finished search results shared by all sessions.
+    Entries are evicted least recently used first once their estimated size
+    exceeds the memory budget, and expire after `ttl` seconds. Lookups are
+    single flight: while a result is being computed, callers asking for the
+    same key wait for it instead of computing it again.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = 600.0,
+        metrics: Optional[Instrumentation] = None,
+    ) -> None:
+        """Instantiates an empty store
+        Args:
+            max_bytes (int, optional): Memory budget of the stored results.
+                                       Defaults to DEFAULT_MAX_BYTES.
+            ttl (float, optional): Seconds a result stays valid.
+                                   Defaults to 600.0.
+            metrics (Optional[Instrumentation], optional): Metrics the
+                lookups are reported to as the "results" cache, not reported
+                when None. Defaults to None.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.metrics = metrics
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        keep: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Returns the stored result of a key, computing it once if missing
+        Args:
+            key (Hashable): result key, see `result_key`
+            compute (Callable[[], Any]): computes the result, None results
+                                         are returned but not stored
+            keep (Optional[Callable[[Any], bool]], optional): Whether a
+                computed result is stored, e.g. not a degraded one. Every
+                result is when None. Defaults to None.
+        Returns:
+            Any: stored, awaited or computed result
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            flight = self._in_flight.get(key)
+            owner = entry is None and flight is None
+            if owner:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+            elif entry is None:
+                self.coalesced += 1
+        if self.metrics is not None:
+            self.metrics.record_cache("results", int(not owner), int(owner))
+        if entry is not None:
+            return entry[2]
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            # waiters are released even when storing the result fails
+            try:
+                # sized outside the lock, figures can take a while
+                if (
+                    flight.error is None
+                    and flight.value is not None
+                    and (keep is None or keep(flight.value))
+                ):
+                    size = estimate_bytes(flight.value)
+                    with self._lock:
+                        self._store(key, flight.value, size)
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                flight.done.set()
+        return flight.value
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a valid result is stored for a key, without counting a
+        lookup
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry[0] <= self.ttl
+
+    def clear(self) -> None:
+        """Drops every stored result"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Summarises store usage
+        Returns:
+            Dict[str, float]: hits, coalesced waits, misses, evictions,
+                entries, bytes, the budget and the hit rate (hits and
+                coalesced waits over all lookups)
+        """
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": (
+                    (self.hits + self.coalesced) / lookups if lookups else 0.0
+                ),
+            }
+
+    def _store(self, key: Hashable, value: Any, size: int) -> None:
+        """Inserts a result, evicting the least recently used over budget"""
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time(), size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        self.bytes -= self._entries.pop(key)[1]
+
+
+_SHARED_STORE: Optional[ResultStore] = None
+_SHARED_STORE_LOCK = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """Returns the process-wide result store, reporting to the process-wide
+    instrumentation
+    Returns:
+        ResultStore: shared result store
+    """
+    global _SHARED_STORE
+    with _SHARED_STORE_LOCK:
+        if _SHARED_STORE is None:
+            _SHARED_STORE = ResultStore(metrics=get_instrumentation())
+        return _SHARED_STORE
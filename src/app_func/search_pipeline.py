@@ -0,0 +1,386 @@
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from app_func.budget import (
+    SECONDARY_STAGES,
+    BudgetPlan,
+    StageCostModel,
+    get_cost_model,
+    plan_search,
+)
+from app_func.clustering import PaperClusters
+from app_func.datapipeline import DataPipeline
+from app_func.instrumentation import Instrumentation, get_instrumentation
+from app_func.network_graph import Network
+from app_func.stage_graph import StageGraph
+from app_func.term_stats import TermStatistics
+from app_func.visualisation import Visualisation
+
+
+class SearchPipeline:
+    """Incremental search pipeline behind the app.
+    fetch -> clean -> dedup -> encode -> similarity -> layout -> network
+    graph, with the clusters of the encoded papers coloring the graph and
+    the word cloud and charts hanging off the deduplicated papers. Each stage only
+    reruns when one of its inputs changed, e.g. moving the links slider
+    re-selects the links and redraws the graph without querying or encoding
+    again, and the layout warm starts from the previous node positions.
+    Every stage that runs is measured, see `last_request`. A search given a
+    latency budget is planned with the measured costs of its stages and
+    degraded to fit, see `budget.plan_search`.
+    """
+
+    def __init__(
+        self,
+        connector: Optional[DataPipeline] = None,
+        metrics: Optional[Instrumentation] = None,
+        costs: Optional[StageCostModel] = None,
+    ) -> None:
+        """Instantiates the stage graph
+        Args:
+            connector (Optional[DataPipeline], optional): Data pipeline to use,
+                created on first search when None. Defaults to None.
+            metrics (Optional[Instrumentation], optional): Stage metrics, the
+                process-wide instrumentation when None. Defaults to None.
+            costs (Optional[StageCostModel], optional): Stage costs learned
+                from every search, the process-wide model when None.
+                Defaults to None.
+        """
+        self._connector = connector
+        self.metrics = metrics if metrics is not None else get_instrumentation()
+        self.costs = costs if costs is not None else get_cost_model()
+        self.last_request: Optional[Dict[str, Any]] = None
+        self._fetched: Optional[Tuple[str, int, pd.DataFrame]] = None
+        self.network = Network()
+        self.clusters = PaperClusters()
+        self.visualisation = Visualisation()
+        self.graph = StageGraph()
+        self._add_stage("fetch", self._fetch, params=["search_term", "num_searches"])
+        self._add_stage("clean", self._clean, inputs=["fetch"])
+        self._add_stage("dedup", self._dedup, inputs=["clean"])
+        self._add_stage("encode", self._encode, inputs=["dedup"], params=["num_papers"])
+        self._add_stage(
+            "similarity",
+            self._similarity,
+            inputs=["encode"],
+            params=["num_links", "backbone"],
+        )
+        self._add_stage(
+            "layout",
+            self._layout,
+            inputs=["encode", "similarity"],
+            params=["layout_iterations"],
+        )
+        self._add_stage(
+            "cluster", self._cluster, inputs=["encode"], params=["cluster_method"]
+        )
+        self._add_stage(
+            "network_graph",
+            self._network_graph,
+            inputs=["encode", "similarity", "layout", "cluster"],
+        )
+        self._add_stage("word_cloud", self.word_cloud, inputs=["dedup"])
+        self._add_stage(
+            "keywords", self._keywords, inputs=["dedup"], params=["search_term"]
+        )
+        self._add_stage(
+            "year_trend", self.visualisation.year_published, inputs=["dedup"]
+        )
+        self._add_stage(
+            "published_bar", self.visualisation.published_bar, inputs=["dedup"]
+        )
+
+    @property
+    def connector(self) -> DataPipeline:
+        """Data pipeline, loading the encoder on first use"""
+        if self._connector is None:
+            self._connector = DataPipeline()
+        return self._connector
+
+    def run(
+        self,
+        search_term: str,
+        num_searches: int,
+        num_papers: int,
+        num_links: int,
+        cluster_method: str = "kmeans",
+        backbone: str = "top",
+        budget: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Runs a search, reusing every stage whose inputs did not change
+        Args:
+            search_term (str): search term as defined by user
+            num_searches (int): number of arXiv results
+            num_papers (int): number of papers in the network graph
+            num_links (int): number of links in the network graph
+            cluster_method (str, optional): "kmeans" or "community".
+                                            Defaults to "kmeans".
+            backbone (str, optional): Links kept, see `backbone.BACKBONES`.
+                                      Defaults to "top".
+            budget (Optional[float], optional): Seconds the search should
+                take, fewer papers are encoded, the previous layout is reused
+                or the word cloud, keywords and charts are skipped to stay
+                within it. Not limited when None. Defaults to None.
+        Returns:
+            Optional[Dict[str, Any]]: "df", "edges", "layout", "clusters",
+                "network_graph", "word_cloud", "keywords", "year_trend" and
+                "published_bar", None for skipped stages, and "degraded",
+                what was given up to meet the budget. None when the search
+                found nothing. Papers are identified by their row in "df"
+        """
+        params = dict(
+            search_term=search_term,
+            num_searches=num_searches,
+            num_papers=num_papers,
+            num_links=num_links,
+            cluster_method=cluster_method,
+            backbone=backbone,
+            budget=budget,
+        )
+        return self._measured(self._run, params)
+
+    def data(
+        self,
+        search_term: str,
+        num_searches: int,
+        num_papers: int,
+        num_links: int,
+        cluster_method: str = "kmeans",
+        backbone: str = "top",
+    ) -> Optional[Dict[str, Any]]:
+        """Runs the stages behind the charts without drawing them, e.g. for
+        the JSON API
+        Args:
+            search_term (str): search term as defined by user
+            num_searches (int): number of arXiv results
+            num_papers (int): number of papers in the network graph
+            num_links (int): number of links in the network graph
+            cluster_method (str, optional): "kmeans" or "community".
+                                            Defaults to "kmeans".
+            backbone (str, optional): Links kept, see `backbone.BACKBONES`.
+                                      Defaults to "top".
+        Returns:
+            Optional[Dict[str, Any]]: "df", "edges", "layout", "clusters"
+                and "keywords", None when the search found nothing
+        """
+        params = dict(
+            search_term=search_term,
+            num_searches=num_searches,
+            num_papers=num_papers,
+            num_links=num_links,
+            cluster_method=cluster_method,
+            backbone=backbone,
+        )
+        return self._measured(self._run_data, params)
+
+    def run_partial(
+        self,
+        fetched: pd.DataFrame,
+        search_term: str,
+        num_papers: int,
+        num_links: int,
+        cluster_method: str = "kmeans",
+        backbone: str = "top",
+        budget: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Runs a search on the papers received so far, e.g. the first pages
+        of a progressive search, as if only that many results were asked for
+        Args:
+            fetched (pd.DataFrame): parsed entries received so far
+            search_term (str): search term as defined by user
+            num_papers (int): number of papers in the network graph
+            num_links (int): number of links in the network graph
+            cluster_method (str, optional): "kmeans" or "community".
+                                            Defaults to "kmeans".
+            backbone (str, optional): Links kept, see `backbone.BACKBONES`.
+                                      Defaults to "top".
+            budget (Optional[float], optional): Seconds the search should
+                take, see `run`. Defaults to None.
+        Returns:
+            Optional[Dict[str, Any]]: same as `run`
+        """
+        self._fetched = (search_term, len(fetched), fetched)
+        try:
+            return self.run(
+                search_term,
+                len(fetched),
+                num_papers,
+                num_links,
+                cluster_method,
+                backbone=backbone,
+                budget=budget,
+            )
+        finally:
+            self._fetched = None
+
+    def _measured(self, func: Callable, params: Dict[str, Any]):
+        """Runs func(params) as one measured request"""
+        with self.metrics.request(**params) as request:
+            self.last_request = request
+            try:
+                return func(params)
+            finally:
+                executed = {stage["stage"] for stage in request["stages"]}
+                request["reused"] = [
+                    name for name in self.graph.stages if name not in executed
+                ]
+                self.metrics.record_cache(
+                    "stages", len(request["reused"]), len(executed)
+                )
+                self.costs.observe(request)
+
+    def _run(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        start = time.perf_counter()
+        params = dict(params, layout_iterations=None)
+        if self.graph.run("clean", **params) is None:
+            return None
+
+        df = self.graph.run("dedup", **params)
+        plan = None
+        if params["budget"] is not None:
+            plan = self._plan(params, len(df), start)
+            params.update(
+                num_papers=plan.num_papers, layout_iterations=plan.layout_iterations
+            )
+        results = {
+            "df": df,
+            "edges": self.graph.run("similarity", **params),
+            "layout": self.graph.run("layout", **params),
+            "clusters": self.graph.run("cluster", **params),
+            "network_graph": self.graph.run("network_graph", **params),
+        }
+        # secondary stages run while the deadline allows, cached ones always
+        skipped = []
+        for name in SECONDARY_STAGES:
+            if plan is not None and not self.graph.cached(name, **params):
+                remaining = params["budget"] - (time.perf_counter() - start)
+                if plan.skip_secondary or self.costs.predict(name, len(df)) > remaining:
+                    skipped.append(name)
+                    results[name] = None
+                    continue
+            results[name] = self.graph.run(name, **params)
+        results["degraded"] = [] if plan is None else plan.notes(skipped)
+        return results
+
+    def _run_data(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        params = dict(params, layout_iterations=None)
+        if self.graph.run("clean", **params) is None:
+            return None
+        return {
+            name: self.graph.run(stage, **params)
+            for name, stage in [
+                ("df", "dedup"),
+                ("edges", "similarity"),
+                ("layout", "layout"),
+                ("clusters", "cluster"),
+                ("keywords", "keywords"),
+            ]
+        }
+
+    def _plan(self, params: Dict[str, Any], num_rows: int, start: float) -> BudgetPlan:
+        """Plans the stages after deduplication within what is left of the
+        budget, and records the plan with the request"""
+        remaining = params["budget"] - (time.perf_counter() - start)
+        plan = plan_search(
+            self.costs.predict,
+            remaining,
+            num_rows,
+            params["num_papers"],
+            cached=[
+                name for name in self.graph.stages if self.graph.cached(name, **params)
+            ],
+            layout_cached=bool(self.network.positions),
+        )
+        if self.last_request is not None:
+            self.last_request["budget"] = dict(
+                plan._asdict(),
+                remaining_seconds=remaining,
+                degraded_stages=plan.degraded_stages,
+            )
+        return plan
+
+    def _add_stage(
+        self,
+        name: str,
+        func: Callable,
+        inputs: Sequence[str] = (),
+        params: Sequence[str] = (),
+    ) -> None:
+        """Registers a measured stage"""
+        func = self.metrics.instrument(name, func, self._cache_counters)
+        self.graph.add_stage(name, func, inputs=inputs, params=params)
+
+    def _cache_counters(self) -> Dict[str, Tuple[int, int]]:
+        """Hits and misses of the query, embedding and term caches so far"""
+        counters = {}
+        if isinstance(self._connector, DataPipeline):
+            query_cache = self._connector.query_cache
+            counters["query"] = (
+                query_cache.memory_hits + query_cache.disk_hits,
+                query_cache.misses,
+            )
+            embedding_cache = self._connector.encoder.cache
+            if embedding_cache is not None:
+                counters["embedding"] = (embedding_cache.hits, embedding_cache.misses)
+        terms = getattr(self.visualisation, "terms", None)
+        if isinstance(terms, TermStatistics):
+            counters["terms"] = (terms.hits, terms.misses)
+        return counters
+
+    def _fetch(self, search_term: str, num_searches: int):
+        if self._fetched is not None and self._fetched[:2] == (
+            search_term,
+            num_searches,
+        ):
+            fetched = self._fetched[2]
+            return (False, None) if fetched.empty else (True, fetched)
+        return self.connector.query_arxiv(search_term, num_searches)
+
+    def _clean(self, fetched):
+        res, df = fetched
+        if res is False:
+            return None
+        return self.connector.preprocessing_pipeline(df)
+
+    def _dedup(self, df):
+        return self.connector.deduplicate(df)
+
+    def _encode(self, df, num_papers: int):
+        return self.connector.encode_papers(df, num_encodings=num_papers)
+
+    def _similarity(self, encoded, num_links: int, backbone: str):
+        _, embeddings = encoded
+        return self.connector.similarity_links(
+            embeddings, num_links=num_links, backbone=backbone
+        )
+
+    def _layout(self, encoded, edges, layout_iterations: Optional[int]):
+        df, _ = encoded
+        return self.network.compute_layout(
+            edges, keys=df["id"].to_numpy(), max_iterations=layout_iterations
+        )
+
+    def _cluster(self, encoded, cluster_method: str):
+        df, embeddings = encoded
+        return self.clusters.cluster(df, embeddings, method=cluster_method)
+
+    def _network_graph(self, encoded, edges, layout, clusters):
+        df, _ = encoded
+        return self.network.plot_networkgraph(
+            edges, df["title"].to_numpy(), layout=layout, clusters=clusters
+        )
+
+    def word_cloud(self, df):
+        """Word cloud of any set of papers, summed from cached term counts
+        Args:
+            df (pd.DataFrame): papers, e.g. one cluster
+        Returns:
+            go.Figure: Wordcloud figure
+        """
+        wordcloud_image = self.visualisation.generate_word_cloud(df)
+        return self.visualisation.display_word_cloud(wordcloud_image)
+
+    def _keywords(self, df, search_term: str):
+        return self.visualisation.terms.suggest_keywords(df, search_term)
@@ -1,17 +1,80 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer, util
+
+from app_func.embedding_cache import embedding_key, get_embedding_cache
+from app_func.encoder_backends import create_backend
+from app_func.similarity import top_k_edges
+
+# backend used when none is given, a key of encoder_backends.ENCODER_BACKENDS
+DEFAULT_BACKEND = os.environ.get("ARXIV_ENCODER_BACKEND", "torch")
+DEFAULT_PROCESSES = int(os.environ.get("ARXIV_ENCODER_PROCESSES", "1"))
+
+_SHARED_ENCODERS: Dict[Tuple, "SentenceEncoder"] = {}
+_SHARED_ENCODERS_LOCK = threading.Lock()
 
 
 class SentenceEncoder:
     """Sentence Encoder class"""
 
-    def __init__(self) -> None:
-        """Instantiates Sentence Encoder"""
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache_dir: Optional[str] = None,
+        max_cache_entries: int = 100_000,
+        model: Optional[object] = None,
+        backend: str = DEFAULT_BACKEND,
+        max_seq_length: Optional[int] = None,
+        processes: int = DEFAULT_PROCESSES,
+    ) -> None:
+        """Instantiates Sentence Encoder
+        Args:
+            model_name (str, optional): Sentence transformer model.
+                                        Defaults to "all-MiniLM-L6-v2".
+            cache_dir (Optional[str], optional): Directory of the persistent
+                embedding cache, caching is disabled when None. Defaults to None.
+            max_cache_entries (int, optional): Maximum number of papers kept in
+                                               the cache. Defaults to 100_000.
+            model (Optional[object], optional): Model with the
+                SentenceTransformer `encode` and
+                `get_sentence_embedding_dimension` methods, `model_name` is
+                loaded with `backend` when None. Defaults to None.
+            backend (str, optional): Inference backend, "torch", "torch-int8",
+                "onnx" or "onnx-int8". Defaults to DEFAULT_BACKEND.
+            max_seq_length (Optional[int], optional): Tokens kept per abstract,
+                the model's own limit when None. Defaults to None.
+            processes (int, optional): Encoding worker processes, 0 for one
+                per core. Defaults to DEFAULT_PROCESSES.
+        """
+        self.model_name = model_name
+        if model is None:
+            model = create_backend(
+                backend, model_name, processes, max_seq_length=max_seq_length
+            )
+        self.model = model
+        self.cache = None
+        if cache_dir is not None:
+            # int8 and truncated embeddings differ, they are cached apart
+            cache_name = (
+                model_name
+                if backend in ("torch", "onnx")
+                else f"{model_name}-{backend}"
+            )
+            if max_seq_length is not None:
+                cache_name = f"{cache_name}-seq{max_seq_length}"
+            self.cache = get_embedding_cache(
+                cache_dir,
+                cache_name,
+                self.model.get_sentence_embedding_dimension(),
+                max_cache_entries,
+            )
 
     def encode_sentences(self, df: pd.DataFrame, col="summary") -> np.ndarray:
         """Encodes sentences with embeddings
+            papers already in the embedding cache with the same text are
+            read from disk and only the cache misses are sent to the model
         Args:
             df (pd.DataFrame): Dataframe from API
             col (str, optional): Identifies the summary column. Defaults to "summary".
@@ -19,31 +82,74 @@ class SentenceEncoder:
             np.ndarray: Encoding
         """
         sentences = df[col].to_list()
-        embeddings = self.model.encode(sentences, batch_size=32)
+        if self.cache is None or "id" not in df:
+            return self.model.encode(sentences, batch_size=32)
+
+        keys = [
+            embedding_key(identifier, text, col)
+            for identifier, text in zip(df["id"], sentences)
+        ]
+        embeddings, hit_mask = self.cache.get(keys)
+        misses = np.flatnonzero(~hit_mask)
+        if len(misses) > 0:
+            new_embeddings = self.model.encode(
+                [sentences[i] for i in misses], batch_size=32
+            )
+            embeddings[misses] = new_embeddings
+            self.cache.put([keys[i] for i in misses], new_embeddings)
 
         return embeddings
 
     def pairwise_cosine_similarity(
-        self, embeddings: np.ndarray, titles: pd.Series
-    ) -> pd.DataFrame:
-        """Cosine Similarity matrix calculation
+        self, embeddings: np.ndarray, num_links: Optional[int] = None
+    ) -> np.ndarray:
+        """Cosine Similarity ranking of paper pairs
+            similarities are computed in row blocks and only the strongest
+            `num_links` pairs are kept, so the N x N matrix is never built
         Args:
             embeddings (np.ndarray): encoding
-            titles (pd.Series): titles
+            num_links (Optional[int], optional): Number of pairs to keep, all
+                                                 pairs when None. Defaults to None.
         Returns:
-            pd.DataFrame: pairwise summary of cosine data matrix
+            np.ndarray: edge array of EDGE_DTYPE between the rows of the
+                embeddings, sorted by descending weight
         """
-        cosine_scores = util.cos_sim(embeddings, embeddings)
-        title_mapping = dict(zip(range(len(titles)), titles))
-
-        cosine_dataframe = pd.DataFrame(cosine_scores)
-        cosine_dataframe = cosine_dataframe.reset_index(drop=True)
-        cosine_dataframe = cosine_dataframe.where(
-            ~np.tril(np.ones(cosine_dataframe.shape)).astype(np.bool)
-        )
+        num_papers = len(embeddings)
+        if num_links is None:
+            num_links = num_papers * (num_papers - 1) // 2
+        return top_k_edges(embeddings, num_links)
 
-        cosine_dataframe = cosine_dataframe.stack().reset_index()
-        cosine_dataframe.columns = ["From", "To", "Weights"]
-        cosine_dataframe = cosine_dataframe.replace(title_mapping)
 
-        return cosine_dataframe
+def get_sentence_encoder(
+    model_name: str = "all-MiniLM-L6-v2",
+    cache_dir: Optional[str] = None,
+    backend: str = DEFAULT_BACKEND,
+    max_seq_length: Optional[int] = None,
+    processes: int = DEFAULT_PROCESSES,
+) -> SentenceEncoder:
+    """Returns the process-wide encoder of a model, loading it on first use,
+    so every session and pipeline shares one loaded model
+    Args:
+        model_name (str, optional): Sentence transformer model.
+                                    Defaults to "all-MiniLM-L6-v2".
+        cache_dir (Optional[str], optional): Directory of the persistent
+            embedding cache, caching is disabled when None. Defaults to None.
+        backend (str, optional): Inference backend. Defaults to DEFAULT_BACKEND.
+        max_seq_length (Optional[int], optional): Tokens kept per abstract,
+            the model's own limit when None. Defaults to None.
+        processes (int, optional): Encoding worker processes.
+                                   Defaults to DEFAULT_PROCESSES.
+    Returns:
+        SentenceEncoder: shared encoder
+    """
+    key = (model_name, cache_dir, backend, max_seq_length, processes)
+    with _SHARED_ENCODERS_LOCK:
+        if key not in _SHARED_ENCODERS:
+            _SHARED_ENCODERS[key] = SentenceEncoder(
+                model_name,
+                cache_dir=cache_dir,
+                backend=backend,
+                max_seq_length=max_seq_length,
+                processes=processes,
+            )
+        return _SHARED_ENCODERS[key]
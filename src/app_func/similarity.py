@@ -0,0 +1,184 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app_func.quantization import QuantizedEmbeddings, Vectors, pairwise_scores
+
+EDGE_DTYPE = np.dtype([("src", np.int32), ("dst", np.int32), ("weight", np.float32)])
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Scales embeddings to unit length so dot products are cosine scores
+    Args:
+        embeddings (np.ndarray): (N, dim) embeddings
+    Returns:
+        np.ndarray: (N, dim) float32 unit vectors
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def unit_vectors(embeddings: Vectors, normalized: bool = False) -> Vectors:
+    """Unit length embeddings, quantized embeddings are unit length already
+    Args:
+        embeddings (Vectors): (N, dim) embeddings, plain or quantized
+        normalized (bool, optional): plain embeddings already have unit
+                                     length. Defaults to False.
+    Returns:
+        Vectors: unit vectors
+    """
+    if normalized or isinstance(embeddings, QuantizedEmbeddings):
+        return embeddings
+    return normalize_embeddings(embeddings)
+
+
+def block_rows(num_rows: int, num_cols: int, max_block_bytes: int) -> int:
+    """Number of rows per block so a float32 block fits the byte budget
+    Args:
+        num_rows (int): rows of the full similarity matrix
+        num_cols (int): columns of the full similarity matrix
+        max_block_bytes (int): memory budget of one block
+    Returns:
+        int: rows per block
+    """
+    return int(max(1, min(num_rows, max_block_bytes // (4 * max(num_cols, 1)))))
+
+
+def sort_edges(edges: np.ndarray) -> np.ndarray:
+    """Sorts edges by descending weight, ties broken by (src, dst)
+    Args:
+        edges (np.ndarray): edge array of EDGE_DTYPE
+    Returns:
+        np.ndarray: sorted edge array
+    """
+    order = np.lexsort((edges["dst"], edges["src"], -edges["weight"]))
+    return edges[order]
+
+
+def top_k_edges(
+    embeddings: Vectors,
+    k: int,
+    max_block_bytes: int = 64 * 1024 * 1024,
+    normalized: bool = False,
+) -> np.ndarray:
+    """Finds the k most similar pairs of papers without materialising the
+        full N x N matrix. Similarities are computed one row block at a time
+        against the papers that follow the block, so every pair is visited
+        once, and the running best k are kept with argpartition.
+    Args:
+        embeddings (Vectors): (N, dim) embeddings, quantized embeddings are
+                              scored in their compact form
+        k (int): number of edges to keep
+        max_block_bytes (int, optional): memory budget of one similarity
+                                         block. Defaults to 64 MiB.
+        normalized (bool, optional): embeddings already have unit length.
+                                     Defaults to False.
+    Returns:
+        np.ndarray: edge array of EDGE_DTYPE with src < dst, sorted by
+            descending weight
+    """
+    vectors = unit_vectors(embeddings, normalized)
+    num_papers = len(vectors)
+    best = np.empty(0, dtype=EDGE_DTYPE)
+    if num_papers < 2 or k <= 0:
+        return best
+
+    step = block_rows(num_papers, num_papers, max_block_bytes)
+    for start in range(0, num_papers - 1, step):
+        stop = min(start + step, num_papers)
+        scores = pairwise_scores(vectors[start:stop], vectors[start:])
+        lower = np.arange(scores.shape[1]) <= np.arange(stop - start)[:, None]
+        scores[lower] = -np.inf
+        flat = scores.ravel()
+
+        threshold = best["weight"].min() if len(best) == k else -np.inf
+        num_pairs = flat.size - int(lower.sum())
+        if num_pairs > k:
+            kth = np.partition(flat, flat.size - k)[flat.size - k]
+            threshold = max(threshold, kth)
+        candidate_idx = np.flatnonzero(flat >= threshold)
+        candidate_idx = candidate_idx[np.isfinite(flat[candidate_idx])]
+
+        candidates = np.empty(len(candidate_idx), dtype=EDGE_DTYPE)
+        candidates["src"] = candidate_idx // scores.shape[1] + start
+        candidates["dst"] = candidate_idx % scores.shape[1] + start
+        candidates["weight"] = flat[candidate_idx]
+        best = np.concatenate([best, candidates])
+        if len(best) > k:
+            best = best[np.argpartition(-best["weight"], k - 1)[:k]]
+
+    return sort_edges(best)
+
+
+def top_k_neighbours(
+    embeddings: Vectors,
+    k: int,
+    max_block_bytes: int = 64 * 1024 * 1024,
+    normalized: bool = False,
+    corpus: Optional[Vectors] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds the k most similar papers of every paper, block by block
+    Args:
+        embeddings (Vectors): (N, dim) embeddings, plain or quantized
+        k (int): neighbours per paper, capped at N - 1
+        max_block_bytes (int, optional): memory budget of one similarity
+                                         block. Defaults to 64 MiB.
+        normalized (bool, optional): embeddings, and `corpus` if given,
+                                     already have unit length. Defaults to False.
+        corpus (Optional[Vectors], optional): (M, dim) vectors to search
+            instead of the embeddings themselves, k is then capped at M and
+            no self match is excluded. Defaults to None.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (N, k) neighbour indices and weights,
+            each row sorted by descending weight
+    """
+    vectors = unit_vectors(embeddings, normalized)
+    num_papers = len(vectors)
+    if corpus is None:
+        targets = vectors
+        k = min(k, num_papers - 1)
+    else:
+        targets = unit_vectors(corpus, normalized)
+        k = min(k, len(targets))
+    indices = np.empty((num_papers, max(k, 0)), dtype=np.int32)
+    weights = np.empty((num_papers, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, weights
+
+    step = block_rows(num_papers, len(targets), max_block_bytes)
+    for start in range(0, num_papers, step):
+        stop = min(start + step, num_papers)
+        scores = pairwise_scores(vectors[start:stop], targets)
+        if corpus is None:
+            scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        indices[start:stop] = np.take_along_axis(top, order, axis=1)
+        weights[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    return indices, weights
+
+
+def knn_edges(indices: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Turns per-paper neighbour lists into an undirected edge array
+    Args:
+        indices (np.ndarray): (N, k) neighbour indices, negative indices
+                              and self matches are ignored
+        weights (np.ndarray): (N, k) neighbour weights
+    Returns:
+        np.ndarray: deduplicated edge array of EDGE_DTYPE with src < dst,
+            sorted by descending weight
+    """
+    src = np.repeat(np.arange(len(indices), dtype=np.int32), indices.shape[1])
+    dst = indices.ravel()
+    valid = (dst >= 0) & (dst != src)
+    src, dst = src[valid], dst[valid]
+    edges = np.empty(len(src), dtype=EDGE_DTYPE)
+    edges["src"] = np.minimum(src, dst)
+    edges["dst"] = np.maximum(src, dst)
+    edges["weight"] = weights.ravel()[valid]
+    pair_keys = edges["src"].astype(np.int64) * len(indices) + edges["dst"]
+    _, first = np.unique(pair_keys, return_index=True)
+    return sort_edges(edges[first])
@@ -0,0 +1,109 @@
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+
+class StageGraph:
+    """Memoized graph of pipeline stages.
+    Every stage declares the upstream stages and the parameters it depends
+    on. Its cache key is built from its own parameter values and the keys
+    of its upstream stages, so a stage reruns only when one of its
+    parameters or anything upstream of it changed. The latest result of
+    every stage is kept.
+    """
+
+    def __init__(self) -> None:
+        """Instantiates an empty graph"""
+        self._stages: Dict[str, Tuple[Callable, Sequence[str], Sequence[str]]] = {}
+        self._results: Dict[str, Tuple[Hashable, Any]] = {}
+        self.executed: List[str] = []
+
+    @property
+    def stages(self) -> List[str]:
+        """Names of the registered stages"""
+        return list(self._stages)
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable,
+        inputs: Sequence[str] = (),
+        params: Sequence[str] = (),
+    ) -> None:
+        """Registers a stage
+        Args:
+            name (str): stage name
+            func (Callable): called with the results of `inputs` as positional
+                             arguments and `params` as keyword arguments
+            inputs (Sequence[str], optional): upstream stages. Defaults to ().
+            params (Sequence[str], optional): parameter names. Defaults to ().
+        """
+        self._stages[name] = (func, tuple(inputs), tuple(params))
+
+    def run(self, name: str, **params) -> Any:
+        """Returns the result of a stage, rerunning only what changed
+        Args:
+            name (str): stage name
+            **params: parameter values, stages pick the ones they declared
+        Returns:
+            Any: result of the stage
+        """
+        self.executed = []
+        return self._resolve(name, params)[1]
+
+    def key(self, name: str, **params) -> Hashable:
+        """Cache key a stage would have for the given parameters
+        Args:
+            name (str): stage name
+            **params: parameter values
+        Returns:
+            Hashable: nested tuple of the stage name, its parameter values
+                and the keys of its upstream stages
+        """
+        _, inputs, stage_params = self._stages[name]
+        return (
+            name,
+            tuple(params[param] for param in stage_params),
+            tuple(self.key(upstream, **params) for upstream in inputs),
+        )
+
+    def cached(self, name: str, **params) -> bool:
+        """Whether a stage would be reused for the given parameters
+        Args:
+            name (str): stage name
+            **params: parameter values
+        Returns:
+            bool: True when its latest result has the same key
+        """
+        cached = self._results.get(name)
+        return cached is not None and cached[0] == self.key(name, **params)
+
+    def invalidate(self, name: str = None) -> None:
+        """Drops cached results
+        Args:
+            name (str, optional): stage to drop, every stage when None.
+                                  Defaults to None.
+        """
+        if name is None:
+            self._results.clear()
+        else:
+            self._results.pop(name, None)
+
+    def _resolve(self, name: str, params: Dict[str, Any]) -> Tuple[Hashable, Any]:
+        """Computes a stage after its upstream stages"""
+        func, inputs, stage_params = self._stages[name]
+        upstream = [self._resolve(upstream, params) for upstream in inputs]
+        key = (
+            name,
+            tuple(params[param] for param in stage_params),
+            tuple(upstream_key for upstream_key, _ in upstream),
+        )
+        cached = self._results.get(name)
+        if cached is not None and cached[0] == key:
+            return cached
+
+        result = func(
+            *(value for _, value in upstream),
+            **{param: params[param] for param in stage_params},
+        )
+        self._results[name] = (key, result)
+        self.executed.append(name)
+        return key, result
@@ -0,0 +1,160 @@
+"""Process start-up: background warm-up and the import budget.
+
+Importing the app only loads the light modules. The encoder model, torch
+and the chart libraries are loaded by `warm_up`, in a background thread at
+server start, so the first page renders without waiting for them and the
+first search finds them ready. The import budget check runs the app import
+in a fresh interpreter and fails when it takes too long or pulls in one of
+the heavy modules:
+
+    python -m app_func.startup --budget 1.5
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from app_func.datapipeline import DataPipeline
+
+logger = logging.getLogger(__name__)
+
+# modules that must only be loaded on first use
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "sklearn",
+    "networkx",
+    "wordcloud",
+    "matplotlib",
+    "plotly.express",
+]
+APP_MODULES = ("app_func.search_pipeline", "app_func.result_store", "app_func.api")
+# chart libraries loaded by the warm-up
+WARM_UP_MODULES = ("plotly.express", "wordcloud")
+DEFAULT_IMPORT_BUDGET = float(os.environ.get("ARXIV_IMPORT_BUDGET", "1.5"))
+DEFAULT_WARM_UP = os.environ.get("ARXIV_WARM_UP", "1") != "0"
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+_WARM_UP: Optional[threading.Thread] = None
+_WARM_UP_LOCK = threading.Lock()
+
+
+def warm_up(background: bool = True) -> threading.Thread:
+    """Loads the shared encoder and the chart libraries ahead of the first
+    search, once per process
+    Args:
+        background (bool, optional): Return while loading, otherwise wait
+                                     for it. Defaults to True.
+    Returns:
+        threading.Thread: warm-up thread
+    """
+    global _WARM_UP
+    with _WARM_UP_LOCK:
+        if _WARM_UP is None:
+            _WARM_UP = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+            _WARM_UP.start()
+    if not background:
+        _WARM_UP.join()
+    return _WARM_UP
+
+
+def _warm_up() -> None:
+    start = time.perf_counter()
+    try:
+        for module in WARM_UP_MODULES:
+            importlib.import_module(module)
+
+        # the first call also initializes the inference kernels
+        DataPipeline().encoder.model.encode(["warm up"], batch_size=1)
+    except Exception:
+        logger.exception("Warm-up failed, models load on the first search")
+        return
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+
+
+def import_report(modules: Sequence[str] = APP_MODULES) -> Dict[str, Any]:
+    """Measures the import of the app in a fresh interpreter
+    Args:
+        modules (Sequence[str], optional): modules imported.
+                                           Defaults to APP_MODULES.
+    Returns:
+        Dict[str, Any]: "seconds" of the import and the "heavy_modules" it
+            loaded
+    """
+    source_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [source_dir, env.get("PYTHONPATH")])
+    )
+    script = _IMPORT_SCRIPT.format(modules=list(modules), heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check_startup(
+    report: Dict[str, Any], budget: float = DEFAULT_IMPORT_BUDGET
+) -> List[str]:
+    """Checks an import report against the start-up budget
+    Args:
+        report (Dict[str, Any]): output of import_report
+        budget (float, optional): Seconds the import may take.
+                                  Defaults to DEFAULT_IMPORT_BUDGET.
+    Returns:
+        List[str]: one message per violation, empty when within budget
+    """
+    messages = []
+    if report["seconds"] > budget:
+        messages.append(
+            f"importing the app took {report['seconds']:.2f}s, budget {budget:.2f}s"
+        )
+    for module in report["heavy_modules"]:
+        messages.append(f"importing the app loads {module}, import it on first use")
+    return messages
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command line entry point for the import budget check"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--budget", type=float, default=DEFAULT_IMPORT_BUDGET)
+    parser.add_argument("--warm-up", action="store_true", help="also time warm-up")
+    args = parser.parse_args(argv)
+
+    report = import_report()
+    print(f"Import: {report['seconds']:.3f}s")
+    if args.warm_up:
+        start = time.perf_counter()
+        warm_up(background=False)
+        print(f"Warm-up: {time.perf_counter() - start:.3f}s")
+    messages = check_startup(report, args.budget)
+    for message in messages:
+        print(f"FAIL {message}")
+    return 1 if messages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
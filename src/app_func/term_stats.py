@@ -0,0 +1,249 @@
+import functools
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+TOKEN_PATTERN = r"[a-z#&]+"
+
+_SHARED_STATISTICS: Dict[str, "TermStatistics"] = {}
+_SHARED_STATISTICS_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def wordcloud_stopwords() -> FrozenSet[str]:
+    """WordCloud's STOPWORDS, read from the package data without importing
+    wordcloud, which loads matplotlib
+    Returns:
+        FrozenSet[str]: stopwords
+    """
+    package = importlib.util.find_spec("wordcloud").submodule_search_locations[0]
+    with open(os.path.join(package, "stopwords"), encoding="utf-8") as file:
+        return frozenset(word.strip() for word in file if word.strip())
+
+
+class TermStatistics:
+    """Term counts of papers, tokenized once per paper.
+    Every paper's text is tokenized the first time it is seen and its term
+    counts are kept as a sparse (term ids, counts) pair keyed by arXiv id.
+    Frequencies of any set of papers (a search result, its first N papers,
+    one cluster) are then a sum of those sparse counts instead of a new
+    pass over the text. Tokens are lower-cased, stopwords and words shorter
+    than `min_word_length` dropped, and plurals folded into their singular
+    the way WordCloud does.
+    """
+
+    def __init__(
+        self,
+        col: str = "summary",
+        min_word_length: int = 4,
+        stopwords: Optional[Iterable[str]] = None,
+        max_papers: int = 200_000,
+    ) -> None:
+        """Instantiates an empty term table
+        Args:
+            col (str, optional): Text column to count. Defaults to "summary".
+            min_word_length (int, optional): Shortest term kept. Defaults to 4.
+            stopwords (Optional[Iterable[str]], optional): Terms dropped,
+                WordCloud's STOPWORDS when None. Defaults to None.
+            max_papers (int, optional): Papers kept, least recently used ones
+                                        are dropped first. Defaults to 200_000.
+        """
+        self.col = col
+        self.min_word_length = min_word_length
+        self.stopwords = set(wordcloud_stopwords() if stopwords is None else stopwords)
+        self.max_papers = max_papers
+        self.vocabulary: List[str] = []
+        self._term_ids: Dict[str, int] = {}
+        self._papers: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._document_frequency = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.tokenized = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._papers)
+
+    def frequencies(
+        self, df: pd.DataFrame, max_words: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Term frequencies summed over papers
+        Args:
+            df (pd.DataFrame): papers with "id" and the text column
+            max_words (Optional[int], optional): Most frequent terms to keep,
+                                                 all when None. Defaults to None.
+        Returns:
+            Dict[str, int]: term -> count, most frequent first
+        """
+        totals = self._totals(df)
+        nonzero = np.flatnonzero(totals)
+        counts = dict(zip((self.vocabulary[i] for i in nonzero), totals[nonzero]))
+        for term in [t for t in counts if t.endswith("s") and not t.endswith("ss")]:
+            if term[:-1] in counts:
+                counts[term[:-1]] += counts.pop(term)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return {term: int(count) for term, count in ranked[:max_words]}
+
+    def cluster_terms(
+        self, df: pd.DataFrame, clusters: np.ndarray, num_terms: int = 3
+    ) -> Dict[int, List[str]]:
+        """Top terms of every cluster by class-based TF-IDF: terms frequent in
+        the cluster but rare in the other clusters
+        Args:
+            df (pd.DataFrame): papers with "id" and the text column
+            clusters (np.ndarray): cluster of every paper
+            num_terms (int, optional): terms per cluster. Defaults to 3.
+        Returns:
+            Dict[int, List[str]]: top terms of every cluster
+        """
+        papers = self._lookup(df)
+        cluster_values, cluster_codes = np.unique(clusters, return_inverse=True)
+        terms: Dict[int, List[str]] = {int(c): [] for c in cluster_values}
+        lengths = np.array([len(ids) for ids, _ in papers], dtype=np.int64)
+        if lengths.sum() == 0:
+            return terms
+
+        term_ids = np.concatenate([ids for ids, _ in papers])
+        counts = np.concatenate([c for _, c in papers])
+        columns, term_codes = np.unique(term_ids, return_inverse=True)
+        rows = np.repeat(cluster_codes, lengths)
+        matrix = np.bincount(
+            rows * len(columns) + term_codes,
+            counts,
+            minlength=len(cluster_values) * len(columns),
+        ).reshape(len(cluster_values), len(columns))
+        frequency = matrix / np.maximum(matrix.sum(axis=1, keepdims=True), 1)
+        average = matrix.sum() / len(cluster_values)
+        scores = frequency * np.log1p(average / np.maximum(matrix.sum(axis=0), 1))
+        for cluster, row in zip(cluster_values, scores):
+            top = np.argsort(-row, kind="stable")[:num_terms]
+            terms[int(cluster)] = [self.vocabulary[columns[i]] for i in top if row[i]]
+        return terms
+
+    def suggest_keywords(
+        self, df: pd.DataFrame, search_term: str = "", num_keywords: int = 10
+    ) -> List[str]:
+        """Terms that characterise a set of papers against every paper seen
+        so far, by TF-IDF, leaving out the terms of the search itself
+        Args:
+            df (pd.DataFrame): papers with "id" and the text column
+            search_term (str, optional): search to leave out. Defaults to "".
+            num_keywords (int, optional): keywords returned. Defaults to 10.
+        Returns:
+            List[str]: keywords, best first
+        """
+        totals = self._totals(df).astype(np.float64)
+        with self._lock:
+            idf = np.log1p(len(self._papers) / np.maximum(self._document_frequency, 1))
+        scores = totals * idf[: len(totals)]
+        for term in self.tokenize(search_term):
+            for variant in (term, term.rstrip("s"), term + "s"):
+                if variant in self._term_ids:
+                    scores[self._term_ids[variant]] = 0.0
+        top = np.argsort(-scores, kind="stable")[:num_keywords]
+        return [self.vocabulary[i] for i in top if scores[i] > 0]
+
+    def tokenize(self, text: str) -> List[str]:
+        """Terms of a text after the case, stopword and length filters
+        Args:
+            text (str): text to tokenize
+        Returns:
+            List[str]: terms in order of appearance
+        """
+        tokens = pd.Series([text], dtype=object).str.lower().str.findall(TOKEN_PATTERN)
+        return [t for t in tokens[0] if self._keep(t)]
+
+    def _keep(self, token: str) -> bool:
+        return len(token) >= self.min_word_length and token not in self.stopwords
+
+    def _totals(self, df: pd.DataFrame) -> np.ndarray:
+        """Summed counts of the papers over the whole vocabulary"""
+        papers = self._lookup(df)
+        size = len(self.vocabulary)
+        if not papers:
+            return np.zeros(size, dtype=np.int64)
+        return np.bincount(
+            np.concatenate([ids for ids, _ in papers]),
+            np.concatenate([counts for _, counts in papers]),
+            minlength=size,
+        ).astype(np.int64)
+
+    def _lookup(self, df: pd.DataFrame) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Sparse counts of every paper of df, tokenizing unseen papers"""
+        ids = df["id"].astype(str).to_numpy()
+        with self._lock:
+            missing = {}
+            for i, key in enumerate(ids):
+                if key not in self._papers:
+                    missing.setdefault(key, i)
+            missing = list(missing.values())
+            self.misses += len(missing)
+            self.hits += len(ids) - len(missing)
+            if missing:
+                self._add(ids[missing], df[self.col].to_numpy()[missing])
+            papers = []
+            for key in ids:
+                self._papers.move_to_end(key)
+                papers.append(self._papers[key])
+            while len(self._papers) > max(self.max_papers, len(ids)):
+                term_ids, _ = self._papers.popitem(last=False)[1]
+                self._document_frequency[term_ids] -= 1
+        return papers
+
+    def _add(self, ids: Sequence[str], texts: Sequence[str]) -> None:
+        """Tokenizes papers in one vectorized pass and stores their counts"""
+        tokens = (
+            pd.Series(texts, dtype=object)
+            .fillna("")
+            .str.lower()
+            .str.findall(TOKEN_PATTERN)
+            .explode()
+            .dropna()
+        )
+        tokens = tokens[
+            (tokens.str.len() >= self.min_word_length) & ~tokens.isin(self.stopwords)
+        ]
+        new_terms = pd.unique(tokens[~tokens.isin(self._term_ids.keys())])
+        for term in new_terms:
+            self._term_ids[term] = len(self.vocabulary)
+            self.vocabulary.append(term)
+        if len(self._document_frequency) < len(self.vocabulary):
+            self._document_frequency = np.concatenate(
+                [
+                    self._document_frequency,
+                    np.zeros(
+                        len(self.vocabulary) - len(self._document_frequency),
+                        dtype=np.int64,
+                    ),
+                ]
+            )
+
+        size = len(self.vocabulary)
+        paper = tokens.index.to_numpy(dtype=np.int64)
+        term = tokens.map(self._term_ids).to_numpy(dtype=np.int64)
+        keys, counts = np.unique(paper * size + term, return_counts=True)
+        key_papers, key_terms = keys // size, keys % size
+        bounds = np.searchsorted(key_papers, np.arange(len(ids) + 1))
+        for i, key in enumerate(ids):
+            term_ids = key_terms[bounds[i] : bounds[i + 1]].astype(np.int32)
+            self._papers[key] = (term_ids, counts[bounds[i] : bounds[i + 1]])
+        np.add.at(self._document_frequency, key_terms, 1)
+        self.tokenized += len(ids)
+
+
+def get_term_statistics(col: str = "summary") -> TermStatistics:
+    """Returns the process-wide term statistics of a text column
+    Args:
+        col (str, optional): Text column to count. Defaults to "summary".
+    Returns:
+        TermStatistics: shared term statistics
+    """
+    with _SHARED_STATISTICS_LOCK:
+        if col not in _SHARED_STATISTICS:
+            _SHARED_STATISTICS[col] = TermStatistics(col)
+        return _SHARED_STATISTICS[col]
@@ -0,0 +1,19 @@
+import re
+from typing import Tuple
+
+ARXIV_ID_PATTERN = re.compile(
+    r"^(?:https?://arxiv\.org/abs/)?(?P<id>.+?)(?:v(?P<version>\d+))?$"
+)
+
+
+def parse_arxiv_id(identifier: str) -> Tuple[str, int]:
+    """Splits an arXiv identifier into its base id and version
+    Args:
+        identifier (str): arXiv id or abstract url, e.g.
+                          "http://arxiv.org/abs/2101.00001v2"
+    Returns:
+        Tuple[str, int]: base id and version, version is 0 when absent
+    """
+    match = ARXIV_ID_PATTERN.match(identifier.strip())
+    version = match.group("version")
+    return match.group("id"), int(version) if version else 0
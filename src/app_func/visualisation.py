@@ -1,16 +1,28 @@
-from wordcloud import WordCloud, STOPWORDS
-import re
 import numpy as np
 import pandas as pd
-import plotly.express as px
 from plotly import graph_objects as go
+from typing import Any, Dict, Optional
+
+from app_func.figures import DEFAULT_LEAN_FIGURES, png_source
+from app_func.paper_table import publication_years, word_counts
+from app_func.term_stats import TermStatistics, get_term_statistics
 
 
 class Visualisation:
     """Visualization graphs"""
 
-    def __init__(self):
-        pass
+    def __init__(
+        self, terms: Optional[TermStatistics] = None, lean: bool = DEFAULT_LEAN_FIGURES
+    ):
+        """Instantiates the charts
+        Args:
+            terms (Optional[TermStatistics], optional): Term counts behind the
+                word cloud, the shared summary counts when None.
+            lean (bool, optional): Sends images as compressed PNG instead of
+                pixel arrays. Defaults to DEFAULT_LEAN_FIGURES.
+        """
+        self.terms = terms if terms is not None else get_term_statistics()
+        self.lean = lean
 
     def published_bar(self, dataframe: pd.DataFrame) -> go.Figure:
         """Bar chart to show published vs non published
@@ -33,6 +45,8 @@ class Visualisation:
         percentage = [num_notpublished_percentage, num_published_percentage]
 
         # execute the plot
+        import plotly.express as px
+
         fig = px.bar(
             x=x,
             y=count,
@@ -52,23 +66,12 @@ class Visualisation:
         Returns:
             go.Figure: Histogram figure
         """
-        string_len = []
-
-        for string in dataframe["title"]:
-            num_words = len(re.findall(r"\w+", string))
-            string_len.append(num_words)
-
-        dataframe["num_words_title"] = string_len
-
-        fig = px.histogram(
+        return self._word_histogram(
             dataframe,
-            x="num_words_title",
-            nbins=40,
-            title="Distribution of the number of words in the title",
+            "title",
+            "Distribution of the number of words in the title",
         )
 
-        return fig
-
     def num_words_summary(self, dataframe: pd.DataFrame) -> go.Figure:
         """Number of words in 'Summary' histogram
         Args:
@@ -76,20 +79,26 @@ class Visualisation:
         Returns:
             go.Figure: Histogram figure
         """
-        string_len = []
-
-        for string in dataframe["summary"]:
-            num_words = len(re.findall(r"\w+", string))
-            string_len.append(num_words)
-
-        dataframe["num_words_summary"] = string_len
-
-        fig = px.histogram(
+        return self._word_histogram(
             dataframe,
-            x="num_words_summary",
-            nbins=40,
-            title="Distribution of the number of words in the summary",
+            "summary",
+            "Distribution of the number of words in the summary",
+        )
+
+    def _word_histogram(
+        self, dataframe: pd.DataFrame, col: str, title: str
+    ) -> go.Figure:
+        """Histogram of the word counts of a text column, read from the
+        column derived in preprocessing when present"""
+        name = f"num_words_{col}"
+        counts = (
+            dataframe[name].to_numpy()
+            if name in dataframe
+            else word_counts(dataframe[col])
         )
+        import plotly.express as px
+
+        fig = px.histogram(x=counts, nbins=40, title=title, labels={"x": name})
 
         return fig
 
@@ -100,14 +109,20 @@ class Visualisation:
         Returns:
             go.Figure: barplot of year published
         """
-        dataframe["year_published"] = dataframe["published"].apply(lambda x: int(x[:4]))
-
+        years = (
+            dataframe["year_published"].to_numpy()
+            if "year_published" in dataframe
+            else publication_years(dataframe["published"])
+        )
         df_grouped = (
-            dataframe.groupby(dataframe["year_published"])["title"]
-            .count()
+            pd.Series(years, name="year_published")
+            .value_counts()
+            .sort_index()
             .rename("Count")
             .to_frame()
         )
+        import plotly.express as px
+
         fig = px.bar(
             df_grouped,
             text_auto=".1d",
@@ -129,20 +144,20 @@ class Visualisation:
         Returns:
             np.ndarray: numpy array of word cloud words
         """
-        text = " ".join(i for i in dataframe["summary"])
+        frequencies = self.terms.frequencies(dataframe, max_words=50)
+        if not frequencies:
+            return np.full((500, 500, 3), 249, dtype=np.uint8)
+
+        # imported here, wordcloud loads matplotlib
+        from wordcloud import WordCloud
 
-        stopwords = set(STOPWORDS)
         wordcloud = WordCloud(
-            stopwords=stopwords,
             width=500,
             height=500,
             background_color="#F9F9FA",
             colormap="tab10",
-            collocations=False,
-            regexp=r"[a-zA-z#&]+",
             max_words=50,
-            min_word_length=4,
-        ).generate(text)
+        ).generate_from_frequencies(frequencies)
 
         wordcloud_image = wordcloud.to_array()
 
@@ -153,10 +168,13 @@ class Visualisation:
         Args:
             wordcloud_image (np.ndarray): dataframe from API call
         Returns:
-            go.Figure: Wordcloud figure
+            go.Figure: Wordcloud figure, a PNG image in lean mode
         """
         fig = go.Figure()
-        fig.add_trace(go.Image(z=wordcloud_image))
+        if self.lean:
+            fig.add_trace(go.Image(source=png_source(wordcloud_image)))
+        else:
+            fig.add_trace(go.Image(z=wordcloud_image))
         fig.update_layout(
             height=800,
             xaxis={"visible": False},
@@ -169,3 +187,50 @@ class Visualisation:
         )
 
         return fig
+
+    def stage_waterfall(self, request: Dict[str, Any]) -> go.Figure:
+        """Waterfall of the stages of a request
+        Args:
+            request (Dict[str, Any]): request record of Instrumentation
+        Returns:
+            go.Figure: one bar per stage, from its start to its end
+        """
+        stages = request["stages"]
+        hover = []
+        for stage in stages:
+            lines = [
+                f"<b>{stage['stage']}</b>",
+                f"wall {stage['seconds'] * 1000:.1f} ms",
+                f"cpu {stage['cpu_seconds'] * 1000:.1f} ms",
+                f"RSS {stage['rss_delta_bytes'] / 2**20:+.1f} MB",
+                f"process peak RSS {stage['peak_rss_bytes'] / 2**20:.0f} MB",
+            ]
+            lines += [f"{key} {value}" for key, value in stage["sizes"].items()]
+            lines += [
+                f"{cache} cache hit rate {lookups['hit_rate']:.0%}"
+                for cache, lookups in stage["caches"].items()
+            ]
+            hover.append("<br>".join(lines))
+
+        fig = go.Figure(
+            go.Bar(
+                x=[stage["seconds"] for stage in stages],
+                base=[stage["offset"] for stage in stages],
+                y=[stage["stage"] for stage in stages],
+                orientation="h",
+                hovertext=hover,
+                hoverinfo="text",
+            )
+        )
+        reused = ", ".join(request.get("reused", [])) or "none"
+        fig.update_layout(
+            title=dict(
+                text=f"{request['seconds']:.2f} s in total, reused: {reused}",
+                font=dict(size=14),
+            ),
+            xaxis_title="Seconds since the request started",
+            yaxis=dict(autorange="reversed"),
+            height=120 + 30 * len(stages),
+            margin=dict(t=40, b=40, l=5, r=5),
+        )
+        return fig
@@ -1,6 +1,6 @@
 """ main.py is the main page for app.  It provides the text input with button 
     for user to enter query string.  4 plotly components are generated
-    1) Network graph show similarity of articles
+    1) Network graph show similarity of articles, colored by cluster
     2) Word Cloud
     3) Trend of paper published over the years and 
     4) No. of published and non-published papers
@@ -10,64 +10,173 @@ import time
 import streamlit as st
 from streamlit_plotly_events import plotly_events
 
-from app_func.datapipeline import DataPipeline
-from app_func.visualisation import Visualisation
-from app_func.network_graph import Network
+from app_func.backbone import BACKBONES, MAX_DEGREE
+from app_func.budget import DEFAULT_LATENCY_BUDGET
+from app_func.figures import figure_key, get_figure_cache
+from app_func.progressive import ProgressiveSearch, run_search
+from app_func.result_store import get_result_store
+from app_func.search_pipeline import SearchPipeline
+from app_func.startup import DEFAULT_WARM_UP, warm_up
+
+# seconds between two refreshes of the page while a search is loading
+POLL_SECONDS = 0.5
+
+# loads the shared model in the background once per server process
+if DEFAULT_WARM_UP:
+    warm_up()
 
 
 def do_search():
     """this function performs the following action
-    1) use DataPipeline to query arXiv and generate the required dataframe
+    1) use SearchPipeline to query arXiv and generate the required dataframe
     2) use Visualisation and Network to generate the plotly charts
+    only the stages affected by the changed inputs are recomputed, and a
+    search any session already ran is read from the shared result store.
+    In progressive mode the search runs in the background instead, see
+    follow_search. Either way it supersedes the search still loading.
+    Searches are degraded to stay within the latency budget, degraded
+    results are not shared with other sessions
     """
+    if "pipeline" not in st.session_state:
+        st.session_state.pipeline = SearchPipeline()
+    params = dict(
+        num_searches=st.session_state.num_searches,
+        num_papers=st.session_state.num_papers,
+        num_links=st.session_state.num_links,
+        cluster_method=st.session_state.cluster_method,
+        backbone=st.session_state.backbone,
+    )
+    if st.session_state.progressive:
+        st.session_state.search = ProgressiveSearch(
+            st.session_state.pipeline,
+            st.session_state.search_term,
+            **params,
+            store=get_result_store(),
+            supersedes=st.session_state.get("search"),
+            budget=DEFAULT_LATENCY_BUDGET,
+        )
+        st.session_state.search_version = 0
+        return
+
     with st.spinner("Performing search"):
-        connector = DataPipeline()
-        res, df = connector.query_arxiv(
-            st.session_state.search_term, st.session_state.num_searches
+        results = run_search(
+            st.session_state.pipeline,
+            st.session_state.search_term,
+            **params,
+            store=get_result_store(),
+            supersedes=st.session_state.pop("search", None),
+            budget=DEFAULT_LATENCY_BUDGET,
         )
-    if res is False:
+    if results is None:
         st.error("Search did not produce any results. Please try again")
     else:
-        with st.spinner("Calculating paper similarity"):
-            df = connector.preprocessing_pipeline(df)
-            cosine_df = connector.cosine_similarity_pipeline(
-                df,
-                num_encodings=st.session_state.num_papers,
-                num_links=st.session_state.num_links,
-            )
-            network = Network()
-            st.session_state.network_graph = network.plot_networkgraph(cosine_df)
-
-        with st.spinner("Generating word cloud and other visualizations"):
-            wc = Visualisation().generate_word_cloud(df)
-            st.session_state.word_cloud = Visualisation().display_word_cloud(wc)
-            st.session_state.df = df
-            (
-                st.session_state.labels,
-                st.session_state.network_graph,
-            ) = Network().plot_networkgraph(cosine_df)
-            wc = Visualisation().generate_word_cloud(df)
-            st.session_state.word_cloud = Visualisation().display_word_cloud(wc)
-            st.session_state.year_trend = Visualisation().year_published(df)
-            st.session_state.published_bar = Visualisation().published_bar(df)
+        show_results(results)
+
+
+def show_results(results):
+    """copies the charts and papers of a search into the session state"""
+    st.session_state.df = results["df"]
+    st.session_state.connector = st.session_state.pipeline.connector
+    st.session_state.clusters = results["clusters"]
+    st.session_state.network_graph = results["network_graph"]
+    # the graph is sent again on every refresh, as cached JSON
+    st.session_state.network_graph_key = figure_key(
+        results["layout"].positions,
+        results["edges"],
+        results["clusters"],
+        results["df"]["title"],
+    )
+    st.session_state.word_cloud = results["word_cloud"]
+    st.session_state.keywords = results["keywords"]
+    st.session_state.year_trend = results["year_trend"]
+    st.session_state.published_bar = results["published_bar"]
+    st.session_state.degraded = results.get("degraded", [])
+
+
+def follow_search():
+    """shows the latest results of the progressive search and its progress
+    returns True while the search is loading, the page is then refreshed
+    """
+    search = st.session_state.search
+    state = search.snapshot()
+    if state["version"] != st.session_state.search_version:
+        st.session_state.search_version = state["version"]
+        if state["results"] is not None:
+            show_results(state["results"])
+        elif state["done"] and not state["cancelled"] and state["error"] is None:
+            st.error("Search did not produce any results. Please try again")
+    if state["error"] is not None:
+        st.error("Search failed. Please try again")
+    if state["done"]:
+        return False
+
+    num_searches = search.params["num_searches"]
+    st.progress(min(state["num_fetched"] / num_searches, 1.0))
+    st.caption(
+        f"Showing {state['num_fetched']} of up to {num_searches} papers, "
+        "the charts are updated as more papers arrive"
+    )
+    st.button("Cancel search", on_click=search.cancel)
+    return True
+
+
+def display_degraded():
+    """tells what the search gave up to stay within the latency budget"""
+    st.info(
+        f"To answer within {DEFAULT_LATENCY_BUDGET:g} seconds: "
+        + "; ".join(st.session_state.degraded)
+        + ". Reduce the number of papers or links for complete results"
+    )
 
 
 def display_graph():
     """handles the display of network graph"""
     # st.plotly_chart(st.session_state.network_graph)
-    selected_points = plotly_events(st.session_state.network_graph, click_event=True)
-    print(selected_points)
-    if len(selected_points) != 0:
-        idx = selected_points[0]["pointIndex"]
-        title = st.session_state.labels[idx]
-        df_idx = (st.session_state.df["title"] == title).argmax()
-        href = st.session_state.df["id"][df_idx]
+    fig = st.session_state.network_graph
+    serialized = get_figure_cache().serialized(
+        st.session_state.network_graph_key, fig
+    )
+    selected_points = plotly_events(serialized, click_event=True)
+    # only clicks on the node trace select a paper, its customdata is the row
+    nodes = [point for point in selected_points if point["curveNumber"] == 1]
+    if nodes:
+        paper_id = fig.data[1].customdata[nodes[0]["pointIndex"]]
+        paper = st.session_state.df.iloc[paper_id]
+        title, href = paper["title"], paper["id"]
         st.markdown(f"Paper url: [{title}]({href})", unsafe_allow_html=True)
+        if st.button("More like this"):
+            related = st.session_state.connector.more_like_this(href)
+            for paper in related.itertuples():
+                st.markdown(f"- [{paper.title}]({paper.id}) ({paper.score:.2f})")
+
+
+def display_clusters():
+    """handles the display of the papers and word cloud of every cluster"""
+    clusters = st.session_state.clusters
+    for _, papers in clusters.groupby("cluster", sort=True):
+        label = papers["cluster_label"].iloc[0]
+        with st.expander(f"{label} ({len(papers)} papers)"):
+            for paper in papers.itertuples():
+                st.markdown(f"- [{paper.title}]({paper.id})")
+    labels = clusters.drop_duplicates("cluster").sort_values("cluster")
+    cluster = st.selectbox(
+        "Word cloud of cluster",
+        options=[None] + labels["cluster"].tolist(),
+        format_func=lambda c: "-"
+        if c is None
+        else labels.set_index("cluster")["cluster_label"][c],
+    )
+    if cluster is not None:
+        df = st.session_state.df
+        papers = df[df["id"].isin(clusters.loc[clusters["cluster"] == cluster, "id"])]
+        st.plotly_chart(st.session_state.pipeline.word_cloud(papers))
 
 
 def display_cloud():
-    """handles the display of word cloud"""
+    """handles the display of word cloud and suggested keywords"""
     st.plotly_chart(st.session_state.word_cloud)
+    if st.session_state.keywords:
+        st.markdown("Related keywords: " + ", ".join(st.session_state.keywords))
 
 
 def display_year_trends():
@@ -75,6 +184,21 @@ def display_year_trends():
     st.plotly_chart(st.session_state.year_trend, use_container_width=True)
 
 
+def display_debug():
+    """handles the display of the stage metrics of the last request"""
+    request = st.session_state.pipeline.last_request
+    if request is None:
+        return
+    with st.expander("Debug: stages of the last request", expanded=True):
+        st.plotly_chart(
+            st.session_state.pipeline.visualisation.stage_waterfall(request),
+            use_container_width=True,
+        )
+        st.json(request)
+        st.markdown("Shared result store")
+        st.json(get_result_store().stats())
+
+
 # @st.cache(suppress_st_warning=True)
 def display_published_bar():
     """handles the display of published vs non-published paper"""
@@ -90,7 +214,7 @@ with st.form(key="my_form"):
             label="Search results to return",
             value=50,
             min_value=10,
-            max_value=500,
+            max_value=2000,
             step=5,
             key="num_searches",
         )
@@ -110,6 +234,41 @@ with st.form(key="my_form"):
             step=5,
             key="num_links",
         )
+        cluster_method = st.selectbox(
+            label="Clustering method",
+            options=["kmeans", "community"],
+            format_func=lambda method: {
+                "kmeans": "Mini-batch k-means on embeddings",
+                "community": "Communities of the similarity graph",
+            }[method],
+            key="cluster_method",
+        )
+        backbone = st.selectbox(
+            label="Links to show",
+            options=BACKBONES,
+            format_func=lambda method: {
+                "top": "Strongest links",
+                "spanning_tree": "Maximum spanning tree and nearest neighbours",
+                "disparity": "Most significant links (disparity filter)",
+                "degree_cap": f"Strongest links, at most {MAX_DEGREE} per paper",
+            }[method],
+            key="backbone",
+        )
+        st.checkbox(
+            "Show results while later pages load",
+            value=True,
+            key="progressive",
+        )
+
+st.checkbox("Show debug metrics", key="debug")
+
+loading = "search" in st.session_state and follow_search()
+
+if st.session_state.debug and "pipeline" in st.session_state:
+    display_debug()
+
+if st.session_state.get("degraded"):
+    display_degraded()
 
 if "network_graph" in st.session_state:
     st.subheader("Network graph")
@@ -119,7 +278,15 @@ if "network_graph" in st.session_state:
     display_graph()
     st.markdown("""---""")
 
-if "word_cloud" in st.session_state:
+if "clusters" in st.session_state:
+    st.subheader("Clusters")
+    st.caption(
+        "Papers grouped by topic, each cluster is labelled with its most distinctive terms and matches a node color in the network graph"
+    )
+    display_clusters()
+    st.markdown("""---""")
+
+if st.session_state.get("word_cloud") is not None:
     st.subheader(
         f"Wordcloud (Summaries of the first {st.session_state.num_papers} papers)"
     )
@@ -129,7 +296,7 @@ if "word_cloud" in st.session_state:
     display_cloud()
     st.markdown("""---""")
 
-if "year_trend" in st.session_state:
+if st.session_state.get("year_trend") is not None:
     st.subheader("Yearly trends of the number of papers")
     st.caption(
         "From this line plot, we can observe the trends in the number of papers submitted to arXiv for the search term."
@@ -137,9 +304,13 @@ if "year_trend" in st.session_state:
     display_year_trends()
     st.markdown("""---""")
 
-if "published_bar" in st.session_state:
+if st.session_state.get("published_bar") is not None:
     st.subheader("Number of published and non-published papers")
     st.caption(
         "From this plot, we can get an idea of how many papers are eventually published."
     )
     display_published_bar()
+
+if loading:
+    time.sleep(POLL_SECONDS)
+    st.experimental_rerun()
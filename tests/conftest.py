@@ -0,0 +1,92 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+ENTRY = """<entry>
+    <id>http://arxiv.org/abs/2101.{index:05d}v1</id>
+    <updated>2021-01-01T00:00:00Z</updated>
+    <published>2021-01-01T00:00:00Z</published>
+    <title>Paper number {index}</title>
+    <summary>Abstract of paper number {index} about
+      transformers</summary>
+    <author><name>Author {index}</name></author>
+    <link href="http://arxiv.org/abs/2101.{index:05d}v1" rel="alternate" type="text/html"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>"""
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>
+  <title type="html">ArXiv Query</title>
+  <id>http://arxiv.org/api/query</id>
+  <updated>2021-01-01T00:00:00-05:00</updated>
+  <opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{total}</opensearch:totalResults>
+  {entries}
+</feed>
+"""
+
+
+def atom_feed(start: int, num_results: int, total: int) -> bytes:
+    """Builds an arXiv-like Atom feed for entries [start, start + num_results)"""
+    stop = min(start + num_results, total)
+    entries = "\n  ".join(ENTRY.format(index=i) for i in range(start, stop))
+    return FEED.format(total=total, entries=entries).encode("utf-8")
+
+
+class AtomServer:
+    """Local stub of the arXiv API serving synthetic feeds"""
+
+    def __init__(self, total: int = 30, failures: int = 0):
+        self.total = total
+        self.failures = failures
+        self.requests = []
+        self.gzipped = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                server.requests.append(params)
+                if server.failures > 0:
+                    server.failures -= 1
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                start = int(params.get("start", ["0"])[0])
+                num_results = int(params.get("max_results", ["10"])[0])
+                body = atom_feed(start, num_results, server.total)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/atom+xml")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    server.gzipped += 1
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/api"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def atom_server():
+    server = AtomServer()
+    yield server
+    server.close()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from src.app_func.ann_index import AnnIndex, ann_edges
+from src.app_func.datapipeline import DataPipeline
+from src.app_func.similarity import normalize_embeddings, top_k_edges
+
+
+def clustered_vectors(num_vectors, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(20, dim))
+    return centres[rng.integers(0, 20, num_vectors)] + 0.3 * rng.normal(
+        size=(num_vectors, dim)
+    )
+
+
+def test_ivf_search_recall():
+    vectors = clustered_vectors(3000)
+    index = AnnIndex(16, exact_threshold=1000, nprobe=8)
+    index.add(map(str, range(1500)), vectors[:1500])
+    index.add(map(str, range(1500, 3000)), vectors[1500:])
+    queries = vectors[:50]
+
+    positions, _ = index.search(queries, 10)
+
+    unit = normalize_embeddings(vectors)
+    truth = np.argsort(-(normalize_embeddings(queries) @ unit.T), axis=1)[:, :10]
+    recall = np.mean([len(set(p) & set(t)) / 10 for p, t in zip(positions, truth)])
+    assert index.centroids is not None
+    assert recall > 0.9
+
+
+def test_save_load_and_upsert(tmp_path):
+    vectors = clustered_vectors(50)
+    index = AnnIndex(16)
+    index.add(
+        [f"p{i}" for i in range(50)], vectors, labels=[f"t{i}" for i in range(50)]
+    )
+    index.add(["p0"], vectors[[1]], labels=["renamed"])
+    index.save(str(tmp_path))
+
+    loaded = AnnIndex.load(str(tmp_path))
+    positions, scores = loaded.search(vectors[1], 2)
+
+    assert len(loaded) == 50
+    assert {loaded.keys[p] for p in positions[0]} == {"p0", "p1"}
+    np.testing.assert_allclose(scores[0], [1.0, 1.0], rtol=1e-5)
+    assert loaded.labels[0] == "renamed"
+
+
+def test_ann_edges_close_to_exact():
+    vectors = clustered_vectors(800)
+    exact = top_k_edges(vectors, 100)
+
+    approx = ann_edges(vectors, 100)
+
+    exact_pairs = set(zip(exact["src"].tolist(), exact["dst"].tolist()))
+    approx_pairs = set(zip(approx["src"].tolist(), approx["dst"].tolist()))
+    assert len(exact_pairs & approx_pairs) >= 90
+
+
+def test_more_like_this(mocker, tmp_path):
+    mocker.patch("src.app_func.datapipeline.get_sentence_encoder")
+    connector = DataPipeline(cache_dir=str(tmp_path))
+    df = pd.DataFrame({"id": ["a", "b", "c"], "title": ["A", "B", "C"]})
+    connector.index_papers(df, np.array([[1.0, 0.0], [0.0, 1.0], [0.9, 0.2]]))
+
+    related = connector.more_like_this("a", 1)
+
+    assert related["title"].tolist() == ["C"]
+    assert connector.more_like_this("unknown").empty
+
+
+def test_more_like_this_before_indexing_creates_no_index(mocker, tmp_path):
+    mocker.patch("src.app_func.datapipeline.get_sentence_encoder")
+    connector = DataPipeline(cache_dir=str(tmp_path))
+    df = pd.DataFrame({"id": ["a", "b"], "title": ["A", "B"]})
+
+    assert connector.more_like_this("a").empty
+    connector.index_papers(df, np.eye(2, 8))
+
+    assert connector.more_like_this("a", 1)["title"].tolist() == ["B"]
+
+
+def test_key_repeated_in_a_batch_keeps_its_last_vector():
+    index = AnnIndex(3)
+    index.add(["a", "b", "a"], np.eye(3), labels=["A1", "B", "A2"])
+
+    assert index.keys == ["a", "b"] and index.labels == ["A2", "B"]
+    np.testing.assert_allclose(index.vector("a"), np.eye(3)[[2]].ravel())
+    positions, _ = index.search(np.eye(3)[[2]], 1)
+    assert index.keys[positions[0][0]] == "a"
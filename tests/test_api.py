@@ -0,0 +1,188 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.app_func import api
+from src.app_func.api import SearchApp, SearchService, search_params
+from src.app_func.network_graph import GraphLayout
+
+
+class StubPipeline:
+    """SearchPipeline stand-in returning a fixed result, held until released"""
+
+    calls = 0
+
+    def __init__(self, release: threading.Event):
+        self.release = release
+
+    def data(self, **params):
+        StubPipeline.calls += 1
+        self.release.wait(5)
+        titles = np.array(["Paper A", "Paper B", "Paper C"], dtype=object)
+        return {
+            "df": pd.DataFrame(
+                {
+                    "id": ["a", "b", "c"],
+                    "title": titles,
+                    "published": pd.to_datetime(["2020-01-01"] * 3),
+                    "journal_ref": [None, "J. Test", None],
+                }
+            ),
+            "layout": GraphLayout(
+                np.arange(3),
+                np.array([[0.0, 1.0], [1.0, 0.0], [0.5, 0.5]]),
+                np.array([0, 1]),
+                np.array([1, 2]),
+                np.array([0.9, 0.8]),
+            ),
+            "clusters": pd.DataFrame(
+                {"id": ["a", "b", "c"], "cluster": [0, 0, 1], "cluster_label": "x"}
+            ),
+            "keywords": ["graphs"],
+        }
+
+
+@pytest.fixture
+def release():
+    StubPipeline.calls = 0
+    event = threading.Event()
+    event.set()
+    return event
+
+
+@pytest.fixture
+def app(release):
+    service = SearchService(
+        max_workers=2, pipeline_factory=lambda: StubPipeline(release)
+    )
+    yield SearchApp(service)
+    service.close()
+
+
+async def call(app, path, query=b"", method="GET", body=b"", headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query,
+        "headers": list(headers),
+    }
+    await app(scope, receive, send)
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return messages[0]["status"], body, messages
+
+
+def test_search_params_are_validated():
+    assert search_params({"search_term": " gnn ", "num_links": "100"}) == {
+        "search_term": "gnn",
+        "num_searches": 50,
+        "num_papers": 50,
+        "num_links": 100,
+        "cluster_method": "kmeans",
+        "backbone": "top",
+    }
+    for values in [
+        {},
+        {"search_term": "gnn", "num_papers": "many"},
+        {"search_term": "gnn", "num_links": 5000},
+        {"search_term": "gnn", "cluster_method": "spectral"},
+        {"search_term": "gnn", "backbone": "hairball"},
+    ]:
+        with pytest.raises(ValueError):
+            search_params(values)
+
+
+def test_search_returns_papers_graph_and_clusters(app):
+    status, body, _ = asyncio.run(call(app, "/search", b"search_term=gnn"))
+    payload = json.loads(body)
+
+    assert status == 200
+    assert payload["query"]["search_term"] == "gnn"
+    assert [paper["id"] for paper in payload["papers"]] == ["a", "b", "c"]
+    assert payload["papers"][0]["journal_ref"] is None
+    assert payload["nodes"][1] == {
+        "node": 1,
+        "paper": 1,
+        "label": "Paper B",
+        "x": 1.0,
+        "y": 0.0,
+    }
+    assert payload["edges"][0] == {"source": 0, "target": 1, "weight": 0.9}
+    assert [row["cluster"] for row in payload["clusters"]] == [0, 0, 1]
+    assert payload["keywords"] == ["graphs"]
+
+    status, body, _ = asyncio.run(
+        call(app, "/search", method="POST", body=b'{"num_links": 1}')
+    )
+    assert status == 400 and "search_term" in json.loads(body)["error"]
+    status, body, _ = asyncio.run(call(app, "/search", method="POST", body=b"[1]"))
+    assert status == 400 and "JSON object" in json.loads(body)["error"]
+    assert asyncio.run(call(app, "/nowhere"))[0] == 404
+
+
+def test_identical_searches_in_flight_are_computed_once(app, release):
+    release.clear()
+
+    async def searches():
+        requests = [
+            asyncio.ensure_future(call(app, "/search", b"search_term=gnn"))
+            for _ in range(3)
+        ]
+        other = asyncio.ensure_future(call(app, "/search", b"search_term=vision"))
+        await asyncio.sleep(0.1)
+        release.set()
+        return await asyncio.gather(*requests, other)
+
+    responses = asyncio.run(searches())
+
+    assert [status for status, _, _ in responses] == [200] * 4
+    assert StubPipeline.calls == 2
+    assert app.service.coalesced == 2
+    assert app.service.in_flight == {}
+
+
+def test_search_streams_ndjson_in_chunks(app, monkeypatch):
+    monkeypatch.setattr(api, "STREAM_CHUNK_LINES", 2)
+    status, body, messages = asyncio.run(
+        call(
+            app,
+            "/search",
+            b"search_term=gnn",
+            headers=[(b"accept", b"application/x-ndjson")],
+        )
+    )
+    records = [json.loads(line) for line in body.splitlines()]
+
+    assert status == 200
+    assert dict(messages[0]["headers"])[b"content-type"] == b"application/x-ndjson"
+    assert len(messages) > 3 and messages[1]["more_body"]
+    assert [record["type"] for record in records] == (
+        ["query"] + ["paper"] * 3 + ["node"] * 3 + ["edge"] * 2 + ["cluster"] * 3
+    ) + ["keywords"]
+
+
+def test_pending_searches_are_bounded(release):
+    service = SearchService(
+        max_pending=0, pipeline_factory=lambda: StubPipeline(release)
+    )
+    try:
+        status, _, _ = asyncio.run(
+            call(SearchApp(service), "/search", b"search_term=gnn")
+        )
+    finally:
+        service.close()
+
+    assert status == 503
+    assert StubPipeline.calls == 0
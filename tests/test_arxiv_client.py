@@ -0,0 +1,97 @@
+import time
+
+from src.app_func.arxiv_client import ArxivClient
+from src.app_func.datapipeline import DataPipeline
+from src.app_func.query_cache import QueryCache
+
+
+def entry_ids(page):
+    return [int(arxiv_id.split(".")[1]) for arxiv_id in page.columns["arxiv_id"]]
+
+
+def test_fetch_splits_pages_in_order(atom_server):
+    client = ArxivClient(atom_server.base_url, page_size=10, min_interval=0.0)
+
+    pages = client.fetch("transformers", 25)
+
+    assert [entry_ids(page) for page in pages] == [
+        list(range(0, 10)),
+        list(range(10, 20)),
+        list(range(20, 25)),
+    ]
+    assert sorted(int(r["max_results"][0]) for r in atom_server.requests) == [
+        5,
+        10,
+        10,
+    ]
+    assert atom_server.gzipped == 3
+
+
+def test_fetch_stops_at_total_results(atom_server):
+    client = ArxivClient(atom_server.base_url, page_size=10, min_interval=0.0)
+
+    pages = client.fetch("transformers", 100)
+
+    assert len(pages) == 3
+    assert len(atom_server.requests) == 3
+
+
+def test_fetch_page_retries_with_backoff(atom_server):
+    atom_server.failures = 2
+    client = ArxivClient(atom_server.base_url, min_interval=0.0, backoff=0.01)
+
+    page = client.fetch_page("transformers", 0, 5)
+
+    assert entry_ids(page) == list(range(5))
+    assert len(atom_server.requests) == 3
+
+
+def test_clients_of_a_host_share_rate_limit_and_threads(atom_server):
+    first = ArxivClient(atom_server.base_url, min_interval=0.2)
+    second = ArxivClient(atom_server.base_url, min_interval=0.2)
+
+    start = time.monotonic()
+    first.fetch_page("transformers", 0, 5)
+    second.fetch_page("transformers", 0, 5)
+
+    assert time.monotonic() - start >= 0.2
+    assert first._host is second._host
+    assert first._host.executor is second._host.executor
+
+
+def test_query_arxiv_merges_pages(mocker, atom_server, tmp_path):
+    mocker.patch("src.app_func.datapipeline.get_sentence_encoder")
+    connector = DataPipeline(
+        cache_dir=None,
+        base_url=atom_server.base_url,
+        query_cache=QueryCache(),
+    )
+    connector.client.page_size = 10
+    connector.client.min_interval = 0.0
+
+    res, df = connector.query_arxiv("transformers", 25)
+
+    assert res
+    assert df["title"].tolist() == [f"Paper number {i}" for i in range(25)]
+
+
+def test_query_arxiv_pages_yields_papers_as_pages_arrive(mocker, atom_server):
+    mocker.patch("src.app_func.datapipeline.get_sentence_encoder")
+    connector = DataPipeline(
+        cache_dir=None,
+        base_url=atom_server.base_url,
+        query_cache=QueryCache(),
+    )
+    connector.client.page_size = 10
+    connector.client.min_interval = 0.0
+
+    pages = list(connector.query_arxiv_pages("transformers", 25, first_page_size=5))
+
+    assert [(len(df), complete) for df, complete in pages] == [
+        (5, False),
+        (15, False),
+        (25, True),
+    ]
+    assert pages[-1][0]["title"].tolist() == [f"Paper number {i}" for i in range(25)]
+    assert len(list(connector.query_arxiv_pages("transformers", 25, 5))) == 1
+    assert len(atom_server.requests) == 3
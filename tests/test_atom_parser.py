@@ -0,0 +1,68 @@
+import pandas as pd
+
+from src.app_func.atom_parser import AtomParser, parse_feed
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"
+      xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/"
+      xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <id>http://arxiv.org/api/query</id>
+  <opensearch:totalResults>2</opensearch:totalResults>
+  <entry>
+    <id>http://arxiv.org/abs/1706.03762v7</id>
+    <published>2017-06-12T17:57:34Z</published>
+    <title>Attention Is All You Need</title>
+    <summary>The dominant sequence transduction models</summary>
+    <author><name>Ashish Vaswani</name></author>
+    <author><name>Noam Shazeer</name></author>
+    <arxiv:doi>10.1000/xyz</arxiv:doi>
+    <arxiv:journal_ref>NeurIPS 2017</arxiv:journal_ref>
+    <arxiv:primary_category term="cs.CL"/>
+    <category term="cs.CL"/>
+    <category term="cs.LG"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/hep-th/9901001v1</id>
+    <published>1999-01-01T00:00:00Z</published>
+    <title>Old style id</title>
+    <summary>Strings</summary>
+    <author><name>Someone</name></author>
+    <category term="hep-th"/>
+  </entry>
+</feed>
+"""
+
+
+def test_parse_feed_columns():
+    df = parse_feed(FEED)
+
+    assert df["arxiv_id"].tolist() == ["1706.03762", "hep-th/9901001"]
+    assert df["version"].tolist() == [7, 1]
+    assert df["authors"][0] == ["Ashish Vaswani", "Noam Shazeer"]
+    assert df["categories"][0] == ["cs.CL", "cs.LG"]
+    assert df["primary_category"][0] == "cs.CL"
+    assert df["doi"][0] == "10.1000/xyz"
+    assert df[["primary_category", "doi"]].isnull().sum().tolist() == [1, 1]
+    assert df["journal_ref"].isnull().tolist() == [False, True]
+
+
+def test_incremental_feed_matches_single_pass():
+    parser = AtomParser()
+    for i in range(0, len(FEED), 7):
+        parser.feed(FEED[i : i + 7])
+    parser.close()
+
+    assert parser.total_results == 2
+    pd.testing.assert_frame_equal(parser.to_dataframe(), parse_feed(FEED))
+
+
+def test_empty_and_error_feeds():
+    error = FEED.replace(
+        b"http://arxiv.org/abs/1706.03762v7", b"http://arxiv.org/api/errors#bad"
+    )
+    empty = AtomParser()
+    empty.feed(FEED.split(b"<entry>")[0] + b"</feed>")
+    empty.close()
+
+    assert len(parse_feed(error)) == 1
+    assert AtomParser.concat([empty]).empty
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from src.app_func.backbone import (
+    backbone_edges,
+    disparity_alpha,
+    edge_ranks,
+    maximum_spanning_forest,
+)
+from src.app_func.similarity import EDGE_DTYPE, knn_edges, top_k_neighbours
+
+
+def edge_array(pairs):
+    edges = np.empty(len(pairs), dtype=EDGE_DTYPE)
+    for position, (src, dst, weight) in enumerate(pairs):
+        edges[position] = (src, dst, weight)
+    return edges
+
+
+def clustered_edges(num_papers=300, num_clusters=6, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(num_clusters, 32))
+    clusters = rng.integers(0, num_clusters, num_papers)
+    embeddings = centres[clusters] + 0.6 * rng.normal(size=(num_papers, 32))
+    return knn_edges(*top_k_neighbours(embeddings, 10)), clusters
+
+
+def kruskal_weight(edges, num_nodes):
+    parent = list(range(num_nodes))
+
+    def find(node):
+        while parent[node] != node:
+            node = parent[node]
+        return node
+
+    total, num_edges = 0.0, 0
+    for src, dst, weight in sorted(edges.tolist(), key=lambda edge: -edge[2]):
+        root_src, root_dst = find(src), find(dst)
+        if root_src != root_dst:
+            parent[root_src] = root_dst
+            total += weight
+            num_edges += 1
+    return total, num_edges
+
+
+def test_maximum_spanning_forest_matches_kruskal():
+    edges, _ = clustered_edges()
+    # a second component and ties
+    extra = edge_array([(300, 301, 0.5), (301, 302, 0.5), (300, 302, 0.5)])
+    edges = np.concatenate([edges, extra])
+
+    forest = maximum_spanning_forest(edges, 304)
+
+    total, num_edges = kruskal_weight(edges, 304)
+    assert len(forest) == num_edges
+    assert np.isclose(forest["weight"].sum(), total, atol=1e-3)
+    assert np.all(np.diff(forest["weight"]) <= 0)
+
+
+def test_edge_ranks_and_disparity_alpha():
+    edges = edge_array([(0, 1, 0.9), (0, 2, 0.1), (1, 2, 0.5)])
+
+    src_rank, dst_rank = edge_ranks(edges)
+    assert src_rank.tolist() == [0, 1, 1]
+    assert dst_rank.tolist() == [0, 1, 0]
+
+    alphas = disparity_alpha(edges, 3)
+    # node 0 gives 0.9 of its strength to the first edge
+    assert np.isclose(alphas[0], 0.1)
+    assert alphas[0] < alphas[2] < alphas[1]
+
+
+@pytest.mark.parametrize("method", ["spanning_tree", "disparity", "degree_cap"])
+def test_backbones_keep_clusters_connected_within_the_link_budget(method):
+    edges, clusters = clustered_edges()
+    top = backbone_edges(edges, 300, 250, method="top")
+
+    backbone = backbone_edges(edges, 300, 250, method=method)
+
+    assert len(backbone) <= 250
+    assert np.all(np.diff(backbone["weight"]) <= 0)
+    degree = np.bincount(np.r_[backbone["src"], backbone["dst"]], minlength=300)
+    top_degree = np.bincount(np.r_[top["src"], top["dst"]], minlength=300)
+    # the strongest links crowd into few papers, a backbone spreads them
+    assert (degree > 0).sum() > (top_degree > 0).sum()
+    if method == "degree_cap":
+        assert degree.max() <= 5
+    if method == "spanning_tree":
+        within = clusters[backbone["src"]] == clusters[backbone["dst"]]
+        assert within.mean() > 0.9
+
+
+def test_unknown_backbone_is_rejected():
+    with pytest.raises(ValueError):
+        backbone_edges(np.empty(0, dtype=EDGE_DTYPE), 0, 10, method="hairball")
@@ -0,0 +1,84 @@
+import numpy as np
+
+from benchmarks.quantization_report import overlap_report
+from benchmarks.stage_benchmarks import compare, run_benchmarks
+from benchmarks.synthetic import HashingModel, synthetic_feed, synthetic_papers
+from src.app_func.atom_parser import parse_feed
+
+
+def test_synthetic_feed_parses_into_distinct_papers():
+    df = parse_feed(synthetic_feed(40))
+
+    assert len(df) == 40
+    assert df["title"].is_unique and df["id"].is_unique
+    assert df["journal_ref"].notnull().any() and df["journal_ref"].isnull().any()
+    assert df["summary"].str.contains("\n").all()
+
+
+def test_hashing_model_is_deterministic_and_groups_topics():
+    papers = synthetic_papers(60)
+    embeddings = HashingModel().encode(papers["summary"].tolist())
+    again = HashingModel().encode(papers["summary"].tolist())
+
+    np.testing.assert_array_equal(embeddings, again)
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1, rtol=1e-5)
+    topics = papers["category"].to_numpy()
+    similarity = embeddings @ embeddings.T
+    same = topics[:, None] == topics[None, :]
+    np.fill_diagonal(same, False)
+    different = topics[:, None] != topics[None, :]
+    assert similarity[same].mean() > similarity[different].mean() + 0.1
+
+
+def test_every_stage_is_measured():
+    results = run_benchmarks(sizes=[30], repeat=1)
+    stages = results["results"]["30"]
+
+    assert list(stages)[:6] == [
+        "parse",
+        "preprocess",
+        "dedup",
+        "encode",
+        "similarity",
+        "network_graph",
+    ]
+    assert {"word_cloud", "year_published", "published_bar"} <= set(stages)
+    for result in stages.values():
+        assert result["seconds"] >= 0 and result["peak_mb"] > 0
+    assert compare(results, results) == []
+
+
+def test_compare_flags_only_regressions_past_the_thresholds():
+    baseline = {
+        "results": {
+            "500": {
+                "encode": {"seconds": 1.0, "peak_mb": 100.0},
+                "parse": {"seconds": 0.001, "peak_mb": 1.0},
+            }
+        }
+    }
+    current = {
+        "results": {
+            "500": {
+                "encode": {"seconds": 1.6, "peak_mb": 110.0},
+                "parse": {"seconds": 0.005, "peak_mb": 1.5},
+                "layout": {"seconds": 9.0, "peak_mb": 9.0},
+            }
+        }
+    }
+
+    regressions = compare(current, baseline)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("encode at N=500: seconds")
+
+
+def test_quantization_report_compares_against_float32():
+    embeddings = HashingModel().encode(synthetic_papers(200)["summary"].tolist())
+    report = overlap_report(embeddings, k=5, num_links=50)
+
+    assert report["float32"]["neighbour_overlap"] == 1.0
+    assert report["int8"]["neighbour_overlap"] > 0.9
+    assert report["int8"]["link_overlap"] > 0.9
+    assert report["int8"]["compression"] > 3.5
+    assert report["float16"]["max_score_error"] < 1e-3
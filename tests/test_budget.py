@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from src.app_func.budget import (
+    MIN_PAPERS,
+    StageCostModel,
+    complete_results,
+    plan_search,
+    stage_papers,
+)
+from src.app_func.instrumentation import Instrumentation
+from src.app_func.result_store import ResultStore
+from src.app_func.search_pipeline import SearchPipeline
+
+
+def request(*stages, degraded=()):
+    return {
+        "stages": [
+            {"stage": name, "sizes": sizes, "seconds": seconds}
+            for name, sizes, seconds in stages
+        ],
+        "budget": {"degraded_stages": list(degraded)},
+    }
+
+
+def test_stage_papers_caps_rows_at_the_papers_encoded():
+    assert stage_papers({"rows": 300, "num_papers": 50}) == 50
+    assert stage_papers({"rows": 30}) == 30
+    assert stage_papers({}) == 0
+
+
+def test_cost_model_fits_recent_timings():
+    costs = StageCostModel()
+    for papers in [50, 100, 200, 400]:
+        costs.observe(
+            request(
+                ("encode", {"rows": 1000, "num_papers": papers}, 0.5 + 0.01 * papers)
+            )
+        )
+    costs.observe(request(("layout", {"rows": 100}, 99.0), degraded=["layout"]))
+
+    assert np.isclose(costs.predict("encode", 300), 3.5)
+    # degraded runs are not learned from, unmeasured stages use the prior
+    assert costs.predict("layout", 100) < 1.0
+
+    # only the latest runs count, the model follows the load
+    for _ in range(50):
+        costs.observe(request(("encode", {"rows": 100}, 2.0)))
+    assert np.isclose(costs.predict("encode", 100), 2.0)
+
+
+def test_plan_degrades_charts_then_layout_then_papers():
+    def predict(stage, papers):
+        return {"encode": 0.01, "layout": 0.005}.get(stage, 0.001) * papers
+
+    full = plan_search(predict, 100.0, 500, 500)
+    assert full.num_papers == 500 and not full.skip_secondary and not full.notes()
+
+    charts = plan_search(predict, 12.0, 500, 500)
+    assert charts.skip_secondary and charts.num_papers == 500
+    assert charts.layout_iterations is None
+
+    layout = plan_search(predict, 9.0, 500, 500, layout_cached=True)
+    assert layout.skip_secondary and layout.layout_iterations == 0
+    assert layout.num_papers == 500 and layout.degraded_stages == ["layout"]
+
+    fewer = plan_search(predict, 4.0, 500, 500)
+    assert fewer.num_papers < 500 and fewer.predicted_seconds <= 4.0 * 0.8
+    assert fewer.notes(["word_cloud", "year_trend"]) == [
+        f"Encoded {fewer.num_papers} of 500 papers",
+        "Skipped the word cloud and yearly trend",
+    ]
+
+    assert plan_search(predict, 0.0, 500, 500).num_papers == MIN_PAPERS
+    # cached stages cost nothing
+    cached = ["encode", "similarity", "layout", "cluster", "network_graph"]
+    assert plan_search(predict, 4.0, 500, 500, cached=cached).num_papers == 500
+
+
+def test_search_pipeline_degrades_to_its_budget(mocker):
+    mocker.patch("src.app_func.search_pipeline.Network")
+    mocker.patch("src.app_func.search_pipeline.Visualisation")
+    mocker.patch("src.app_func.search_pipeline.PaperClusters")
+    connector = mocker.MagicMock()
+    connector.query_arxiv.return_value = (True, pd.DataFrame({"summary": ["a"]}))
+    connector.deduplicate.return_value = pd.DataFrame({"summary": ["a"] * 200})
+    connector.encode_papers.return_value = (pd.DataFrame(columns=["id", "title"]), None)
+    costs = StageCostModel()
+    costs.predict = lambda stage, papers: 0.01 * papers
+    pipeline = SearchPipeline(
+        connector, metrics=Instrumentation(textfile=None), costs=costs
+    )
+    pipeline.network.positions = {}
+
+    results = pipeline.run("graphs", 200, 200, 50, budget=5.0)
+
+    _, kwargs = connector.encode_papers.call_args
+    assert MIN_PAPERS <= kwargs["num_encodings"] < 200
+    assert results["word_cloud"] is None and results["published_bar"] is None
+    assert results["degraded"][0].startswith("Encoded")
+    assert pipeline.last_request["budget"]["num_papers"] == kwargs["num_encodings"]
+    assert not complete_results(results)
+
+    results = pipeline.run("graphs", 200, 200, 50)
+    assert results["degraded"] == [] and results["word_cloud"] is not None
+    assert connector.encode_papers.call_args[1]["num_encodings"] == 200
+
+
+def test_degraded_results_are_not_stored():
+    store = ResultStore()
+
+    store.get_or_compute("a", lambda: {"degraded": ["x"]}, keep=complete_results)
+    store.get_or_compute("b", lambda: {"degraded": []}, keep=complete_results)
+
+    assert "a" not in store and "b" in store
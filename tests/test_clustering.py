@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from src.app_func.clustering import (
+    MiniBatchKMeans,
+    PaperClusters,
+    knn_graph,
+    label_propagation,
+)
+from src.app_func.network_graph import Network
+from src.app_func.similarity import EDGE_DTYPE
+from src.app_func.term_stats import TermStatistics
+
+TOPICS = ["graph neural networks", "protein folding", "dark matter halos"]
+
+
+def blobs(num_papers, num_topics=3, dim=16, seed=0):
+    centres = np.random.default_rng(0).normal(size=(num_topics, dim)) * 4
+    topics = np.arange(num_papers) % num_topics
+    noise = np.random.default_rng(seed).normal(size=(num_papers, dim))
+    embeddings = centres[topics] + noise
+    return embeddings.astype(np.float32), topics
+
+
+def papers(topics, prefix="p"):
+    return pd.DataFrame(
+        {
+            "id": [f"{prefix}{i}" for i in range(len(topics))],
+            "title": [f"{TOPICS[t]} study {i}" for i, t in enumerate(topics)],
+            "summary": [f"We study {TOPICS[t]} at scale." for t in topics],
+        }
+    )
+
+
+def same_partition(predicted, truth):
+    return len(pd.crosstab(predicted, truth).to_numpy().nonzero()[0]) == len(
+        np.unique(truth)
+    )
+
+
+def test_mini_batch_kmeans_recovers_blobs_and_updates_incrementally():
+    embeddings, topics = blobs(3000)
+    model = MiniBatchKMeans(3, batch_size=256).fit(embeddings)
+    assert same_partition(model.predict(embeddings), topics)
+
+    counts = model.counts.copy()
+    new_embeddings, new_topics = blobs(300, seed=1)
+    model.partial_fit(new_embeddings)
+    assert same_partition(model.predict(new_embeddings), new_topics)
+    assert model.counts.sum() == counts.sum() + 300
+
+
+def test_label_propagation_finds_communities_of_knn_graph():
+    embeddings, topics = blobs(600)
+    edges = knn_graph(embeddings, k=8)
+    communities = label_propagation(
+        len(embeddings), edges["src"], edges["dst"], edges["weight"]
+    )
+
+    assert same_partition(communities, topics)
+    assert np.bincount(communities).tolist() == sorted(
+        np.bincount(communities), reverse=True
+    )
+
+
+def test_label_propagation_keeps_initial_numbers():
+    src = np.array([0, 1, 3, 4])
+    dst = np.array([1, 2, 4, 5])
+    communities = label_propagation(6, src, dst, initial=np.array([7, 7, -1, 2, 2, -1]))
+
+    assert communities.tolist() == [7, 7, 7, 2, 2, 2]
+
+
+def test_paper_clusters_reuse_assignments_of_known_papers():
+    embeddings, topics = blobs(300)
+    df = papers(topics)
+    clusterer = PaperClusters(num_clusters=3, terms=TermStatistics())
+
+    for method in ["kmeans", "community"]:
+        clusters = clusterer.cluster(df, embeddings, method=method)
+        assert same_partition(clusters["cluster"].to_numpy(), topics)
+        labels = clusters.groupby("cluster")["cluster_label"].first()
+        assert sorted(label.split(", ")[0] for label in labels) == sorted(
+            topic.split()[0] for topic in TOPICS
+        )
+
+        more_embeddings, more_topics = blobs(30, seed=2)
+        grown = clusterer.cluster(
+            pd.concat([df, papers(more_topics, prefix="q")], ignore_index=True),
+            np.vstack([embeddings, more_embeddings]),
+            method=method,
+        )
+        assert (grown["cluster"][:300] == clusters["cluster"]).all()
+        assert same_partition(grown["cluster"].to_numpy(), np.r_[topics, more_topics])
+
+
+def test_network_colors_nodes_by_cluster():
+    edges = np.array([(0, 1, 0.9), (1, 2, 0.8)], dtype=EDGE_DTYPE)
+    clusters = pd.DataFrame(
+        {
+            "cluster": [0, 0, 1],
+            "cluster_label": ["graphs", "graphs", "proteins"],
+        }
+    )
+    fig = Network().plot_networkgraph(edges, ["a", "b", "c"], clusters=clusters)
+    node_trace = fig.data[1]
+
+    colors = list(node_trace.marker.color)
+    assert colors[0] == colors[1] != colors[2]
+    assert node_trace.text[2] == "c<br>proteins"
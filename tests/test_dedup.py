@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from src.app_func.dedup import (
+    base_ids,
+    deduplicate,
+    near_duplicates,
+    text_signatures,
+)
+
+ABSTRACT = " ".join(f"word{i}" for i in range(120))
+
+
+def signatures(texts):
+    return text_signatures(pd.Series(texts))
+
+
+def test_base_ids_drop_the_version():
+    df = pd.DataFrame(
+        {
+            "id": [
+                "http://arxiv.org/abs/1706.03762v7",
+                "http://arxiv.org/abs/1706.03762v1",
+                "http://arxiv.org/abs/hep-th/9901001v2",
+            ]
+        }
+    )
+
+    assert base_ids(df).tolist() == ["1706.03762", "1706.03762", "hep-th/9901001"]
+
+
+def test_signatures_estimate_shingle_similarity():
+    first = " ".join(f"w{i}" for i in range(200))
+    for shift, similarity in [(40, 0.67), (100, 0.33), (190, 0.0)]:
+        second = " ".join(f"w{i}" for i in range(shift, shift + 200))
+        estimate = (np.subtract(*signatures([first, second])) == 0).mean()
+        assert abs(estimate - similarity) < 0.15
+
+
+def test_near_duplicates_collapse_into_the_first_text():
+    texts = [
+        ABSTRACT,
+        "Unrelated abstract about protein folding and molecular dynamics",
+        ABSTRACT.upper() + ", cross-listed.",
+        "",
+        "",
+    ]
+
+    assert near_duplicates(signatures(texts)).tolist() == [0, 1, 0, 3, 4]
+    batched = text_signatures(pd.Series(texts), batch_size=2)
+    assert near_duplicates(batched).tolist() == [0, 1, 0, 3, 4]
+
+
+def test_deduplicate_collapses_versions_and_copies():
+    df = pd.DataFrame(
+        {
+            "arxiv_id": ["2101.00001", "2101.00002", "2101.00001", "2101.00003"],
+            "summary": [
+                ABSTRACT,
+                "A different paper on graph neural networks",
+                ABSTRACT + " revised",
+                ABSTRACT.replace("word5 ", "") + " (copy)",
+            ],
+        },
+        index=[5, 6, 7, 8],
+    )
+
+    papers = deduplicate(df)
+
+    assert papers["arxiv_id"].tolist() == ["2101.00001", "2101.00002"]
+    assert papers.index.tolist() == [0, 1]
+    assert deduplicate(df, threshold=None)["arxiv_id"].tolist() == [
+        "2101.00001",
+        "2101.00002",
+        "2101.00003",
+    ]
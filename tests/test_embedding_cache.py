@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from src.app_func.embedding_cache import EmbeddingCache, embedding_key
+from src.app_func.sentence_encoder import SentenceEncoder
+
+
+def test_embedding_key_strips_url():
+    assert embedding_key("http://arxiv.org/abs/2101.00001v2") == "2101.00001v2"
+    assert embedding_key("hep-th/9901001v1") == "hep-th/9901001v1"
+
+
+def test_cache_roundtrip_and_persistence(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dim=4, max_entries=8)
+    vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+    cache.put(["a v1", "b v1"], vectors)
+
+    reopened = EmbeddingCache(str(tmp_path), "model", dim=4, max_entries=8)
+    embeddings, hit_mask = reopened.get(["b v1", "c v1", "a v1"])
+
+    assert hit_mask.tolist() == [True, False, True]
+    np.testing.assert_array_equal(embeddings[[0, 2]], vectors[[1, 0]])
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dim=2, max_entries=2)
+    cache.put(["a", "b"], np.ones((2, 2)))
+    cache.get(["a"])
+    cache.put(["c"], np.zeros((1, 2)))
+
+    _, hit_mask = cache.get(["a", "b", "c"])
+    assert hit_mask.tolist() == [True, False, True]
+    assert len(cache) == 2
+
+
+def test_encoder_only_encodes_misses(mocker, tmp_path):
+    model = mocker.MagicMock()
+    model.get_sentence_embedding_dimension.return_value = 3
+    model.encode.side_effect = lambda sentences, batch_size: np.ones(
+        (len(sentences), 3), dtype=np.float32
+    )
+    mocker.patch("src.app_func.sentence_encoder.create_backend", return_value=model)
+    encoder = SentenceEncoder(cache_dir=str(tmp_path))
+    df = pd.DataFrame(
+        {
+            "id": ["http://arxiv.org/abs/1v1", "http://arxiv.org/abs/2v1"],
+            "summary": ["first", "second"],
+        }
+    )
+
+    encoder.encode_sentences(df)
+    embeddings = encoder.encode_sentences(df)
+
+    assert model.encode.call_count == 1
+    assert embeddings.shape == (2, 3)
+
+
+def test_encoder_keys_embeddings_by_column_and_text(mocker, tmp_path):
+    model = mocker.MagicMock()
+    model.get_sentence_embedding_dimension.return_value = 2
+    model.encode.side_effect = lambda sentences, batch_size: np.array(
+        [[len(sentence), 1] for sentence in sentences], dtype=np.float32
+    )
+    mocker.patch("src.app_func.sentence_encoder.create_backend", return_value=model)
+    encoder = SentenceEncoder(cache_dir=str(tmp_path))
+    df = pd.DataFrame(
+        {"id": ["http://arxiv.org/abs/1v1"], "summary": ["a long abstract"]}
+    )
+    df["title"] = "short"
+
+    summary = encoder.encode_sentences(df)
+    title = encoder.encode_sentences(df, col="title")
+    edited = encoder.encode_sentences(df.assign(summary="another abstract"))
+
+    assert summary[0, 0] == 15 and title[0, 0] == 5 and edited[0, 0] == 16
+    assert model.encode.call_count == 3
+    assert embedding_key("1v1", "x") != embedding_key("1v1", "x", col="title")
+    truncated = SentenceEncoder(cache_dir=str(tmp_path), max_seq_length=128)
+    assert truncated.cache is not encoder.cache
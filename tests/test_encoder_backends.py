@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.app_func.encoder_backends import (
+    OnnxBackend,
+    TorchBackend,
+    create_backend,
+    length_sorted_batches,
+    prepare_onnx,
+)
+
+WORDS = "the a of graph neural network protein folding dark matter galaxy quantum learning model data".split()
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    """Small random BERT sentence transformer saved to disk, so the backends
+    can be checked without downloading a model"""
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    path = tmp_path_factory.mktemp("tiny")
+    (path / "vocab.txt").write_text(
+        "\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *WORDS])
+    )
+    BertTokenizerFast(str(path / "vocab.txt")).save_pretrained(path / "bert")
+    config = BertConfig(
+        vocab_size=len(WORDS) + 5,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=128,
+    )
+    BertModel(config).save_pretrained(path / "bert")
+    transformer = models.Transformer(str(path / "bert"), max_seq_length=64)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), "mean")
+    SentenceTransformer(modules=[transformer, pooling, models.Normalize()]).save(
+        str(path / "st")
+    )
+    return str(path / "st")
+
+
+@pytest.fixture(scope="module")
+def sentences():
+    rng = np.random.default_rng(0)
+    # lengths beyond max_seq_length check the truncation
+    return [" ".join(rng.choice(WORDS, rng.integers(1, 100))) for _ in range(60)]
+
+
+@pytest.fixture(scope="module")
+def reference(tiny_model, sentences):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(tiny_model, device="cpu").encode(sentences)
+
+
+def test_length_sorted_batches_respect_token_budget():
+    lengths = np.array([5, 120, 30, 30, 7, 64, 1])
+    batches = length_sorted_batches(lengths, batch_size=3, max_batch_tokens=128)
+
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or len(batch) * lengths[batch].max() <= 128
+    assert batches[0].tolist() == [1]
+
+
+def test_torch_backend_matches_reference(tiny_model, sentences, reference):
+    backend = TorchBackend(tiny_model, max_batch_tokens=256)
+
+    np.testing.assert_allclose(backend.encode(sentences), reference, atol=1e-5)
+    assert backend.encode([]).shape == (0, reference.shape[1])
+
+
+def test_quantized_torch_backend_is_close_to_reference(
+    tiny_model, sentences, reference
+):
+    embeddings = create_backend("torch-int8", tiny_model).encode(sentences)
+
+    assert (embeddings * reference).sum(axis=1).min() > 0.99
+
+
+def test_process_pool_backend_matches_reference(tiny_model, sentences, reference):
+    backend = create_backend("torch", tiny_model, processes=2)
+    try:
+        assert backend.get_sentence_embedding_dimension() == reference.shape[1]
+        np.testing.assert_allclose(backend.encode(sentences), reference, atol=1e-5)
+    finally:
+        backend.close()
+
+
+@pytest.mark.parametrize("quantize, tolerance", [(False, 1e-4), (True, 0.99)])
+def test_onnx_backend_matches_reference(
+    tiny_model, sentences, reference, tmp_path, quantize, tolerance
+):
+    pytest.importorskip("onnxruntime")
+    embeddings = OnnxBackend(
+        tiny_model, quantize=quantize, onnx_dir=str(tmp_path)
+    ).encode(sentences)
+
+    if quantize:
+        assert (embeddings * reference).sum(axis=1).min() > tolerance
+    else:
+        np.testing.assert_allclose(embeddings, reference, atol=tolerance)
+
+
+def test_prepare_onnx_exports_once_without_leaving_temporary_files(
+    tiny_model, tmp_path
+):
+    pytest.importorskip("onnx")
+    path = prepare_onnx(tiny_model, str(tmp_path))
+    exported = os.path.getmtime(path)
+
+    assert prepare_onnx(tiny_model, str(tmp_path)) == path
+    assert os.path.getmtime(path) == exported
+    assert os.listdir(os.path.dirname(path)) == ["model.onnx"]
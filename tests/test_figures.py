@@ -0,0 +1,79 @@
+import base64
+import io
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from src.app_func.figures import (
+    FigureCache,
+    SerializedFigure,
+    figure_key,
+    png_source,
+)
+from src.app_func.network_graph import Network
+from src.app_func.similarity import EDGE_DTYPE
+from src.app_func.visualisation import Visualisation
+
+
+def ring_edges(num_nodes):
+    edges = np.empty(num_nodes, dtype=EDGE_DTYPE)
+    edges["src"] = np.arange(num_nodes)
+    edges["dst"] = (np.arange(num_nodes) + 1) % num_nodes
+    edges["weight"] = 1.0
+    return edges
+
+
+def test_word_cloud_is_sent_as_png():
+    image = np.full((500, 500, 3), 249, dtype=np.uint8)
+    image[100:200, 50:400] = (31, 119, 180)
+
+    lean = Visualisation(terms=object()).display_word_cloud(image)
+    full = Visualisation(terms=object(), lean=False).display_word_cloud(image)
+
+    source = lean.data[0].source
+    assert source.startswith("data:image/png;base64,")
+    decoded = Image.open(io.BytesIO(base64.b64decode(source.split(",", 1)[1])))
+    assert np.array_equal(np.asarray(decoded), image)
+    assert len(lean.to_json()) * 10 < len(full.to_json())
+    assert png_source(image) == source
+
+
+def test_large_lean_graphs_use_webgl_and_rounded_coordinates():
+    titles = [f"paper {node}" for node in range(40)]
+
+    small = Network(webgl_nodes=50).plot_networkgraph(ring_edges(40), titles)
+    large = Network(webgl_nodes=20).plot_networkgraph(ring_edges(40), titles)
+    full = Network(lean=False, webgl_nodes=20).plot_networkgraph(ring_edges(40), titles)
+
+    assert [trace.type for trace in small.data] == ["scatter", "scatter"]
+    assert [trace.type for trace in large.data] == ["scattergl", "scattergl"]
+    assert [trace.type for trace in full.data] == ["scatter", "scatter"]
+    assert np.array_equal(large.data[1].x, np.round(large.data[1].x, 4))
+    assert np.array_equal(large.data[1].customdata, np.arange(40))
+
+
+def test_figure_json_is_cached_by_inputs():
+    cache = FigureCache()
+    figure = Network().plot_networkgraph(ring_edges(5), list("abcde"))
+    key = figure_key(np.arange(5), pd.Series(list("abcde")), "kmeans")
+
+    first = cache.serialized(key, figure)
+    second = cache.serialized(key, None)
+
+    assert isinstance(first, SerializedFigure)
+    assert second.to_json() == first.to_json() == figure.to_json()
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert key != figure_key(np.arange(5), pd.Series(list("abcdf")), "kmeans")
+    assert key == figure_key(np.arange(5), pd.Series(list("abcde")), "kmeans")
+
+
+def test_figure_cache_evicts_least_recently_used():
+    cache = FigureCache(max_bytes=20)
+    figure = SerializedFigure("x" * 10)
+
+    for key in ["a", "b", "a", "c"]:
+        cache.serialized(key, figure)
+
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.bytes == 20
@@ -0,0 +1,96 @@
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.app_func.instrumentation import Instrumentation, input_sizes
+from src.app_func.search_pipeline import SearchPipeline
+from src.app_func.visualisation import Visualisation
+
+
+def test_stages_are_collected_per_request_with_cache_growth():
+    metrics = Instrumentation(textfile=None)
+    counts = {"query": (3, 1)}
+    encode = metrics.instrument(
+        "encode", lambda df, num_papers: np.ones(1 << 20), lambda: counts
+    )
+
+    with metrics.request(search_term="graphs") as request:
+        counts["query"] = (5, 2)
+        encode(pd.DataFrame({"summary": ["a", "b"]}), num_papers=50)
+        with metrics.stage("fetch", lambda: counts):
+            counts["query"] = (6, 2)
+
+    assert metrics.last_request is request
+    assert request["params"] == {"search_term": "graphs"}
+    assert request["seconds"] >= sum(stage["seconds"] for stage in request["stages"])
+    encode_stage, fetch_stage = request["stages"]
+    assert encode_stage["stage"] == "encode"
+    assert encode_stage["sizes"] == {"num_papers": 50, "rows": 2}
+    assert encode_stage["caches"] == {}
+    assert fetch_stage["offset"] >= encode_stage["offset"] + encode_stage["seconds"]
+    assert fetch_stage["caches"]["query"] == {"hits": 1, "misses": 0, "hit_rate": 1.0}
+    for stage in request["stages"]:
+        assert stage["cpu_seconds"] >= 0 and stage["peak_rss_bytes"] >= 0
+    # the array the encoder returned is still resident
+    assert encode_stage["rss_delta_bytes"] >= 4 << 20
+
+
+def test_input_sizes_look_into_tuples():
+    encoded = (pd.DataFrame({"a": range(3)}), np.zeros((3, 2)))
+
+    assert input_sizes((encoded,), {"num_links": 10, "flag": True}) == {
+        "num_links": 10,
+        "rows": 3,
+    }
+
+
+def test_requests_are_logged_as_json_and_exported_to_prometheus(tmp_path, caplog):
+    textfile = tmp_path / "metrics.prom"
+    metrics = Instrumentation(textfile=str(textfile))
+    for _ in range(2):
+        with caplog.at_level(logging.INFO, "src.app_func.instrumentation"):
+            with metrics.request(search_term="graphs"):
+                with metrics.stage("layout", lambda: {"terms": (1, 1)}):
+                    pass
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["stages"][0]["stage"] == "layout"
+    text = textfile.read_text()
+    assert "arxiv_search_requests_total 2" in text
+    assert 'arxiv_search_stage_runs_total{stage="layout"} 2' in text
+    assert "# TYPE arxiv_search_stage_seconds_total counter" in text
+    assert 'arxiv_search_cache_hits_total{cache="terms"}' not in text
+
+    metrics.record_cache("terms", 4, 1)
+    assert 'arxiv_search_cache_hits_total{cache="terms"} 4' in metrics.prometheus_text()
+
+
+def test_search_pipeline_records_executed_and_reused_stages(mocker):
+    mocker.patch("src.app_func.search_pipeline.Network")
+    mocker.patch("src.app_func.search_pipeline.Visualisation")
+    mocker.patch("src.app_func.search_pipeline.PaperClusters")
+    connector = mocker.MagicMock()
+    connector.query_arxiv.return_value = (True, pd.DataFrame({"summary": ["a"]}))
+    connector.encode_papers.return_value = (pd.DataFrame(columns=["id", "title"]), None)
+    metrics = Instrumentation(textfile=None)
+    pipeline = SearchPipeline(connector, metrics=metrics)
+    pipeline.network.plot_networkgraph.return_value = "figure"
+
+    pipeline.run("graphs", 50, 50, 50)
+    pipeline.run("graphs", 50, 50, 10)
+
+    request = pipeline.last_request
+    assert [stage["stage"] for stage in request["stages"]] == [
+        "similarity",
+        "layout",
+        "network_graph",
+    ]
+    assert "fetch" in request["reused"] and "encode" in request["reused"]
+    assert 'arxiv_search_cache_hits_total{cache="stages"} 9' in (
+        metrics.prometheus_text()
+    )
+
+    figure = Visualisation().stage_waterfall(request)
+    assert list(figure.data[0].y) == ["similarity", "layout", "network_graph"]
@@ -0,0 +1,119 @@
+import numpy as np
+
+from src.app_func.layout import ForceLayout
+from src.app_func.network_graph import Network
+from src.app_func.similarity import EDGE_DTYPE
+
+
+def clustered_graph(num_clusters, size, seed=0):
+    """Dense clusters chained together by single edges"""
+    rng = np.random.default_rng(seed)
+    src, dst = [], []
+    for cluster in range(num_clusters):
+        nodes = cluster * size + np.arange(size)
+        for _ in range(3 * size):
+            a, b = rng.choice(nodes, 2, replace=False)
+            src.append(a)
+            dst.append(b)
+        if cluster:
+            src.append(nodes[0] - 1)
+            dst.append(nodes[0])
+    return num_clusters * size, np.array(src), np.array(dst)
+
+
+def mean_edge_length(positions, src, dst):
+    return np.linalg.norm(positions[src] - positions[dst], axis=1).mean()
+
+
+def mean_pair_distance(positions, seed=1):
+    rng = np.random.default_rng(seed)
+    a, b = rng.integers(0, len(positions), (2, 2000))
+    return np.linalg.norm(positions[a] - positions[b], axis=1).mean()
+
+
+def test_layout_is_deterministic():
+    num_nodes, src, dst = clustered_graph(4, 20)
+    first = ForceLayout(seed=3).compute(num_nodes, src, dst)
+    second = ForceLayout(seed=3).compute(num_nodes, src, dst)
+
+    assert first.shape == (num_nodes, 2)
+    np.testing.assert_array_equal(first, second)
+
+
+def test_grid_approximation_keeps_linked_nodes_close():
+    num_nodes, src, dst = clustered_graph(20, 50)
+    exact = ForceLayout(exact_threshold=num_nodes).compute(num_nodes, src, dst)
+    grid = ForceLayout(exact_threshold=0).compute(num_nodes, src, dst)
+
+    assert np.isfinite(grid).all()
+    for positions in [exact, grid]:
+        assert mean_edge_length(positions, src, dst) < 0.5 * mean_pair_distance(
+            positions
+        )
+
+
+def test_grid_repulsion_approximates_exact_repulsion():
+    positions = np.random.default_rng(0).random((2000, 2)).T.copy()
+    layout = ForceLayout()
+    exact = layout._exact_repulsion(positions, 0.02)
+    grid = layout._grid_repulsion(positions, 0.02, layout._cells(positions))
+
+    cosine = (exact * grid).sum(axis=0) / (
+        np.linalg.norm(exact, axis=0) * np.linalg.norm(grid, axis=0)
+    )
+    assert np.median(cosine) > 0.95
+
+
+def test_warm_start_keeps_known_nodes_and_places_new_ones_nearby():
+    num_nodes, src, dst = clustered_graph(4, 20)
+    layout = ForceLayout()
+    previous = layout.compute(num_nodes, src, dst)
+    cold_iterations = layout.iterations
+
+    initial = previous.copy()
+    initial[5] = np.nan
+    warm = layout.compute(num_nodes, src, dst, initial=initial)
+
+    assert layout.iterations < cold_iterations
+    known = np.arange(num_nodes) != 5
+    extent = np.ptp(previous, axis=0).max()
+    assert np.abs(warm[known] - previous[known]).max() < 0.1 * extent
+    neighbours = np.concatenate([dst[src == 5], src[dst == 5]])
+    assert np.linalg.norm(warm[5] - warm[neighbours].mean(axis=0)) < 0.25 * extent
+
+
+def test_network_plot_reuses_positions_of_existing_nodes():
+    edges = np.array(
+        [(1, 2, 0.9), (1, 3, 0.8), (2, 3, 0.7), (3, 4, 0.6)], dtype=EDGE_DTYPE
+    )
+    titles = ["unlinked", "a", "b", "c", "d"]
+    keys = np.array(["u", "a", "b", "c", "d", "e"])
+    network = Network()
+    layout = network.compute_layout(edges, keys=keys)
+    fig = network.plot_networkgraph(edges, titles, layout=layout)
+    edge_trace, node_trace = fig.data
+
+    assert list(node_trace.customdata) == [1, 2, 3, 4]
+    assert list(node_trace.text) == ["a", "b", "c", "d"]
+    assert len(edge_trace.x) == 3 * len(edges)
+    assert np.isnan(np.asarray(edge_trace.x, dtype=float)[2::3]).all()
+    assert list(node_trace.marker.color) == [2, 2, 3, 1]
+    assert set(network.positions) == {"a", "b", "c", "d"}
+
+    before = dict(network.positions)
+    grown = np.concatenate([edges, np.array([(1, 5, 0.9)], dtype=EDGE_DTYPE)])
+    layout = network.compute_layout(grown, keys=keys)
+    assert list(layout.ids) == [1, 2, 3, 4, 5]
+    moved = [
+        np.linalg.norm(np.subtract(network.positions[n], before[n])) for n in before
+    ]
+    assert max(moved) < np.ptp(layout.positions, axis=0).max()
+
+
+def test_papers_with_the_same_title_stay_separate_nodes():
+    edges = np.array([(0, 1, 0.9), (1, 2, 0.8)], dtype=EDGE_DTYPE)
+    fig = Network().plot_networkgraph(edges, ["Survey", "Survey", "Benchmark"])
+    node_trace = fig.data[1]
+
+    assert list(node_trace.customdata) == [0, 1, 2]
+    assert list(node_trace.text) == ["Survey", "Survey", "Benchmark"]
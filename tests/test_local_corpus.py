@@ -0,0 +1,152 @@
+import glob
+import json
+import os
+import zlib
+
+import numpy as np
+
+from src.app_func.datapipeline import DataPipeline
+from src.app_func.embedding_cache import embedding_key
+from src.app_func.local_corpus import LocalCorpus, build_term_index
+
+
+class HashingModel:
+    """Deterministic bag-of-words stand-in for a sentence transformer"""
+
+    def encode(self, sentences, batch_size=32):
+        vectors = np.zeros((len(sentences), 32), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            for word in sentence.lower().split():
+                vectors[i, zlib.crc32(word.encode()) % 32] += 1.0
+        return vectors
+
+    def get_sentence_embedding_dimension(self):
+        return 32
+
+
+def snapshot_line(paper_id, title, abstract, versions=1, year=2020):
+    return json.dumps(
+        {
+            "id": paper_id,
+            "title": title,
+            "abstract": abstract,
+            "authors": "A. One, B. Two",
+            "authors_parsed": [["One", "A.", ""], ["Two", "B.", ""]],
+            "categories": "cs.LG stat.ML",
+            "journal-ref": None,
+            "doi": None,
+            "versions": [
+                {"version": f"v{v + 1}", "created": f"Mon, 6 Jan {year} 10:00:00 GMT"}
+                for v in range(versions)
+            ],
+            "update_date": f"{year}-01-06",
+        }
+    )
+
+
+def build_store(path):
+    lines = [
+        snapshot_line(f"2001.{i:05d}", f"Graph paper {i}", f"graph networks {i}")
+        for i in range(5)
+    ] + [
+        snapshot_line(f"2002.{i:05d}", f"Vision paper {i}", f"image pixels {i}")
+        for i in range(5)
+    ]
+    corpus = LocalCorpus(str(path))
+    assert corpus.ingest(iter(lines), HashingModel(), batch_size=3) == 10
+    return corpus
+
+
+def test_ingest_and_keyword_search(tmp_path):
+    corpus = build_store(tmp_path)
+
+    df = corpus.search("graph networks", 10)
+
+    assert len(corpus.manifest["segments"]) == 4
+    assert sorted(df["arxiv_id"]) == [f"2001.{i:05d}" for i in range(5)]
+    assert df["authors"][0] == ["A. One", "B. Two"]
+    assert df["categories"][0] == ["cs.LG", "stat.ML"]
+    assert df["published"][0] == "2020-01-06T10:00:00Z"
+    assert df["embedding"][0].shape == (32,)
+
+
+def test_keyword_search_matches_whole_words_from_the_term_index(tmp_path):
+    corpus = build_store(tmp_path)
+    lines = [
+        snapshot_line("2003.00001", "A paragraph", "on writing", year=2021),
+        snapshot_line("2003.00002", "Graph theory", "Graph colouring", year=2019),
+    ]
+    corpus.ingest(iter(lines), HashingModel())
+
+    df = corpus.search("GRAPH", 10)
+    # stores written before the term index are indexed on first use
+    for path in glob.glob(os.path.join(tmp_path, "*.terms.npy")):
+        os.remove(path)
+    reopened = LocalCorpus(str(tmp_path)).search("graph", 10)
+
+    # "paragraph" is not a match, the 2019 paper is the oldest
+    assert df["arxiv_id"].tolist() == [f"2001.{i:05d}" for i in range(5)] + [
+        "2003.00002"
+    ]
+    assert reopened["arxiv_id"].tolist() == df["arxiv_id"].tolist()
+    assert corpus.search("graph pixels", 10).empty
+
+
+def test_term_index_postings():
+    terms, postings = build_term_index(["Graph, paragraph graph", "graphs", ""])
+
+    assert len(terms) == 3 and np.all(np.diff(terms["hash"].astype(float)) > 0)
+    starts = np.r_[0, terms["end"][:-1]]
+    words = sorted(
+        postings[start:end].tolist() for start, end in zip(starts, terms["end"])
+    )
+    assert words == [[0], [0], [1]]
+
+
+def test_semantic_search_scans_in_chunks(mocker, tmp_path):
+    corpus = build_store(tmp_path)
+    whole = corpus.search("image pixels", 4, model=HashingModel())
+
+    mocker.patch("src.app_func.local_corpus.SCAN_ROWS", 2)
+    chunked = corpus.search("image pixels", 4, model=HashingModel())
+
+    assert chunked["arxiv_id"].tolist() == whole["arxiv_id"].tolist()
+
+
+def test_semantic_search_and_delta_supersedes(tmp_path):
+    build_store(tmp_path)
+    delta = [snapshot_line("2002.00001", "Vision paper 1", "image pixels v2", 2)]
+    LocalCorpus(str(tmp_path)).ingest(iter(delta), HashingModel())
+
+    corpus = LocalCorpus(str(tmp_path))
+    df = corpus.search("image pixels", 5, model=HashingModel())
+
+    assert len(corpus) == 10
+    assert set(df["arxiv_id"]) == {f"2002.{i:05d}" for i in range(5)}
+    revised = df[df["arxiv_id"] == "2002.00001"].iloc[0]
+    assert revised["version"] == 2
+    assert revised["id"] == "http://arxiv.org/abs/2002.00001v2"
+
+
+def test_query_arxiv_from_local_corpus(mocker, tmp_path):
+    build_store(tmp_path / "store")
+    encoder = mocker.patch(
+        "src.app_func.datapipeline.get_sentence_encoder"
+    ).return_value
+    encoder.model = HashingModel()
+    encoder.model_name = "all-MiniLM-L6-v2"
+    encoder.cache = mocker.MagicMock()
+    connector = DataPipeline(
+        cache_dir=str(tmp_path / "cache"), local_corpus=str(tmp_path / "store")
+    )
+
+    res, df = connector.query_arxiv("graph networks", 3)
+
+    assert res
+    assert len(df) == 3
+    assert "embedding" not in df
+    assert encoder.cache.put.call_count == 1
+    # keyed by the cleaned abstract the pipeline encodes
+    cleaned = connector.preprocessing_pipeline(df)
+    keys = encoder.cache.put.call_args[0][0]
+    assert keys[0] == embedding_key(cleaned["id"][0], cleaned["summary"][0])
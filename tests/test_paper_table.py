@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from src.app_func.atom_parser import parse_feed
+from src.app_func.datapipeline import DataPipeline
+from src.app_func.paper_table import clean_text, paper_table, word_counts
+from src.app_func.visualisation import Visualisation
+
+from tests.test_atom_parser import FEED
+
+
+def papers() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": ["a", "b", "c", "d"],
+            "title": ["\\textbf{Graph}\nNets}", "Trees", "Copy", "Empty"],
+            "summary": ["Nodes and\nedges", "Roots", "Nodes and\nedges", None],
+            "published": ["2019-05-01T00:00:00Z"] * 2 + ["2021-01-01T00:00:00Z"] * 2,
+            "primary_category": ["cs.LG", "cs.DS", "cs.LG", "cs.LG"],
+        }
+    )
+
+
+def test_paper_table_uses_compact_column_types():
+    table = paper_table(
+        {
+            "id": ["a", "b"],
+            "published": ["2017-06-12T17:57:34Z", None],
+            "primary_category": ["cs.CL", "cs.CL"],
+            "version": [7, 1],
+            "authors": [["A"], ["B", "C"]],
+        }
+    )
+
+    assert isinstance(table["published"].dtype, pd.DatetimeTZDtype)
+    assert table["published"].isna().tolist() == [False, True]
+    assert table["primary_category"].dtype == "category"
+    assert table["version"].dtype == np.int16
+    assert table["authors"].tolist() == [["A"], ["B", "C"]]
+
+
+def test_parsed_feeds_are_paper_tables_whatever_the_chunk_size():
+    table = parse_feed(FEED)
+
+    assert table["primary_category"].dtype == "category"
+    pd.testing.assert_frame_equal(parse_feed(FEED, chunk_size=7), table)
+
+
+def test_preprocessing_keeps_unique_summaries_without_mutating_input():
+    df = papers()
+    before = df.copy()
+    table = DataPipeline.preprocessing_pipeline(None, df)
+
+    pd.testing.assert_frame_equal(df, before)
+    assert table["id"].tolist() == ["a", "b"]
+    assert table.index.tolist() == [0, 1]
+    assert table["title"].tolist() == ["Graph Nets", "Trees"]
+    assert table["summary"].tolist() == ["Nodes and edges", "Roots"]
+    assert table["year_published"].tolist() == [2019, 2019]
+
+
+def test_preprocessing_keeps_empty_columns_the_charts_read():
+    df = papers().assign(journal_ref=None)
+
+    table = DataPipeline.preprocessing_pipeline(None, df)
+
+    assert table["journal_ref"].isna().all()
+    assert Visualisation().published_bar(table) is not None
+
+
+def test_text_helpers():
+    assert clean_text(["\\textbf{a}\nb", None]) == ["a b", None]
+    assert word_counts(pd.Series(["two words", None])).tolist() == [2, 0]
+
+
+def test_charts_do_not_add_columns():
+    df = papers()
+    columns = df.columns.tolist()
+    visualisation = Visualisation()
+
+    visualisation.num_words_title(df)
+    visualisation.num_words_summary(df)
+    visualisation.year_published(df)
+
+    assert df.columns.tolist() == columns
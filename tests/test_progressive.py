@@ -0,0 +1,135 @@
+import threading
+
+import pandas as pd
+
+from src.app_func.progressive import ProgressiveSearch, run_search
+from src.app_func.result_store import ResultStore, result_key
+
+
+class StubPipeline:
+    """SearchPipeline stand-in whose later pages wait until released"""
+
+    def __init__(self, num_pages=3, page_size=10):
+        self.num_pages = num_pages
+        self.page_size = page_size
+        self.release = threading.Event()
+        self.closed = threading.Event()
+        self.partial_runs = []
+        self.complete_runs = 0
+        self.connector = self
+
+    def query_arxiv_pages(self, search_term, num_results, first_page_size):
+        try:
+            for page in range(1, self.num_pages + 1):
+                if page > 1:
+                    self.release.wait(5)
+                papers = pd.DataFrame({"id": range(page * self.page_size)})
+                yield papers, page == self.num_pages
+        finally:
+            self.closed.set()
+
+    def run_partial(self, fetched, search_term, **params):
+        self.partial_runs.append(len(fetched))
+        return {"df": fetched}
+
+    def run(self, search_term, num_searches, **params):
+        self.complete_runs += 1
+        return {"df": pd.DataFrame({"id": range(self.num_pages * self.page_size)})}
+
+
+def wait_for_version(search, version):
+    for _ in range(500):
+        if search.snapshot()["version"] >= version:
+            return search.snapshot()
+        threading.Event().wait(0.01)
+    raise AssertionError("search did not publish")
+
+
+def test_first_page_is_shown_before_later_pages_arrive():
+    pipeline = StubPipeline()
+    search = ProgressiveSearch(pipeline, "gnn", 30, 50, 50)
+
+    state = wait_for_version(search, 1)
+    assert state["num_fetched"] == 10 and not state["done"]
+
+    pipeline.release.set()
+    assert search.join(5)
+    state = search.snapshot()
+    assert state["done"] and not state["cancelled"]
+    assert state["num_fetched"] == 30 and state["version"] == 3
+    # the last page is run once, as the complete search
+    assert pipeline.partial_runs == [10, 20]
+    assert pipeline.complete_runs == 1
+
+
+def test_cancelled_search_stops_paging():
+    pipeline = StubPipeline()
+    search = ProgressiveSearch(pipeline, "gnn", 30, 50, 50)
+    wait_for_version(search, 1)
+
+    search.cancel()
+    pipeline.release.set()
+    assert search.join(5)
+
+    state = search.snapshot()
+    assert state["done"] and state["cancelled"]
+    assert state["num_fetched"] == 10
+    assert pipeline.closed.is_set()
+    assert pipeline.complete_runs == 0
+
+
+def test_new_search_supersedes_the_one_loading():
+    pipeline = StubPipeline()
+    first = ProgressiveSearch(pipeline, "gnn", 30, 50, 50)
+    wait_for_version(first, 1)
+
+    second = ProgressiveSearch(pipeline, "vision", 30, 50, 50, supersedes=first)
+    pipeline.release.set()
+    assert second.join(5)
+
+    assert first.snapshot()["cancelled"]
+    assert second.snapshot()["num_fetched"] == 30
+    assert pipeline.complete_runs == 1
+
+
+def test_blocking_search_stops_the_one_loading_first():
+    pipeline = StubPipeline()
+    loading = ProgressiveSearch(pipeline, "gnn", 30, 50, 50)
+    wait_for_version(loading, 1)
+    overlapped = []
+    run = pipeline.run
+
+    def blocking_run(*args, **kwargs):
+        overlapped.append(not loading.join(0))
+        return run(*args, **kwargs)
+
+    pipeline.run = blocking_run
+    threading.Timer(0.05, pipeline.release.set).start()
+    results = run_search(
+        pipeline, "vision", 30, 50, 50, store=ResultStore(), supersedes=loading
+    )
+
+    assert overlapped == [False]
+    assert loading.snapshot()["cancelled"]
+    assert pipeline.partial_runs == [10] and pipeline.complete_runs == 1
+    assert len(results["df"]) == 30
+
+
+def test_stored_results_skip_paging():
+    pipeline = StubPipeline()
+    store = ResultStore()
+    key = result_key(
+        "gnn",
+        num_searches=30,
+        num_papers=50,
+        num_links=50,
+        cluster_method="kmeans",
+        backbone="top",
+    )
+    store.get_or_compute(key, lambda: {"df": pd.DataFrame({"id": range(30)})})
+
+    search = ProgressiveSearch(pipeline, "gnn", 30, 50, 50, store=store)
+    assert search.join(5)
+
+    assert search.snapshot()["num_fetched"] == 30
+    assert pipeline.partial_runs == [] and pipeline.complete_runs == 0
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from src.app_func.ann_index import AnnIndex
+# imported through similarity, which sees the class as app_func.quantization
+from src.app_func.similarity import (
+    QuantizedEmbeddings,
+    normalize_embeddings,
+    pairwise_scores,
+    top_k_edges,
+    top_k_neighbours,
+)
+
+
+def clustered_vectors(num_vectors, dim=384, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(20, dim))
+    return centres[rng.integers(0, 20, num_vectors)] + rng.normal(
+        size=(num_vectors, dim)
+    )
+
+
+@pytest.mark.parametrize(
+    "dtype, ratio, tolerance", [("float16", 2, 1e-3), ("int8", 4, 2e-2)]
+)
+def test_quantized_vectors_are_compact_and_close(dtype, ratio, tolerance):
+    vectors = normalize_embeddings(clustered_vectors(500))
+    quantized = QuantizedEmbeddings.quantize(vectors, dtype)
+
+    assert quantized.dtype == dtype
+    assert quantized.nbytes < vectors.nbytes / ratio * 1.05
+    restored = quantized.dequantize()
+    np.testing.assert_allclose(np.linalg.norm(restored, axis=1), 1, rtol=1e-5)
+    assert np.abs(restored - vectors).max() < tolerance
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_scores_equal_scores_of_the_restored_vectors(dtype):
+    vectors = clustered_vectors(300)
+    quantized = QuantizedEmbeddings.quantize(vectors, dtype)
+    restored = quantized.dequantize()
+    queries = normalize_embeddings(vectors[:7])
+
+    np.testing.assert_allclose(
+        pairwise_scores(quantized, quantized), restored @ restored.T, atol=1e-5
+    )
+    np.testing.assert_allclose(
+        pairwise_scores(queries, quantized), queries @ restored.T, atol=1e-5
+    )
+    np.testing.assert_allclose(
+        pairwise_scores(quantized[:7], queries), restored[:7] @ queries.T, atol=1e-5
+    )
+
+
+def test_top_k_on_int8_matches_float32():
+    vectors = clustered_vectors(1000)
+    quantized = QuantizedEmbeddings.quantize(vectors, "int8")
+
+    exact, _ = top_k_neighbours(vectors, 10)
+    found, weights = top_k_neighbours(quantized, 10, max_block_bytes=1 << 16)
+    overlap = np.mean([len(np.intersect1d(a, b)) / 10 for a, b in zip(found, exact)])
+    assert overlap > 0.95
+    assert (np.diff(weights, axis=1) <= 0).all()
+
+    exact_edges = top_k_edges(vectors, 200)
+    edges = top_k_edges(quantized, 200)
+    shared = set(zip(edges["src"], edges["dst"])) & set(
+        zip(exact_edges["src"], exact_edges["dst"])
+    )
+    assert len(shared) > 0.95 * 200
+
+
+def test_int8_index_searches_saves_and_loads(tmp_path):
+    vectors = clustered_vectors(3000, dim=32)
+    index = AnnIndex(32, exact_threshold=1000, quantization="int8")
+    index.add(map(str, range(3000)), vectors)
+
+    positions, scores = index.search(vectors[:20], 5)
+    assert (positions[:, 0] == np.arange(20)).all()
+    np.testing.assert_allclose(scores[:, 0], 1, atol=1e-3)
+
+    index.save(str(tmp_path))
+    loaded = AnnIndex.load(str(tmp_path))
+    assert loaded.quantization == "int8"
+    np.testing.assert_array_equal(loaded.search(vectors[:20], 5)[0], positions)
+    np.testing.assert_allclose(
+        loaded.vector("3"), normalize_embeddings(vectors[[3]])[0], atol=2e-2
+    )
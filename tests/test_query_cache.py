@@ -0,0 +1,61 @@
+import time
+
+import pandas as pd
+
+from src.app_func.datapipeline import DataPipeline
+from src.app_func.query_cache import QueryCache
+
+
+def make_pipeline(mocker, atom_server, tmp_path):
+    mocker.patch("src.app_func.datapipeline.get_sentence_encoder")
+    return DataPipeline(
+        cache_dir=str(tmp_path),
+        base_url=atom_server.base_url,
+        query_cache=QueryCache(str(tmp_path / "queries")),
+    )
+
+
+def test_query_arxiv_served_from_cache(mocker, atom_server, tmp_path):
+    connector = make_pipeline(mocker, atom_server, tmp_path)
+
+    res, df = connector.query_arxiv("graph neural", 20)
+    res_cached, df_cached = connector.query_arxiv("Graph  Neural", 10)
+
+    assert res and res_cached
+    assert len(atom_server.requests) == 1
+    pd.testing.assert_frame_equal(df_cached, df.head(10))
+    assert connector.query_cache.stats()["memory_hits"] == 1
+
+
+def test_larger_request_refetches_unless_exhausted(mocker, atom_server, tmp_path):
+    connector = make_pipeline(mocker, atom_server, tmp_path)
+
+    connector.query_arxiv("graph", 10)
+    connector.query_arxiv("graph", 20)
+    assert len(atom_server.requests) == 2
+
+    connector.query_arxiv("mesh", 100)
+    connector.query_arxiv("mesh", 200)
+    assert len(atom_server.requests) == 3
+
+
+def test_disk_tier_and_ttl(tmp_path):
+    df = pd.DataFrame({"summary": ["a", "b"]})
+    QueryCache(str(tmp_path)).put("key", 2, df)
+
+    cache = QueryCache(str(tmp_path))
+    pd.testing.assert_frame_equal(cache.get("key", 2), df)
+    assert cache.stats()["disk_hits"] == 1
+
+    expired = QueryCache(str(tmp_path), disk_ttl=0.0)
+    time.sleep(0.01)
+    assert expired.get("key", 2) is None
+    assert expired.stats()["misses"] == 1
+
+
+def test_empty_results_stay_in_memory_only(tmp_path):
+    cache = QueryCache(str(tmp_path))
+    cache.put("key", 10, pd.DataFrame())
+
+    assert cache.get("key", 10).empty
+    assert QueryCache(str(tmp_path)).get("key", 10) is None
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.app_func.instrumentation import Instrumentation
+from src.app_func.result_store import ResultStore, estimate_bytes, result_key
+
+
+def test_result_key_normalizes_the_search_term():
+    assert result_key(" Graph  Neural+Networks", num_links=50) == result_key(
+        "graph neural networks", num_links=50
+    )
+    assert result_key("gnn", num_links=50) != result_key("gnn", num_links=100)
+
+
+def test_store_evicts_least_recently_used_over_budget():
+    store = ResultStore(max_bytes=3000)
+    for name in "abc":
+        store.get_or_compute(name, lambda: np.zeros(125))  # 1000 bytes each
+    store.get_or_compute("a", lambda: pytest.fail("a is stored"))
+    store.get_or_compute("d", lambda: np.zeros(125))
+    store.get_or_compute("e", lambda: np.zeros(1000))  # over budget, not kept
+
+    stats = store.stats()
+    assert stats["entries"] == 3 and stats["bytes"] == 3000
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 5
+    calls = []
+    store.get_or_compute("b", lambda: calls.append("b"))
+    store.get_or_compute("c", lambda: pytest.fail("c is stored"))
+    assert calls == ["b"]
+
+
+def test_expired_and_none_results_are_recomputed():
+    store = ResultStore(ttl=0.05)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None if len(calls) == 1 else "papers"
+
+    assert store.get_or_compute("gnn", compute) is None
+    assert store.get_or_compute("gnn", compute) == "papers"
+    assert store.get_or_compute("gnn", compute) == "papers"
+    time.sleep(0.1)
+    store.get_or_compute("gnn", compute)
+    assert len(calls) == 3
+
+
+def test_concurrent_lookups_wait_for_one_computation():
+    metrics = Instrumentation(textfile=None)
+    store = ResultStore(metrics=metrics)
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"labels": ["Paper A"]}
+
+    def lookup():
+        results.append(store.get_or_compute("transformers", compute))
+
+    threads = [threading.Thread(target=lookup) for _ in range(10)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while store.stats()["coalesced"] < 9:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"labels": ["Paper A"]}] * 10
+    assert store.stats()["hit_rate"] == 0.9
+    assert 'arxiv_search_cache_hits_total{cache="results"} 9' in (
+        metrics.prometheus_text()
+    )
+
+
+def test_waiters_receive_the_error_of_the_computation():
+    store = ResultStore()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("arXiv API request failed")
+
+    def lookup():
+        try:
+            store.get_or_compute("gnn", compute)
+        except RuntimeError as error:
+            errors.append(str(error))
+
+    owner = threading.Thread(target=lookup)
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lookup)
+    waiter.start()
+    while store.stats()["coalesced"] < 1:
+        time.sleep(0.01)
+    release.set()
+    owner.join()
+    waiter.join()
+
+    assert errors == ["arXiv API request failed"] * 2
+    assert store.get_or_compute("gnn", lambda: "papers") == "papers"
+
+
+def test_failing_keep_does_not_block_later_lookups():
+    store = ResultStore()
+
+    def keep(value):
+        raise ValueError("unreadable result")
+
+    with pytest.raises(ValueError, match="unreadable result"):
+        store.get_or_compute("gnn", lambda: "partial", keep=keep)
+
+    assert "gnn" not in store
+    finished = []
+    lookup = threading.Thread(
+        target=lambda: finished.append(store.get_or_compute("gnn", lambda: "papers"))
+    )
+    lookup.start()
+    lookup.join(5)
+    assert finished == ["papers"]
+
+
+def test_estimate_bytes_counts_nested_results():
+    assert (
+        estimate_bytes({"a": np.zeros(10), "b": [np.zeros(5), (np.zeros(5),)]}) == 160
+    )
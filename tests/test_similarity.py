@@ -0,0 +1,61 @@
+import numpy as np
+
+from src.app_func.similarity import (
+    knn_edges,
+    normalize_embeddings,
+    top_k_edges,
+    top_k_neighbours,
+)
+
+
+def brute_force(embeddings):
+    vectors = normalize_embeddings(embeddings)
+    return vectors @ vectors.T
+
+
+def test_top_k_edges_matches_brute_force():
+    embeddings = np.random.default_rng(0).normal(size=(57, 8))
+    scores = brute_force(embeddings)
+    src, dst = np.triu_indices(len(embeddings), k=1)
+    expected = np.sort(scores[src, dst])[::-1][:40]
+
+    edges = top_k_edges(embeddings, 40, max_block_bytes=4 * 57 * 5)
+
+    assert np.all(edges["src"] < edges["dst"])
+    np.testing.assert_allclose(edges["weight"], expected, rtol=1e-5)
+    np.testing.assert_allclose(
+        edges["weight"], scores[edges["src"], edges["dst"]], rtol=1e-5
+    )
+
+
+def test_top_k_edges_returns_all_pairs_when_k_is_large():
+    embeddings = np.random.default_rng(1).normal(size=(6, 4))
+
+    edges = top_k_edges(embeddings, 100)
+
+    assert len(edges) == 15
+    assert np.all(np.diff(edges["weight"]) <= 0)
+
+
+def test_top_k_neighbours_and_knn_edges():
+    embeddings = np.random.default_rng(2).normal(size=(30, 5))
+    scores = brute_force(embeddings)
+    np.fill_diagonal(scores, -np.inf)
+
+    indices, weights = top_k_neighbours(embeddings, 3, max_block_bytes=4 * 30 * 4)
+
+    np.testing.assert_array_equal(indices, np.argsort(-scores, axis=1)[:, :3])
+    edges = knn_edges(indices, weights)
+    pairs = set(zip(edges["src"].tolist(), edges["dst"].tolist()))
+    assert len(pairs) == len(edges)
+    assert all(src < dst for src, dst in pairs)
+
+
+def test_pairwise_cosine_similarity_keeps_strongest_links(mocker):
+    from src.app_func.sentence_encoder import SentenceEncoder
+
+    mocker.patch("src.app_func.sentence_encoder.create_backend")
+    embeddings = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]])
+    edges = SentenceEncoder().pairwise_cosine_similarity(embeddings, 1)
+
+    assert edges[["src", "dst"]].tolist() == [(0, 1)]
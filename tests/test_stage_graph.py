@@ -0,0 +1,68 @@
+import pandas as pd
+
+from src.app_func.search_pipeline import SearchPipeline
+from src.app_func.stage_graph import StageGraph
+
+
+def test_stage_reruns_only_when_inputs_change():
+    graph = StageGraph()
+    graph.add_stage("load", lambda size: list(range(size)), params=["size"])
+    graph.add_stage("total", lambda data, scale: sum(data) * scale, ["load"], ["scale"])
+
+    assert graph.run("total", size=4, scale=1) == 6
+    assert graph.executed == ["load", "total"]
+
+    assert graph.run("total", size=4, scale=2) == 12
+    assert graph.executed == ["total"]
+
+    assert graph.run("total", size=4, scale=2) == 12
+    assert graph.executed == []
+
+    assert graph.run("total", size=5, scale=2) == 20
+    assert graph.executed == ["load", "total"]
+
+
+def test_search_pipeline_reuses_upstream_stages(mocker):
+    mocker.patch("src.app_func.search_pipeline.Network")
+    mocker.patch("src.app_func.search_pipeline.Visualisation")
+    mocker.patch("src.app_func.search_pipeline.PaperClusters")
+    connector = mocker.MagicMock()
+    connector.query_arxiv.return_value = (True, pd.DataFrame({"summary": ["a"]}))
+    connector.encode_papers.return_value = (pd.DataFrame(columns=["id", "title"]), None)
+    pipeline = SearchPipeline(connector)
+    pipeline.network.plot_networkgraph.return_value = "figure"
+
+    pipeline.run("graphs", 50, 50, 50)
+    results = pipeline.run("graphs", 50, 50, 10)
+
+    assert results["network_graph"] == "figure"
+    assert connector.query_arxiv.call_count == 1
+    assert connector.encode_papers.call_count == 1
+    assert connector.similarity_links.call_count == 2
+    assert pipeline.network.plot_networkgraph.call_count == 2
+    assert pipeline.visualisation.generate_word_cloud.call_count == 1
+
+
+def test_search_pipeline_without_results(mocker):
+    connector = mocker.MagicMock()
+    connector.query_arxiv.return_value = (False, None)
+
+    assert SearchPipeline(connector).run("nothing", 50, 50, 50) is None
+    connector.preprocessing_pipeline.assert_not_called()
+
+
+def test_partial_search_runs_on_the_papers_received(mocker):
+    mocker.patch("src.app_func.search_pipeline.Network")
+    mocker.patch("src.app_func.search_pipeline.Visualisation")
+    mocker.patch("src.app_func.search_pipeline.PaperClusters")
+    connector = mocker.MagicMock()
+    connector.encode_papers.return_value = (pd.DataFrame(columns=["id", "title"]), None)
+    pipeline = SearchPipeline(connector)
+    fetched = pd.DataFrame({"summary": ["a", "b"]})
+
+    results = pipeline.run_partial(fetched, "graphs", 50, 50)
+
+    assert results is not None
+    assert connector.query_arxiv.call_count == 0
+    connector.preprocessing_pipeline.assert_called_once_with(fetched)
+    assert pipeline.last_request["params"]["num_searches"] == 2
@@ -0,0 +1,39 @@
+from src.app_func import startup
+from src.app_func.sentence_encoder import get_sentence_encoder
+from src.app_func.startup import check_startup, import_report
+
+
+def test_app_import_leaves_heavy_modules_unloaded():
+    report = import_report()
+
+    assert report["heavy_modules"] == []
+    assert check_startup(report, budget=60.0) == []
+
+
+def test_check_startup_reports_slow_and_heavy_imports():
+    messages = check_startup({"seconds": 2.5, "heavy_modules": ["torch"]}, 1.5)
+
+    assert len(messages) == 2
+    assert "2.50s" in messages[0] and "torch" in messages[1]
+
+
+def test_encoder_is_loaded_once_per_process(mocker):
+    create_backend = mocker.patch("src.app_func.sentence_encoder.create_backend")
+
+    first = get_sentence_encoder("tiny-model", backend="torch", processes=1)
+    second = get_sentence_encoder("tiny-model", backend="torch", processes=1)
+
+    assert first is second
+    assert create_backend.call_count == 1
+    assert get_sentence_encoder("other-model", processes=1) is not first
+
+
+def test_warm_up_runs_once_in_the_background(mocker, monkeypatch):
+    monkeypatch.setattr(startup, "_WARM_UP", None)
+    pipeline = mocker.patch("src.app_func.startup.DataPipeline")
+
+    thread = startup.warm_up(background=False)
+
+    assert startup.warm_up() is thread
+    assert not thread.is_alive()
+    pipeline.return_value.encoder.model.encode.assert_called_once()
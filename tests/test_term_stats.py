@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+from wordcloud import STOPWORDS, WordCloud
+
+from src.app_func.term_stats import TermStatistics
+from src.app_func.visualisation import Visualisation
+
+SUMMARIES = [
+    "Graph neural networks learn node embeddings on large graphs.",
+    "We study protein folding with graph neural networks.",
+    "Dark matter halos shape the rotation curves of galaxies.",
+    "Protein structures and folding pathways of small proteins.",
+]
+
+
+def papers(summaries=SUMMARIES, prefix="p"):
+    return pd.DataFrame(
+        {"id": [f"{prefix}{i}" for i in range(len(summaries))], "summary": summaries}
+    )
+
+
+def test_frequencies_match_wordcloud_tokenizer():
+    terms = TermStatistics()
+    text = " ".join(SUMMARIES).lower()
+    expected = WordCloud(
+        stopwords=set(STOPWORDS),
+        collocations=False,
+        regexp=r"[a-z#&]+",
+        min_word_length=4,
+    ).process_text(text)
+
+    assert terms.frequencies(papers()) == dict(
+        sorted(expected.items(), key=lambda item: (-item[1], item[0]))
+    )
+
+
+def test_papers_are_tokenized_once_and_subsets_are_aggregated():
+    terms = TermStatistics()
+    df = papers()
+    everything = terms.frequencies(df)
+    first_two = terms.frequencies(df.head(2), max_words=3)
+    terms.cluster_terms(df, np.array([0, 0, 1, 1]))
+
+    assert terms.tokenized == len(df)
+    assert first_two == {"graph": 3, "networks": 2, "neural": 2}
+    assert everything["protein"] == 3
+    assert list(everything)[0] == "graph"
+
+
+def test_cluster_terms_prefer_distinctive_terms():
+    terms = TermStatistics()
+    df = papers(["protein folding study", "protein folding model", "dark matter study"])
+
+    assert terms.cluster_terms(df, np.array([0, 0, 1]), num_terms=2) == {
+        0: ["protein", "folding"],
+        1: ["dark", "matter"],
+    }
+
+
+def test_suggest_keywords_leaves_out_the_search_term():
+    terms = TermStatistics()
+    terms.frequencies(papers())
+    keywords = terms.suggest_keywords(papers().iloc[[1, 3]], "protein", 3)
+
+    assert "protein" not in keywords and "proteins" not in keywords
+    assert keywords[0] == "folding"
+
+
+def test_least_recently_used_papers_are_dropped():
+    terms = TermStatistics(max_papers=2)
+    terms.frequencies(papers().head(2))
+    terms.frequencies(papers().tail(2))
+
+    assert len(terms) == 2
+    assert terms.frequencies(papers().head(1))["graph"] == 2
+    assert terms.tokenized == 5
+
+
+def test_generate_word_cloud_draws_cached_frequencies():
+    visualisation = Visualisation(TermStatistics())
+    image = visualisation.generate_word_cloud(papers())
+    empty = visualisation.generate_word_cloud(papers([""], prefix="e"))
+
+    assert image.shape == (500, 500, 3)
+    assert empty.shape == (500, 500, 3)
+    assert visualisation.terms.tokenized == len(SUMMARIES) + 1